@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the benchmarks, imported as `from _util import timeit` by
+the scripts run as `python benchmarks/bench_*.py`.
+"""
+import time
+
+import numpy as np
+
+
+def timeit(f, repeat):
+    """
+    Best wall time of `repeat` calls of f, and the result of the last call
+    """
+    best = np.inf
+    result = None
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        result = f()
+        best = min(best, time.perf_counter() - tic)
+    return best, result
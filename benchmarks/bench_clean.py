@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of Band.clean against the previous label-by-label implementation.
+
+    python benchmarks/bench_clean.py --size 1000 --density 0.5
+"""
+import argparse
+
+import numpy as np
+from scipy.ndimage import label as ndi_label
+
+from _util import timeit
+from pyintdem.models import Band, MaskBand
+
+
+def clean_loop(data, npixel, fillvalue, background=False):
+    """
+    Previous implementation of Band.clean, one full array scan per label
+    """
+    inan = np.isnan(data)
+    if background:
+        out = np.zeros(shape=data.shape)
+        labels, _ = ndi_label(data)
+    else:
+        out = np.ones(shape=data.shape)
+        labels, _ = ndi_label(np.nanmax(data) - data)
+
+    _, count = np.unique(labels, return_counts=True)
+    retained_labels = np.argwhere(count >= npixel).ravel()
+    retained_labels = retained_labels[retained_labels > 0]
+
+    for label in retained_labels:
+        out[labels == label] = fillvalue
+
+    out[inan] = np.nan
+
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000, help='number of rows and columns')
+    parser.add_argument('--density', type=float, default=0.5, help='fraction of land pixels')
+    parser.add_argument('--npixel', type=int, default=4, help='minimum blob size')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    data = (rng.random((args.size, args.size)) < args.density).astype(float)
+    data[rng.random(data.shape) < 0.01] = np.nan
+    geotransform = (0, 10, 0, 0, 0, -10)
+
+    band = Band(data=data, geotransform=geotransform, projection=None)
+    mask = MaskBand.from_array(data, geotransform=geotransform)
+    nlabels = ndi_label(data != np.nanmax(data))[1]
+    print(f'{args.size}x{args.size} pixels, {nlabels} water blobs, npixel={args.npixel}')
+
+    t_loop, r_loop = timeit(
+        lambda: clean_loop(
+            clean_loop(data, args.npixel, 0, background=False),
+            args.npixel, 1, background=True),
+        args.repeat)
+    print(f'loop over labels      : {t_loop:8.3f} s')
+
+    t_band, r_band = timeit(
+        lambda: band.clean(args.npixel, 0, background=False).clean(args.npixel, 1, background=True),
+        args.repeat)
+    print(f'Band.clean x2         : {t_band:8.3f} s ({t_loop / t_band:6.1f}x)')
+
+    t_both, r_both = timeit(lambda: band.clean_blobs(args.npixel, args.npixel), args.repeat)
+    print(f'Band.clean_blobs      : {t_both:8.3f} s ({t_loop / t_both:6.1f}x)')
+
+    t_mask, r_mask = timeit(lambda: mask.clean_blobs(args.npixel, args.npixel), args.repeat)
+    print(f'MaskBand.clean_blobs  : {t_mask:8.3f} s ({t_loop / t_mask:6.1f}x)')
+
+    for name, result in [('Band.clean', r_band), ('Band.clean_blobs', r_both), ('MaskBand.clean_blobs', r_mask)]:
+        same = np.array_equal(result.data, r_loop, equal_nan=True)
+        print(f'{name} identical to loop: {same}')
+
+
+if __name__ == '__main__':
+    main()
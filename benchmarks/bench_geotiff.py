@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the GeoTIFF writer against the previous Band.to_geotiff
+(uncompressed, untiled, through rioxarray): write time, size on disk and
+read back of the data, for a hue-like float band and a binary mask.
+
+    python benchmarks/bench_geotiff.py --size 10980
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from pyproj import CRS
+
+from _util import timeit
+from pyintdem.models import Band
+from pyintdem.models.band import band_to_rio
+
+PRESETS = {
+    'deflate': dict(compress='deflate'),
+    'zstd': dict(compress='zstd'),
+    'zstd + overviews': dict(compress='zstd', overviews=True),
+    'lerc 1e-3': dict(compress='lerc_zstd', max_z_error=1e-3),
+    'cog zstd': dict(compress='zstd', cog=True),
+}
+
+
+def to_geotiff_previous(band, fname, dtype='float32', nodata=None):
+    """
+    Previous implementation of Band.to_geotiff and MaskBand.to_geotiff
+    """
+    da_band = band_to_rio(band)
+    if nodata is not None:
+        da_band.rio.write_nodata(nodata, inplace=True)
+    da_band.rio.to_raster(fname, dtype=dtype)
+
+
+def synthetic_hue(size, rng):
+    """
+    Smooth field with noise and a NaN border, as a clipped hue band
+    """
+    y, x = np.mgrid[0:size, 0:size] / size
+    data = (0.5 + 0.3 * np.sin(6 * x) * np.cos(4 * y) + 0.02 * rng.standard_normal((size, size))).astype(np.float32)
+    data[:, :size // 10] = np.nan
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=10980, help='number of rows and columns')
+    parser.add_argument('--epsg', type=int, default=32646, help='projection of the band')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    grid = dict(
+        geotransform=(600000.0, 10.0, 0.0, 2500000.0, 0.0, -10.0),
+        projection=CRS.from_epsg(args.epsg).to_wkt()
+    )
+    hue = Band(data=synthetic_hue(args.size, rng), **grid)
+    bw = hue > 0.5
+    print(f'{args.size}x{args.size} pixels, {hue.data.nbytes / 2**20:.0f} MiB float32')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        for name, band in (('hue', hue), ('bw', bw)):
+            print(f'\n{name}')
+            fname = tmpdir / f'{name}_previous.tif'
+            if name == 'hue':
+                reference = band.data
+                t_prev, _ = timeit(lambda: to_geotiff_previous(band, fname), args.repeat)
+            else:
+                reference = np.where(band.valid, band.value, 255).astype(np.uint8)
+                previous = Band(data=reference, grid=band.grid)
+                t_prev, _ = timeit(lambda: to_geotiff_previous(previous, fname, dtype='uint8', nodata=255), args.repeat)
+            s_prev = fname.stat().st_size
+            print(f'{"previous":18s}: {t_prev:7.3f} s {s_prev / 2**20:9.1f} MiB')
+
+            for preset, options in PRESETS.items():
+                if name == 'bw' and preset.startswith('lerc'):
+                    continue
+                fname = tmpdir / f'{name}_{preset.replace(" ", "_")}.tif'
+                t_new, _ = timeit(lambda: band.to_geotiff(fname, **options), args.repeat)
+                s_new = fname.stat().st_size
+                with rasterio.open(fname) as ds:
+                    data = ds.read(1)
+                if preset.startswith('lerc'):
+                    error = np.nanmax(np.abs(data - reference))
+                    check = f'max error {error:.1e}'
+                else:
+                    check = f'identical {np.array_equal(data, reference, equal_nan=True)}'
+                print(
+                    f'{preset:18s}: {t_new:7.3f} s {s_new / 2**20:9.1f} MiB '
+                    f'({t_prev / t_new:4.1f}x speedup, {s_prev / s_new:5.1f}x smaller) {check}'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the band_to_rio / rio_to_band bridge against the previous
+implementation, checking that the pixel buffer is shared and not copied.
+
+    python benchmarks/bench_rio_bridge.py --size 10980
+"""
+import argparse
+import tracemalloc
+
+import numpy as np
+import xarray as xr
+from pyproj import CRS
+
+from _util import timeit
+from pyintdem.models import Band
+from pyintdem.models.band import band_to_rio, rio_to_band
+
+
+def band_to_rio_previous(band):
+    """
+    Previous implementation of band_to_rio, coordinates and CRS rebuilt every call
+    """
+    x_start, dx, _, y_start, _, dy = band.geotransform
+    ny, nx = band.data.shape
+    x = np.arange(x_start + dx / 2, x_start + (nx + 0.5) * dx, dx)
+    y = np.arange(y_start + dy / 2, y_start + (ny + 0.5) * dy, dy)
+    ds = xr.DataArray(band.data, dims=('y', 'x'), coords={'x': x, 'y': y})
+    ds.rio.write_crs(band.projection, inplace=True)
+
+    return ds
+
+
+def rio_to_band_previous(da):
+    """
+    Previous implementation of rio_to_band, CRS re-serialized every call
+    """
+    return Band(
+        data=da.values,
+        geotransform=da.rio.transform().to_gdal(),
+        projection=da.rio.crs.to_wkt()
+    )
+
+
+def peak_memory(f):
+    tracemalloc.start()
+    result = f()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=10980, help='number of rows and columns')
+    parser.add_argument('--epsg', type=int, default=32646, help='projection of the band')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    data = np.zeros((args.size, args.size), dtype=np.float32)
+    band = Band(
+        data=data,
+        geotransform=(600000.0, 10.0, 0.0, 2500000.0, 0.0, -10.0),
+        projection=CRS.from_epsg(args.epsg).to_wkt()
+    )
+    print(f'{args.size}x{args.size} pixels, {data.nbytes / 2**20:.0f} MiB buffer')
+
+    def round_trip_previous():
+        return rio_to_band_previous(band_to_rio_previous(band))
+
+    def round_trip():
+        return rio_to_band(band_to_rio(band))
+
+    t_prev, r_prev = timeit(round_trip_previous, args.repeat)
+    print(f'previous round trip   : {t_prev * 1e3:8.3f} ms')
+    t_new, r_new = timeit(round_trip, args.repeat)
+    print(f'round trip            : {t_new * 1e3:8.3f} ms ({t_prev / t_new:6.1f}x)')
+
+    p_prev, _ = peak_memory(round_trip_previous)
+    p_new, _ = peak_memory(round_trip)
+    print(f'previous peak memory  : {p_prev / 2**10:8.1f} KiB')
+    print(f'peak memory           : {p_new / 2**10:8.1f} KiB')
+
+    da = band_to_rio(band)
+    print(f'DataArray shares the band buffer: {np.shares_memory(da.values, data)}')
+    print(f'Band shares the band buffer     : {np.shares_memory(r_new.data, data)}')
+    print(f'peak memory below one buffer    : {p_new < data.nbytes}')
+    print(f'same grid as previous           : {r_new.geotransform == r_prev.geotransform and r_new.projection == r_prev.projection}')
+
+
+if __name__ == '__main__':
+    main()
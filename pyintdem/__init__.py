@@ -7,22 +7,31 @@ shorelines from spectral images using  a sophisticated shoreline extraction algo
 These modules are developed in Python v3 environment.
 """
 from pathlib import Path
+from pyintdem.config import (get_dtype, set_dtype, dtype_policy, get_cache_dir, set_cache_dir, get_scratch_dir,
+                             set_scratch_dir, scratch_storage)
 from pyintdem.models.band import Band
+from pyintdem.models.chunked import open_chunked
 
 __version__ = '1.8'
 
 
-def read_file(fn, band=1) -> Band:
+def read_file(fn, band=1, chunks=None) -> Band:
     """
     Read a tif file and return a Band object
     Args:
         fn: path to tiff file
         band: the band number to read
+        chunks: None (default) reads the band in memory, 'auto' or a chunk shape reads it as a chunked band
+            backed by dask, the 'auto' chunks being aligned with the tiles of the file, see Band.chunk
 
     Returns: Band object
 
     """
     fn = Path(fn).as_posix()
+    if chunks is not None:
+        data, geotransform, projection = open_chunked(fn, band=band, chunks=chunks)
+        return Band(data=data, geotransform=geotransform, projection=projection)
+
     da_band = Band()
     da_band.read(fname=fn, band=band)
     return da_band
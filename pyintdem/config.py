@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Package wide options for pyintdem
+
+The floating point dtype used for the band data is controlled here. The default
+is float32, which halves the memory footprint of a scene compared to float64.
+The float64 `reference` mode can be activated globally with `set_dtype` or
+temporarily with the `dtype_policy` context manager.
+
+Grid dependent plans, e.g., the resampling index maps and the rasterized clip
+masks, are cached in memory and additionally on disk in the cache directory, if
+one is set with `set_cache_dir`.
+
+Large intermediate bands can be backed by memory-mapped files instead of RAM,
+see `Band.to_scratch`. The files are created in the scratch directory, set with
+`set_scratch_dir` or temporarily with the `scratch_storage` context manager,
+the system temporary directory by default.
+"""
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+_dtype_aliases = {
+    'reference': 'float64',
+    'default': 'float32'
+}
+
+_options = {
+    'dtype': np.dtype('float32'),
+    'cache_dir': None,
+    'scratch_dir': None
+}
+
+# dtype of the current thread overriding the package policy, see _thread_dtype
+_thread_options = threading.local()
+
+
+def _validate_dtype(dtype):
+    """
+    Convert dtype to a numpy floating dtype, resolving the aliases.
+
+    Args:
+        dtype: numpy floating dtype, its name, or one of 'default' and 'reference'
+
+    Returns: np.dtype
+
+    """
+    if isinstance(dtype, str):
+        dtype = _dtype_aliases.get(dtype, dtype)
+
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.floating):
+        raise ValueError(f'dtype policy must be a floating dtype, got {dtype}')
+
+    return dtype
+
+
+def get_dtype():
+    """
+    Floating dtype used for the band data across the package.
+
+    Returns: np.dtype
+
+    """
+    dtype = getattr(_thread_options, 'dtype', None)
+    return _options['dtype'] if dtype is None else dtype
+
+
+def set_dtype(dtype):
+    """
+    Set the floating dtype used for the band data across the package.
+
+    Args:
+        dtype: float32 (default), float64 (`reference`), or a narrower floating dtype
+
+    Returns: None
+
+    """
+    _options['dtype'] = _validate_dtype(dtype)
+
+
+@contextmanager
+def dtype_policy(dtype):
+    """
+    Context manager to temporarily use a floating dtype for the band data.
+
+        with dtype_policy('reference'):
+            band = read_file(fname)
+
+    Args:
+        dtype: float32 (default), float64 (`reference`), or a narrower floating dtype. None keeps the current policy.
+
+    """
+    previous = _options['dtype']
+    if dtype is not None:
+        set_dtype(dtype)
+    try:
+        yield get_dtype()
+    finally:
+        _options['dtype'] = previous
+
+
+@contextmanager
+def _thread_dtype(dtype):
+    """
+    Context manager to use a floating dtype in the current thread only, e.g.,
+    the dtype captured when a background job was submitted, regardless of the
+    package policy changed meanwhile by the other threads.
+
+    Args:
+        dtype: numpy floating dtype
+
+    """
+    previous = getattr(_thread_options, 'dtype', None)
+    _thread_options.dtype = _validate_dtype(dtype)
+    try:
+        yield _thread_options.dtype
+    finally:
+        _thread_options.dtype = previous
+
+
+def get_cache_dir():
+    """
+    Directory of the on-disk cache of the grid dependent plans.
+
+    Returns: Path, None if the disk cache is disabled
+
+    """
+    return _options['cache_dir']
+
+
+def set_cache_dir(cache_dir):
+    """
+    Set the directory of the on-disk cache of the grid dependent plans. The
+    directory is created if needed.
+
+    Args:
+        cache_dir: path to the cache directory, None disables the disk cache
+
+    Returns: None
+
+    """
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+    _options['cache_dir'] = cache_dir
+
+
+def get_scratch_dir():
+    """
+    Directory of the memory-mapped scratch files of the bands.
+
+    Returns: Path, the system temporary directory if none is set
+
+    """
+    scratch_dir = _options['scratch_dir']
+    if scratch_dir is None:
+        return Path(tempfile.gettempdir())
+    return scratch_dir
+
+
+def set_scratch_dir(scratch_dir):
+    """
+    Set the directory of the memory-mapped scratch files of the bands. The
+    directory is created if needed.
+
+    Args:
+        scratch_dir: path to the scratch directory, None for the system temporary directory
+
+    Returns: None
+
+    """
+    if scratch_dir is not None:
+        scratch_dir = Path(scratch_dir)
+        scratch_dir.mkdir(parents=True, exist_ok=True)
+
+    _options['scratch_dir'] = scratch_dir
+
+
+@contextmanager
+def scratch_storage(scratch_dir):
+    """
+    Context manager to temporarily use a scratch directory.
+
+        with scratch_storage('/mnt/scratch'):
+            hue.to_scratch()
+
+    Args:
+        scratch_dir: path to the scratch directory, None keeps the current one
+
+    """
+    previous = _options['scratch_dir']
+    if scratch_dir is not None:
+        set_scratch_dir(scratch_dir)
+    try:
+        yield get_scratch_dir()
+    finally:
+        _options['scratch_dir'] = previous
@@ -8,7 +8,10 @@ import rasterio
 from pathlib import Path
 import pandas as pd
 import re
-from pyintdem.models.band import Band
+from pyintdem.config import get_dtype
+from pyintdem.models.band import Band, geometry_mask_window, project_geometries, window_geotransform
+from pyintdem.models.lazy import LazyBand, geometry_window
+from pyintdem.models.mask import MaskBand
 import numpy as np
 import json
 from zipfile import ZipFile
@@ -161,7 +164,22 @@ class DataFile(dict):
 
         self['bands'] = map_bands(self, mapper=mapper)
 
-    def get_band(self, name, number=1, preprocess=True):
+    def get_band(self, name, number=1, preprocess=True, lazy=False, clip_kw=None):
+        """
+        Get a band from the datafile.
+
+        Args:
+            name: band name, e.g., 'B4'
+            number: band number inside the band file
+            preprocess: True for the default preprocessor of the filetype, False for none, or a callable
+            lazy: if True, return a LazyBand which decodes only the windows it needs, to be closed by the
+                caller, e.g., in a `with` block
+            clip_kw: Dictionary of one or all components {'bbox', 'geoms'} for clipping, only the
+                window enclosing them is decoded and a clipped Band is returned
+
+        Returns: Band or LazyBand
+
+        """
         if callable(preprocess):
             preprocessor = preprocess
         else:
@@ -171,26 +189,83 @@ class DataFile(dict):
                 preprocessor = preprocess_none
 
         band_fname = self['bands'][name]
-        ds = rasterio.open(band_fname)
-        band = Band(
-            data=ds.read(number).astype(float),
-            geotransform=ds.get_transform(),
-            projection=ds.crs.to_wkt()
-        )
+
+        if clip_kw is not None:
+            with LazyBand(fname=band_fname, band=number, preprocessor=preprocessor) as band:
+                return band.clip(**clip_kw)
+
+        if lazy:
+            return LazyBand(fname=band_fname, band=number, preprocessor=preprocessor)
+
+        with rasterio.open(band_fname) as ds:
+            band = Band(
+                data=ds.read(number).astype(get_dtype()),
+                geotransform=ds.get_transform(),
+                projection=ds.crs.to_wkt()
+            )
 
         return preprocessor(band)
 
-    def get_mask(self, mask_dir, ext='.tif'):
+    def get_mask(self, mask_dir, ext='.tif', clip_kw=None):
+        """
+        Get the water mask of the tile of the datafile.
+
+        Args:
+            mask_dir: directory of the masks, named after the tiles
+            ext: extension of the mask files
+            clip_kw: Dictionary of one or all components {'bbox', 'geoms'} for clipping, only the
+                window enclosing them is decoded
+
+        Returns: MaskBand for the compact masks, Band otherwise
+
+        """
         mask_dir = Path(mask_dir)
         tile_name = self['tile']
         mask_fname = tile_name + ext
         mask_fpath = mask_dir / mask_fname
-        ds = rasterio.open(mask_fpath)
-        band = Band(
-            data=ds.read(1),
-            geotransform=ds.get_transform(),
-            projection=ds.crs.to_wkt()
-        )
+
+        with rasterio.open(mask_fpath) as ds:
+            projection = ds.crs.to_wkt()
+            nodata = ds.nodata
+
+            clip_geom_projected = []
+            if clip_kw is not None:
+                clip_geom_projected = project_geometries(projection=projection, **clip_kw)
+
+            if len(clip_geom_projected) > 0:
+                window = geometry_window(clip_geom_projected, ds)
+                data = ds.read(1, window=window)
+                geotransform = ds.window_transform(window).to_gdal()
+            else:
+                data = ds.read(1)
+                geotransform = ds.get_transform()
+
+        inside = None
+        if len(clip_geom_projected) > 0:
+            rows, cols, inside = geometry_mask_window(clip_geom_projected, geotransform, data.shape)
+            data = data[rows, cols]
+            geotransform = window_geotransform(geotransform, rows, cols)
+
+        if nodata is not None and not np.issubdtype(data.dtype, np.floating):
+            # Compact mask, e.g., written by MaskBand.to_geotiff
+            valid = data != nodata
+            if inside is not None:
+                valid &= inside
+            band = MaskBand(
+                value=data.astype(bool),
+                valid=valid,
+                geotransform=geotransform,
+                projection=projection
+            )
+        else:
+            data = data.astype(get_dtype(), copy=False)
+            if inside is not None:
+                data = np.where(inside, data, data.dtype.type(np.nan))
+            band = Band(
+                data=data,
+                geotransform=geotransform,
+                projection=projection
+            )
         return band
 
     @property
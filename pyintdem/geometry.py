@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 # Extracted from pycaz/utils/geometry.py
 # https://github.com/jamal919/pycaz
+from functools import lru_cache
+
 import cartopy.crs as ccrs
-from pyproj import CRS
+from pyproj import CRS, Transformer
 import numpy as np
 
 
@@ -164,3 +166,19 @@ def cartopy_utm_projection(utm_code):
         southern_hemisphere = False
 
     return ccrs.UTM(zone=zone, southern_hemisphere=southern_hemisphere)
+
+
+@lru_cache(maxsize=64)
+def get_transformer(crs_wkt, epsg):
+    """
+    Get a cached transformer from a source projection to a target epsg code.
+
+    The transformer is cached for the whole process, keyed by the source WKT and
+    the target epsg. The axis order follows the authority of each crs, like
+    osr.CoordinateTransformation, i.e., (lat, lon) for epsg:4326.
+
+    :param crs_wkt: Source projection as WKT string
+    :param epsg: Target epsg code
+    :return: pyproj.Transformer
+    """
+    return Transformer.from_crs(CRS.from_user_input(crs_wkt), CRS.from_epsg(epsg))
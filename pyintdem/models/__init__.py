@@ -1,10 +1,24 @@
 # -*- coding: utf-8 -*-
 
+from .accumulator import BandAccumulator
 from .band import Band
-from .rgb import RGB
+from .expression import BandExpression
+from .grid import GridSpec, grid_spec
+from .lazy import LazyBand
+from .mask import MaskBand
+from .rgb import RGB, hue_value
+from .writer import OutputWriter
 
 # Public api for models
 __all__ = [
     "Band",
-    "RGB"
+    "BandAccumulator",
+    "BandExpression",
+    "GridSpec",
+    "LazyBand",
+    "MaskBand",
+    "OutputWriter",
+    "RGB",
+    "grid_spec",
+    "hue_value"
 ]
\ No newline at end of file
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from pyintdem.config import get_dtype
+from .band import Band
+
+
+class BandAccumulator(object):
+    def __init__(self, minmax=False, variance=False, dtype=None):
+        """
+        Running per-pixel statistics of a stream of bands on the same grid,
+        NaN being missing. The buffers are updated in place, so accumulating
+        any number of bands needs a running sum and a count buffer only, plus
+        min/max and M2 buffers if requested.
+
+            accumulator = BandAccumulator()
+            for band in bands:
+                accumulator.update(band)
+            mean = accumulator.mean
+
+        arguments:
+            minmax: boolean
+                keep the running minimum and maximum, default False
+            variance: boolean
+                keep the running mean and sum of squared deviations (M2,
+                Welford) for the variance, default False
+            dtype: floating dtype
+                dtype of the running buffers, default None for the package
+                dtype policy
+
+        returns:
+            Accumulator: BandAccumulator
+        """
+        self.minmax = minmax
+        self.variance = variance
+        self.dtype = get_dtype() if dtype is None else np.dtype(dtype)
+
+        self.grid = None
+        self._nbands = 0
+        self._count = None
+        self._sum = None
+        self._mean = None
+        self._m2 = None
+        self._min = None
+        self._max = None
+
+    @property
+    def shape(self):
+        """
+        Shape of the accumulated grid, None before the first update
+        """
+        return None if self._count is None else self._count.shape
+
+    @property
+    def nbands(self):
+        """
+        Number of accumulated bands
+        """
+        return self._nbands
+
+    def _start(self, band):
+        """
+        Allocate the running buffers on the grid of the first band
+        """
+        shape = band.data.shape
+        self.grid = band.grid
+        self._count = np.zeros(shape, dtype=np.int32)
+        if self.variance:
+            self._mean = np.zeros(shape, dtype=self.dtype)
+            self._m2 = np.zeros(shape, dtype=self.dtype)
+        else:
+            self._sum = np.zeros(shape, dtype=self.dtype)
+        if self.minmax:
+            self._min = np.full(shape, np.nan, dtype=self.dtype)
+            self._max = np.full(shape, np.nan, dtype=self.dtype)
+
+    def update(self, band):
+        """
+        Add a band to the running statistics.
+
+        arguments:
+            band: Band
+                band on the same grid as the previous ones
+
+        returns:
+            The accumulator itself: BandAccumulator
+        """
+        if not isinstance(band, Band):
+            raise NotImplementedError('In BandAccumulator update: only Band data is implemented')
+
+        if self._count is None:
+            self._start(band)
+        elif band.data.shape != self._count.shape:
+            raise AssertionError('In BandAccumulator update: size mismatch')
+
+        data = band.data
+        valid = ~np.isnan(data)
+        np.add(self._count, valid, out=self._count, casting='unsafe')
+
+        if self.variance:
+            # Welford update, only where the band is valid
+            delta = np.subtract(data, self._mean, where=valid, out=np.zeros_like(self._mean), casting='unsafe')
+            with np.errstate(invalid='ignore', divide='ignore'):
+                np.add(self._mean, delta / self._count, out=self._mean, where=valid, casting='unsafe')
+            delta *= np.subtract(data, self._mean, where=valid, out=np.zeros_like(self._mean), casting='unsafe')
+            self._m2 += delta
+        else:
+            np.add(self._sum, data, out=self._sum, where=valid, casting='unsafe')
+
+        if self.minmax:
+            np.fmin(self._min, data, out=self._min, casting='unsafe')
+            np.fmax(self._max, data, out=self._max, casting='unsafe')
+
+        self._nbands += 1
+        return self
+
+    def _band(self, data):
+        """
+        Band of accumulated data on the grid of the accumulator
+        """
+        if self._count is None:
+            raise AssertionError('In BandAccumulator: no band accumulated')
+
+        return Band(data=data, grid=self.grid)
+
+    def _divide(self, numerator, offset=0):
+        """
+        numerator / (count - offset), NaN where the count is not larger than offset
+        """
+        denominator = self._count - offset
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = (numerator / denominator).astype(self.dtype)
+        out[denominator <= 0] = np.nan
+        return out
+
+    @property
+    def count(self):
+        """
+        Number of valid values of each pixel: Band
+        """
+        return self._band(self._count.astype(self.dtype))
+
+    @property
+    def sum(self):
+        """
+        Sum of the valid values of each pixel, 0 where none is valid as np.nansum: Band
+        """
+        if self.variance:
+            return self._band((self._mean * self._count).astype(self.dtype))
+        return self._band(self._sum.copy())
+
+    @property
+    def mean(self):
+        """
+        Mean of the valid values of each pixel, NaN where none is valid: Band
+        """
+        if self.variance:
+            data = self._mean.copy()
+            data[self._count == 0] = np.nan
+            return self._band(data)
+        return self._band(self._divide(self._sum))
+
+    def var(self, ddof=0):
+        """
+        Variance of the valid values of each pixel, requires variance=True.
+
+        arguments:
+            ddof: integer
+                delta degrees of freedom, as np.nanvar, default 0
+
+        returns:
+            Variance: Band
+        """
+        if not self.variance:
+            raise NotImplementedError('In BandAccumulator var: the accumulator must be created with variance=True')
+        return self._band(self._divide(self._m2, offset=ddof))
+
+    def std(self, ddof=0):
+        """
+        Standard deviation of the valid values of each pixel, requires
+        variance=True, see BandAccumulator.var
+        """
+        variance = self.var(ddof=ddof)
+        np.sqrt(variance.data, out=variance.data)
+        return variance
+
+    @property
+    def min(self):
+        """
+        Minimum of the valid values of each pixel, requires minmax=True: Band
+        """
+        if not self.minmax:
+            raise NotImplementedError('In BandAccumulator min: the accumulator must be created with minmax=True')
+        return self._band(self._min.copy())
+
+    @property
+    def max(self):
+        """
+        Maximum of the valid values of each pixel, requires minmax=True: Band
+        """
+        if not self.minmax:
+            raise NotImplementedError('In BandAccumulator max: the accumulator must be created with minmax=True')
+        return self._band(self._max.copy())
+
+    def __repr__(self):
+        """
+        Print representation
+        """
+        if self._count is None:
+            return 'empty (accumulator)'
+        return '{:d} - {:d} (accumulator of {:d} bands)'.format(*self.shape, self.nbands)
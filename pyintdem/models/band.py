@@ -3,24 +3,61 @@
 
 import copy
 import gc
+import hashlib
 import warnings
+from functools import lru_cache
 from pathlib import Path
 
 import geopandas as gpd
 import matplotlib.pyplot as plt
 import numpy as np
+import pyproj
+import rasterio.features
+import rasterio.warp
+import shapely
 import xarray as xr
-from osgeo import osr, gdal
+from affine import Affine
+from osgeo import gdal
+from rasterio.enums import Resampling
+from rioxarray.crs import crs_from_user_input
+from rioxarray.exceptions import NoDataInBounds
 from scipy import signal as sps
-from scipy.interpolate import RegularGridInterpolator
 from scipy.ndimage import measurements as scm
 
-from pyintdem.geometry import extent2geometries
+from pyintdem.config import get_cache_dir, get_dtype
+from pyintdem.geometry import extent2geometries, get_transformer
+from .chunked import chunk_array, compute, is_chunked
+from .geotiff import (QUANTIZED_DTYPE, QUANTIZED_NODATA, decode_nodata, dequantize, is_quantized, quantization,
+                      write_geotiff)
+from .geotiff import quantize as quantize_data
+from .grid import grid_spec
+from .plancache import plan_cache
+from .quicklook import QUICKLOOK_PIXELS, decimate, render_png
+from .resample import apply_plan, downsample, scale_geotransform, upsample, upsample_plan
+from .scratch import open_scratch, to_scratch
+from .stats import (CHUNK_SIZE, EMPTY_STATS, BandStats, MaskedStats, approx_quantile, compute_stats,
+                    masked_values)
 
 gdal.UseExceptions()
 
+KERNEL_LAPLACE = np.array(
+    [
+        [0, -1, 0],
+        [-1, 4, -1],
+        [0, -1, 0]
+    ])
+
+# Resampling methods of Band.reproject_match
+WARP_RESAMPLING = {
+    'nearest': Resampling.nearest,
+    'bilinear': Resampling.bilinear,
+    'average': Resampling.average
+}
+
 class Band(object):
-    def __init__(self, data=None, geotransform=None, projection=None, **kwargs):
+    __slots__ = ('_data', '_grid', '_stats', 'attrs', '__weakref__')
+
+    def __init__(self, data=None, geotransform=None, projection=None, grid=None, **kwargs):
         """
         Band data class contains the information needed for a GeoTiff file.
 
@@ -31,18 +68,84 @@ class Band(object):
                 geotransform information, default None
             projection: string
                 projection information, default None
+            grid: GridSpec
+                shared grid spec of the band, e.g., other.grid, replacing
+                geotransform and projection, default None
 
         returns:
             Band data: Band
         """
+        self._grid = grid if grid is not None else grid_spec(geotransform, projection)
         self.data = data
-        self.geotransform = geotransform
-        self.projection = projection
         self.attrs = kwargs
 
+    @property
+    def data(self):
+        """
+        Band data array
+        """
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._stats = None
+
+    @property
+    def grid(self):
+        """
+        Interned grid spec of the band (geotransform, projection, shape), shared
+        by the bands of the same grid, see pyintdem.models.grid
+        """
+        try:
+            shape = self.shape
+        except AttributeError:
+            shape = None
+        if self._grid.shape != shape:
+            self._grid = self._grid.with_shape(shape)
+        return self._grid
+
+    @property
+    def geotransform(self):
+        """
+        GDAL geotransform of the band
+        """
+        return self._grid.geotransform
+
+    @geotransform.setter
+    def geotransform(self, value):
+        self._grid = self._grid.with_geotransform(value)
+
+    @property
+    def projection(self):
+        """
+        Projection of the band
+        """
+        return self._grid.projection
+
+    @projection.setter
+    def projection(self, value):
+        self._grid = self._grid.with_projection(value)
+
+    def same_grid(self, other):
+        """
+        True if both bands are on the same grid: geotransform, projection and shape
+        """
+        return self.grid.same_as(other.grid)
+
+    def clear_cache(self):
+        """
+        Clear the cached statistics. Must be called after modifying the data
+        array in place from outside of the Band methods.
+        """
+        self._stats = None
+
     def read(self, fname, band=1):
         """
-        Read band data from a file.
+        Read band data from a file. Bands with a scale and offset, e.g.,
+        quantized by Band.to_geotiff, are decoded, and the nodata of the
+        quantized and integer bands, e.g., the 255 of the masks written by
+        MaskBand.to_geotiff, is read as NaN.
 
         arguments:
             fname: string, file location
@@ -56,10 +159,109 @@ class Band(object):
             dset = gdal.Open(fname, gdal.GA_ReadOnly)
             self.geotransform = dset.GetGeoTransform()
             self.projection = dset.GetProjectionRef()
-            self.data = dset.GetRasterBand(band).ReadAsArray().astype(float)
+            rband = dset.GetRasterBand(band)
+            scale, offset, nodata = rband.GetScale(), rband.GetOffset(), rband.GetNoDataValue()
+            if is_quantized(scale, offset):
+                self.data = dequantize(
+                    rband.ReadAsArray(), scale or 1.0, offset or 0.0, nodata=nodata, dtype=get_dtype()
+                )
+            else:
+                self.data = decode_nodata(rband.ReadAsArray(), nodata, dtype=get_dtype())
         except:
             raise Exception('Band: read error!')
 
+    def to_scratch(self, name=None, scratch_dir=None, persist=False):
+        """
+        Move the band data to a memory-mapped scratch file, so that only the
+        pages in use are kept in RAM. The file, with a .json sidecar of the
+        grid, is removed when the data is released, see pyintdem.models.scratch.
+
+        arguments:
+            name: string
+                file name without extension, default None for a unique name
+            scratch_dir: path
+                directory of the file, default None for the configured scratch
+                directory, see pyintdem.config.set_scratch_dir
+            persist: boolean
+                keep the file, to be opened again with Band.from_scratch,
+                default False
+
+        returns:
+            The band itself: Band
+        """
+        self.data = to_scratch(self.data, grid=self.grid, name=name, scratch_dir=scratch_dir, persist=persist)
+        return self
+
+    @property
+    def is_chunked(self):
+        """
+        True if the band data is a dask array, see Band.chunk
+        """
+        return is_chunked(self._data)
+
+    def chunk(self, chunks='auto'):
+        """
+        Back the band data with a dask array, so that the arithmetic,
+        comparisons, normalize, mask and to_geotiff only build a graph, run
+        chunk by chunk with the threaded scheduler. Requires dask, see
+        pyintdem.models.chunked.
+
+        arguments:
+            chunks: 'auto' or tuple
+                chunk shape, 'auto' (default) for about a million pixels
+                aligned with 256 x 256 tiles
+
+        returns:
+            The band itself: Band
+        """
+        self.data = chunk_array(self.data, chunks=chunks)
+        return self
+
+    def compute(self):
+        """
+        In-memory band of a chunked band, computed with the threaded scheduler.
+
+        returns:
+            Band data: Band
+        """
+        return Band(data=compute(self.data), grid=self.grid, **self.attrs)
+
+    @classmethod
+    def from_scratch(cls, fname, mode='r+'):
+        """
+        Band of a persisted scratch file, see Band.to_scratch.
+
+        arguments:
+            fname: path
+                the .npy scratch file
+            mode: string
+                np.memmap mode, default 'r+'
+
+        returns:
+            Band data: Band
+        """
+        data, grid = open_scratch(fname, mode=mode)
+        return cls(data=data, grid=grid)
+
+    @property
+    def shape(self):
+        """
+        Shape of the band data
+        """
+        return self.data.shape
+
+    def _as_bool(self):
+        """
+        Band data as boolean, NaN being True as in numpy casting
+        """
+        return self.data.astype(bool)
+
+    def _invalid(self):
+        """
+        Boolean array of the NaN values in the band data
+        """
+        return np.isnan(self.data)
+
     def set_missing(self, value, to=np.nan):
         """
         set the missing value in data from value 
@@ -74,50 +276,55 @@ class Band(object):
             self.data[np.isnan(self.data)] = to
         else:
             self.data[self.data == value] = to
+        self.clear_cache()
 
-    def upscale(self, factor, method='nearest'):
+    def upscale(self, factor, method='nearest', chunk_size=CHUNK_SIZE):
         """
         increase the resolution with a factor.
 
         argument:
-            factor: float like
+            factor: integer or (row, column) integers
                 Multiplication factor for upscaling the data resolution
             method: string
-                Method to be used for interpolation. Currently only nearest
-                neighbour is available.
-        """
-        self.geotransform = (
-                self.geotransform[0],
-                self.geotransform[1]/float(factor),
-                self.geotransform[2],
-                self.geotransform[3],
-                self.geotransform[4],
-                self.geotransform[5]//float(factor)
-            )
-        if method=='nearest':
-            self.data = np.array(self.data.repeat(factor, axis=0).repeat(factor, axis=1))
-            return(True)
-        elif method=='linear':
-            nrows, ncols = self.data.shape
-            
-            # for original data
-            orig_r = np.linspace(0, nrows-1, nrows)
-            orig_c = np.linspace(0, ncols, ncols)
+                Method to be used for interpolation, nearest (default) or
+                bilinear (linear is an alias), see pyintdem.models.resample.upsample
+            chunk_size: integer
+                Approximate number of output pixels processed at once, None
+                processes the full band at once
+        """
+        if method == 'linear':
+            method = 'bilinear'
 
-            f = RegularGridInterpolator((orig_r, orig_c), self.data)
+        data = self.data
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else get_dtype()
+        self.data = upsample(data, factor, method=method, dtype=dtype, chunk_size=chunk_size)
+        self.geotransform = scale_geotransform(self.geotransform, factor)
+        return True
 
-            # for upscaled data
-            upscale_r = np.linspace(0, nrows-1, nrows*factor)
-            upscale_c = np.linspace(0, ncols-1, ncols*factor)
+    def downscale(self, factor, method='mean', chunk_size=CHUNK_SIZE):
+        """
+        decrease the resolution with a factor, summarizing blocks of pixels.
 
-            upscale_data = f(np.meshgrid(upscale_r, upscale_c))
+        argument:
+            factor: integer or (row, column) integers
+                Division factor for downscaling the data resolution
+            method: string
+                Method to be used for aggregation, mean (default), mode or
+                nearest, see pyintdem.models.resample.downsample
+            chunk_size: integer
+                Approximate number of input pixels processed at once, None
+                processes the full band at once
+        """
+        fy, fx = (factor, factor) if np.ndim(factor) == 0 else factor
 
-            self.data = upscale_data
-            return True
-        else:
-            raise NotImplementedError
+        data = self.data
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else get_dtype()
+        self.data = downsample(data, factor, method=method, dtype=dtype, chunk_size=chunk_size)
+        self.geotransform = scale_geotransform(self.geotransform, (1 / fy, 1 / fx))
+        return True
 
-    def normalize(self, method='minmax', std_factor=0.5, std_correction='high', perc_threshold=95):
+    def normalize(self, method='minmax', std_factor=0.5, std_correction='high', perc_threshold=95,
+                  quantile_method='exact', quantile_error=1e-4):
         """
         normalize the data using a given method.
 
@@ -136,34 +343,88 @@ class Band(object):
                     high - higher tail
             perc_threshold: float
                 perc_threshold to be used for `perc` method
+            quantile_method: string
+                `exact` or `histogram` percentile for `perc` method, see Band.quantile
+            quantile_error: float
+                rank error bound of the `histogram` quantile method
+
+        The data is capped and rescaled in place, using the cached statistics.
         """
         if method=='minmax':
-            self.data = (self.data - np.nanmin(self.data))/(np.nanmax(self.data)-np.nanmin(self.data))
+            self._rescale()
             return(True)
 
         elif method=='std':
-            mu = np.nanmean(self.data)
-            std = np.nanstd(self.data)
-
-            if std_correction=='both':
-                self.data[np.logical_and(self.data<(mu-std_factor*std), np.logical_not(np.isnan(self.data)))] = mu-std_factor*std
-                self.data[np.logical_and(self.data>(mu+std_factor*std), np.logical_not(np.isnan(self.data)))] = mu+std_factor*std
-            elif std_correction=='low':
-                self.data[np.logical_and(self.data<(mu-std_factor*std), np.logical_not(np.isnan(self.data)))] = mu-std_factor*std
-            elif std_correction=='high':
-                self.data[np.logical_and(self.data>(mu+std_factor*std), np.logical_not(np.isnan(self.data)))] = mu+std_factor*std
-            else:
+            if std_correction not in ('both', 'low', 'high'):
                 raise NotImplementedError
 
-            self.data = (self.data - np.nanmin(self.data))/(np.nanmax(self.data)-np.nanmin(self.data))
+            self._writeable_float()
+            stats = self.stats
+            mu = stats.mean
+            std = stats.std
+            dtype = self.data.dtype.type
+
+            if std_correction in ('both', 'low'):
+                low = mu-std_factor*std
+                np.maximum(self.data, low, out=self.data)
+                stats = stats._replace(min=max(stats.min, dtype(low)))
+            if std_correction in ('both', 'high'):
+                high = mu+std_factor*std
+                np.minimum(self.data, high, out=self.data)
+                stats = stats._replace(max=min(stats.max, dtype(high)))
+
+            self._rescale(vmin=stats.min, vmax=stats.max)
 
         elif method=='perc':
-            pth = np.nanpercentile(self.data, perc_threshold)
-            self.data[np.logical_and(self.data>pth, np.logical_not(np.isnan(self.data)))] = pth
-            self.data = (self.data - np.nanmin(self.data))/(np.nanmax(self.data)-np.nanmin(self.data))
+            self._writeable_float()
+            stats = self.stats
+            pth = self.percentile(perc_threshold, method=quantile_method, error=quantile_error)
+            np.minimum(self.data, pth, out=self.data)
+            self._rescale(vmin=stats.min, vmax=min(stats.max, self.data.dtype.type(pth)))
         else:
             raise NotImplementedError
 
+    def _writeable_float(self):
+        """
+        Make sure the data can be modified in place, i.e., it is a writeable
+        floating array, copying it otherwise.
+        """
+        if not np.issubdtype(self.data.dtype, np.floating):
+            self.data = self.data.astype(get_dtype())
+        elif is_chunked(self.data):
+            # the in place operations rewrite the graph of a dask array
+            return
+        elif not self.data.flags.writeable:
+            self.data = self.data.copy()
+
+    def _rescale(self, vmin=None, vmax=None):
+        """
+        Rescale the data in place from [vmin, vmax] to [0, 1]. The minimum and
+        maximum of the data are used by default.
+        """
+        self._writeable_float()
+        stats = self.stats
+        vmin = stats.min if vmin is None else vmin
+        vmax = stats.max if vmax is None else vmax
+        vrange = vmax - vmin
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.subtract(self.data, vmin, out=self.data)
+            np.divide(self.data, vrange, out=self.data)
+
+        if vmin == stats.min and vmax == stats.max:
+            # Linear transform of the cached statistics
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._stats = BandStats(
+                    count=stats.count,
+                    min=(stats.min - vmin) / vrange,
+                    max=(stats.max - vmin) / vrange,
+                    mean=(stats.mean - vmin) / vrange,
+                    m2=stats.m2 / vrange**2
+                )
+        else:
+            self.clear_cache()
+
     def clip(self, bbox=None, geoms=None):
         """
         Args:
@@ -172,45 +433,102 @@ class Band(object):
 
         Returns: clipped Band
         """
-        clip_geom = np.array([])
-
-        if bbox is not None:
-            bbox = extent2geometries(bbox)
-            clip_geom = np.append(clip_geom, bbox)
+        clip_geom_projected = project_geometries(bbox=bbox, geoms=geoms, projection=self.projection)
 
-        if geoms is not None:
-            geoms = np.atleast_1d(geoms)
-            clip_geom = np.append(clip_geom, geoms)
-
-        if len(clip_geom) == 0:
+        if len(clip_geom_projected) == 0:
             print("Neither bbox nor geom is given, returning the original Band")
             return copy.deepcopy(self)
 
-        gdf_clip = gpd.GeoDataFrame(geometry=clip_geom, crs=4326)
-        clip_geom_projected = gdf_clip.to_crs(self.projection)
-
-        da = band_to_rio(self)
-        da_clipped = da.rio.clip(clip_geom_projected.geometry, all_touched=True, drop=True)
-        band_clipped = rio_to_band(da_clipped)
-
-        return band_clipped
+        return clip_to_geometries(self, clip_geom_projected)
 
-    def reproject_match(self, to_band):
+    def reproject_match(self, to_band, resampling='nearest', num_threads=1, warp_mem_limit=0, dtype=None):
         """
         Reproject a band object to match the resolution, projection, and region of another band object.
+        The warp is done directly by rasterio (GDAL), NaN being the nodata of both bands. With nearest
+        resampling onto an integer-aligned finer grid of the same projection, a cached upsample plan
+        is applied instead, see pyintdem.models.resample.
+
         Args:
             to_band: band of the target resolution and projection
+            resampling: 'nearest' (default), 'bilinear' or 'average'
+            num_threads: number of threads used by the warp, default 1
+            warp_mem_limit: memory limit of the warp in MB, default 0 uses the GDAL default (64 MB)
+            dtype: floating dtype of the output, default None keeps the band dtype
 
-        Returns: new band object reprojected to match the to_band
+        Returns: new band object reprojected to match the to_band, a copy if both bands are on the same grid
         """
-        da_self = band_to_rio(self)
-        da_to_band = band_to_rio(to_band)
+        if resampling not in WARP_RESAMPLING:
+            raise NotImplementedError(
+                f'In Band reproject_match: {resampling} resampling is not implemented, '
+                f'use one of {list(WARP_RESAMPLING)}'
+            )
+
+        data = self.data
+        if dtype is None:
+            dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else get_dtype()
+        dtype = np.dtype(dtype)
+        if not np.issubdtype(dtype, np.floating):
+            raise NotImplementedError(f'In Band reproject_match: {dtype} is not a floating dtype')
+
+        # Same grid, nothing to resample
+        src_grid, dst_grid = self.grid, to_band.grid
+        if src_grid.same_as(dst_grid):
+            return Band(data=data.astype(dtype), grid=dst_grid)
+
+        # Integer-aligned grids, e.g., 20 m to 10 m Sentinel-2 bands, use a cached upsample plan
+        if resampling == 'nearest' and same_projection(src_grid.projection, dst_grid.projection):
+            plan = upsample_plan(
+                src_grid.geotransform, src_grid.shape,
+                dst_grid.geotransform, dst_grid.shape
+            )
+            if plan is not None:
+                return Band(
+                    data=apply_plan(data, plan, dtype=dtype),
+                    grid=dst_grid
+                )
+
+        # GDAL warps float32 and float64 natively, other floats go through float32
+        if data.dtype not in (np.float32, np.float64):
+            data = data.astype(np.float32)
+        warp_dtype = dtype if dtype in (np.float32, np.float64) else np.float32
+        destination = np.full(dst_grid.shape, np.nan, dtype=warp_dtype)
+
+        rasterio.warp.reproject(
+            source=data,
+            destination=destination,
+            src_transform=Affine.from_gdal(*src_grid.geotransform),
+            src_crs=rio_crs(src_grid.projection),
+            src_nodata=np.nan,
+            dst_transform=Affine.from_gdal(*dst_grid.geotransform),
+            dst_crs=rio_crs(dst_grid.projection),
+            dst_nodata=np.nan,
+            resampling=WARP_RESAMPLING[resampling],
+            num_threads=num_threads,
+            warp_mem_limit=warp_mem_limit
+        )
+
+        return Band(
+            data=destination.astype(dtype, copy=False),
+            grid=dst_grid
+        )
+
+    def _mask_keep(self, by, inverse=False):
+        """
+        Boolean array of the pixels kept by the mask 'by', see Band.mask
+        """
+        if not isinstance(by, Band):
+            raise NotImplementedError('In mask: mask must be a Band type')
 
-        da_self_matched = da_self.rio.reproject_match(da_to_band)
-        band_self_matched = rio_to_band(da_self_matched)
-        return band_self_matched
+        if inverse:
+            # what is in the mask, or nan in the mask, is dropped
+            return ~by._as_bool()
+        else:
+            # what is not in the mask, or nan in the mask, is dropped
+            keep = by._as_bool()
+            keep &= ~by._invalid()
+            return keep
 
-    def mask(self, by, inverse=False):
+    def mask(self, by, inverse=False, inplace=False):
         """
         Apply a mask 'by' on the band data - keeping the values presented by 1
         in mask 'by'. Set inverse to True for inverse masking.
@@ -220,62 +538,152 @@ class Band(object):
                 Mask band
             inverse: boolean
                 Inverse masking
+            inplace: boolean
+                If True, the dropped values are set to NaN in the band data
+                itself and the band is returned, without copying the data
+        """
+        keep = self._mask_keep(by, inverse=inverse)
+
+        if inplace and self.is_chunked:
+            self.data = np.where(keep, self.data, np.nan).astype(self.data.dtype)
+            return self
+        elif inplace:
+            data = self.data
+            if not data.flags.writeable:
+                # e.g., the data of a MaskBand, built on access
+                data = data.copy()
+            data[~keep] = np.nan
+            self.data = data
+            return self
+
+        return Band(
+            data=np.where(keep, self.data, np.nan).astype(self.data.dtype, copy=False),
+            grid=self.grid
+        )
+
+    def masked_stats(self, by, inverse=False, method='exact', error=1e-4):
         """
-        _data = copy.deepcopy(self.data)
-        if isinstance(by, Band):
-            if inverse:
-                # set what is in the mask to np.nan
-                _data[by.data.astype(bool)] = np.nan
-            else:
-                # set what is not in the mask to np.nan
-                by = by.logical_not()
-                _data[by.data.astype(bool)] = np.nan
+        Count, mean, standard deviation and median of the values kept by the
+        mask 'by', as the statistics of Band.mask, reading through the mask
+        without a masked copy of the band.
 
-            return(
-                Band(
-                    data=_data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+        argument:
+            by: Band
+                Mask band
+            inverse: boolean
+                Inverse masking
+            method: string
+                median method, see Band.quantile, always histogram for a chunked band
+            error: float
+                rank error bound of the histogram median
+
+        returns:
+            MaskedStats(count, mean, std, median)
+        """
+        keep = self._mask_keep(by, inverse=inverse)
+        stats = compute_stats(self.data, where=keep)
+
+        if method == 'exact' and self.is_chunked:
+            method = 'histogram'
+
+        if method == 'exact':
+            values = masked_values(self.data, keep)
+            median = np.quantile(values, 0.5, overwrite_input=True) if values.size > 0 else np.nan
+        elif method == 'histogram':
+            median = approx_quantile(self.data, 0.5, error=error, stats=stats, where=keep)
         else:
-            raise NotImplementedError('In mask: mask must be a Band type')
+            raise NotImplementedError('In Band masked_stats: method must be exact or histogram')
+
+        return MaskedStats(count=stats.count, mean=stats.mean, std=stats.std, median=median)
+
+    @property
+    def stats(self):
+        """
+        Count, minimum, maximum, mean and m2 of the non-NaN band data, computed
+        in a single pass and cached until the data is modified
+        """
+        if self._stats is None:
+            self._stats = compute_stats(self.data) if self.data is not None else EMPTY_STATS
+        return self._stats
 
     @property
     def min(self):
         """
         Minimum value of the band data
         """
-        return np.nanmin(self.data)
+        return self.stats.min
 
     @property
     def max(self):
         """
         Maximum value of the band data
         """
-        return np.nanmax(self.data)
+        return self.stats.max
 
     @property
     def mean(self):
         """
         Mean value of the band data
         """
-        return np.nanmean(self.data)
+        return self.stats.mean
 
     @property
     def std(self):
         """
         Standard deviation of the band data
         """
-        return np.nanstd(self.data)
+        return self.stats.std
 
     @property
     def median(self):
         """
-        Median of the band data
+        Median of the band data, approximated from histograms for a chunked band
         """
+        if self.is_chunked:
+            return self.quantile(0.5, method='histogram')
         return np.nanmedian(self.data)
 
+    def quantile(self, q, method='exact', error=1e-4):
+        """
+        Quantile of the band data.
+
+        argument:
+            q: float or array like
+                quantile or sequence of quantiles, between 0 and 1
+            method: string
+                exact - np.nanquantile, sorts a copy of the data
+                histogram - streaming histogram approximation, linear time and
+                    no copy of the data, see stats.approx_quantile
+            error: float
+                rank error bound of the histogram method as a fraction of the
+                number of values, default 1e-4
+
+        A chunked band always uses the histogram method, streaming over the
+        chunks instead of sorting the whole band in memory.
+
+        returns:
+            quantile value(s)
+        """
+        if method=='exact' and self.is_chunked:
+            method = 'histogram'
+
+        if method=='exact':
+            return np.nanquantile(self.data, q)
+        elif method=='histogram':
+            return approx_quantile(self.data, q, error=error, stats=self.stats)
+        else:
+            raise NotImplementedError('In Band quantile: method must be exact or histogram')
+
+    def percentile(self, p, method='exact', error=1e-4):
+        """
+        Percentile of the band data, see Band.quantile.
+
+        argument:
+            p: float or array like
+                percentile or sequence of percentiles, between 0 and 100
+        """
+        return self.quantile(np.asarray(p) / 100, method=method, error=error)
+
     def convolute(
         self, 
         kernel=[[0, -1, 0], [-1, 4, -1], [0, -1, 0]], 
@@ -283,7 +691,8 @@ class Band(object):
         replacevalue=np.nan, 
         fillvalue=0, 
         nanmask=True,
-        cleanedge=True):
+        cleanedge=True,
+        binary=False):
         """
         Convolute the data with the given kernel.
         
@@ -304,16 +713,24 @@ class Band(object):
                 higher than 1 to unity.
             cleanedge: boolean
                 set valus of two edge row and column to np.nan
+            binary: boolean
+                if True, the data is known to be binary, 0, 1 or NaN, and the
+                Laplace kernel is computed by `edges` without the convolution.
+                Default is False, see MaskBand for binary bands
 
         returns:
             Convoluted band: Band
         """
-        kernel = np.array(kernel)
+        kernel = np.array(kernel, dtype=get_dtype())
 
         if replacenan:
             self.set_missing(value=np.nan, to=replacevalue)
 
-        conv = sps.convolve2d(self.data, kernel, mode='same', boundary='fill', fillvalue=0)
+        if binary and np.array_equal(kernel, KERNEL_LAPLACE):
+            # Land/water boundary of a binary band, no need for the convolution
+            return self.edges(nanmask=nanmask, cleanedge=cleanedge, check=False)
+
+        conv = sps.convolve2d(self.data.astype(get_dtype(), copy=False), kernel, mode='same', boundary='fill', fillvalue=0)
         
         if nanmask:
             conv[conv<1] = np.nan
@@ -330,11 +747,85 @@ class Band(object):
         return(
             Band(
                 data=conv,
-                geotransform=self.geotransform,
-                projection=self.projection
+                grid=self.grid
             )
         )
 
+    def _is_binary(self):
+        """
+        True if the band data contains only 0, 1 and NaN
+        """
+        data = self.data
+        return bool(np.all((data == 0) | (data == 1) | np.isnan(data)))
+
+    def edges(
+        self,
+        replacenan=False,
+        replacevalue=np.nan,
+        nanmask=True,
+        cleanedge=True,
+        indices=False,
+        check=True):
+        """
+        Boundary pixels of a binary band, i.e., the pixels with value 1 having
+        at least one 4-connected neighbour with value 0. Gives the same result
+        as `convolute` with the Laplace kernel, using comparisons of shifted
+        neighbours on boolean arrays instead of the float convolution.
+
+        arguments:
+            replacenan: boolean
+                if True, the nan values in the data will be replaced with
+                `replacevalue`. Default is False
+            replacevalue: 0, 1 or np.nan
+                if replacenan, then nan values in the data will be replaced with
+                this value. Default is np.nan
+            nanmask: boolean
+                if True, the boundary pixels are 1 and others NaN, otherwise the
+                values of the Laplace convolution are returned
+            cleanedge: boolean
+                set valus of two edge row and column to np.nan
+            indices: boolean
+                if True, return only the row and column indices of the boundary
+                pixels, as returned by np.nonzero. Requires nanmask.
+            check: boolean
+                if True, raise if the data is not binary, a full scan of the
+                data. Default is True, False when the caller knows the data is
+                binary, e.g., convolute with binary=True
+
+        returns:
+            Boundary band: MaskBand, Band if not nanmask, or tuple of indices
+        """
+        if replacenan:
+            self.set_missing(value=np.nan, to=replacevalue)
+
+        if check and not self._is_binary():
+            raise ValueError('In Band edges: data must be binary, 0, 1 or NaN')
+
+        value = self._as_bool()
+        invalid = dilate_box(self._invalid())
+
+        if cleanedge:
+            invalid[:, 0:2] = True
+            invalid[:, -2:] = True
+            invalid[0:2, :] = True
+            invalid[-2:, :] = True
+
+        if nanmask:
+            edge = laplace_edges(value)
+            edge &= ~invalid
+            if indices:
+                return np.nonzero(edge)
+            return _mask_band_valid(np.ones(edge.shape, dtype=bool), edge, self)
+        else:
+            if indices:
+                raise ValueError('In Band edges: indices requires nanmask')
+            conv = laplace_values(value).astype(get_dtype())
+            conv[invalid] = np.nan
+            return Band(
+                data=conv,
+                grid=self.grid
+            )
+
     def position(self, xyloc, epsg=4326, center=True, saveto=None):
         """
         Return the position of the given pixel location by array of x,y in xyloc
@@ -361,18 +852,9 @@ class Band(object):
         xi = np.array(xyloc[1]) # column location
 
         try:
-            crs_in = osr.SpatialReference()
-            crs_in.ImportFromWkt(self.projection)
-        except:
-            raise RuntimeError('In Band.position(): problem with projection')
-
-        try:
-            crs_out = osr.SpatialReference()
-            crs_out.ImportFromEPSG(epsg)
-        except:
-            raise RuntimeError('In Band.position(): problem with epsg')
-        else:
-            transformer = osr.CoordinateTransformation(crs_in, crs_out)
+            transformer = get_transformer(self.projection, epsg)
+        except Exception:
+            raise RuntimeError('In Band.position(): problem with projection or epsg')
 
         # Position of pixel in source coordinate
         x = self.geotransform[0] + xi*self.geotransform[1] + yi*self.geotransform[2]
@@ -383,25 +865,24 @@ class Band(object):
         if center:
             y = y + self.geotransform[5]/float(2)
 
-        # Transformed position of pixels
-        try:
-            assert zip(x, y)
-        except:
-            xyout = transformer.TransformPoint(x, y)[0:2]
+        # Transformed position of pixels, all at once
+        xout, yout = transformer.transform(x, y)
+        if np.ndim(xout) == 0:
+            xyout = (float(xout), float(yout))
         else:
-            xyout = np.array([transformer.TransformPoint(xx, yy)[0:2] for xx,yy in zip(x, y)])
-        finally:
-            if saveto is None:
-                return(xyout)
-            else:
-                np.savetxt(
-                    fname=saveto, 
-                    X=xyout, 
-                    fmt='%f', 
-                    delimiter=',',
-                    comments='',
-                    header='lat,lon'
-                )
+            xyout = np.column_stack([xout, yout])
+
+        if saveto is None:
+            return(xyout)
+        else:
+            np.savetxt(
+                fname=saveto, 
+                X=xyout, 
+                fmt='%f', 
+                delimiter=',',
+                comments='',
+                header='lat,lon'
+            )
 
     def clean(self, npixel, fillvalue, background=False):
         """
@@ -420,26 +901,56 @@ class Band(object):
         """
         inan = np.isnan(self.data)
         if background:
-            data = np.zeros(shape=self.data.shape)
-            labels, _ = scm.label(self.data)
+            base = 0
+            foreground = self.data != 0
         else:
-            data = np.ones(shape=self.data.shape)
-            labels, _ = scm.label(np.nanmax(self.data)-self.data)
-        
-        _, count = np.unique(labels, return_counts=True)
-        retained_labels = np.argwhere(count>=npixel).ravel()
-        retained_labels = retained_labels[retained_labels>0]
+            base = 1
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                foreground = self.data != np.nanmax(self.data)
 
-        for label in retained_labels:
-            data[labels==label] = fillvalue
+        retained = retained_blobs(foreground, npixel)
 
+        data = np.full(self.data.shape, base, dtype=get_dtype())
+        data[retained] = fillvalue
         data[inan] = np.nan
 
         return(
             Band(
                 data=data,
-                geotransform=self.geotransform,
-                projection=self.projection
+                grid=self.grid
+            )
+        )
+
+    def clean_blobs(self, waterblob, landblob):
+        """
+        Clean both the small water bodies over land and the small land bodies
+        over water in one call. Equivalent to
+
+            band.clean(npixel=waterblob, fillvalue=0, background=False).clean(
+                npixel=landblob, fillvalue=1, background=True)
+
+        without the intermediate band.
+
+        argument:
+            waterblob: int like
+                minimum size of water body over land
+            landblob: int like
+                minimum size of land body over water
+        """
+        inan = np.isnan(self.data)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            water = retained_blobs(self.data != np.nanmax(self.data), waterblob)
+        land = retained_blobs(np.logical_or(np.logical_not(water), inan), landblob)
+
+        data = land.astype(get_dtype())
+        data[inan] = np.nan
+
+        return(
+            Band(
+                data=data,
+                grid=self.grid
             )
         )
 
@@ -452,8 +963,7 @@ class Band(object):
         """
         return Band(
             data=np.isnan(self.data),
-            geotransform=self.geotransform,
-            projection=self.projection
+            grid=self.grid
         )
 
     def astype(self, dtype):
@@ -470,10 +980,24 @@ class Band(object):
 
         return Band(
             data=self.data.astype(dtype),
-            geotransform=self.geotransform,
-            projection=self.projection
+            grid=self.grid
         )
 
+    def lazy(self):
+        """
+        Lazy expression of the band: the operators on it build an expression
+        evaluated in a single chunked pass by compute(), see
+        pyintdem.models.expression.
+
+            red = ((red.lazy() * alpha.lazy()) + (alpha.lazy() * -1 + 1)).compute()
+
+        returns:
+            BandExpression
+        """
+        from .expression import BandExpression
+
+        return BandExpression.from_band(self)
+
     def __repr__(self):
         """
         Print representation
@@ -485,12 +1009,11 @@ class Band(object):
         Return a modified band with another band data or value added to the
         current band data.
         """
-        if isinstance(other, (int, float)):
+        if isinstance(other, (int, float, np.number)):
             return(
                 Band(
                     data=self.data+float(other),
-                    geotransform=self.geotransform,
-                    projection=self.projection
+                    grid=self.grid
                 )
             )
         elif isinstance(other, Band):
@@ -502,10 +1025,11 @@ class Band(object):
                 return(
                     Band(
                         data=self.data+other.data,
-                        geotransform=self.geotransform,
-                        projection=self.projection
+                        grid=self.grid
                     )
                 )
+        elif _is_expression(other):
+            return self.lazy() + other
         else:
             raise NotImplementedError('In Band add: other datatype not implemented')
 
@@ -514,7 +1038,7 @@ class Band(object):
         Return a modified band with another band data or value added to the
         current band data.
         """
-        if isinstance(other, (int, float)):
+        if isinstance(other, (int, float, np.number)):
             return Band.__add__(self, other)
         else:
             raise NotImplementedError('In Band radd: only int and float is implemented')
@@ -524,12 +1048,11 @@ class Band(object):
         Return a modified band with another band data or value subtracted from
         the current band data.
         """
-        if isinstance(other, (int, float)):
+        if isinstance(other, (int, float, np.number)):
             return(
                 Band(
                     data=self.data-float(other),
-                    geotransform=self.geotransform,
-                    projection=self.projection
+                    grid=self.grid
                 )
             )
         elif isinstance(other, Band):
@@ -541,10 +1064,11 @@ class Band(object):
                 return(
                     Band(
                         data=self.data-other.data,
-                        geotransform=self.geotransform,
-                        projection=self.projection
+                        grid=self.grid
                     )
                 )
+        elif _is_expression(other):
+            return self.lazy() - other
         else:
             raise NotImplementedError('In Band sub: other datatype not implemented')
 
@@ -553,7 +1077,7 @@ class Band(object):
         Return a modified band with another band data or value subtracted from
         the current band data.
         """
-        if isinstance(other, (int, float)):
+        if isinstance(other, (int, float, np.number)):
             return Band.__sub__(self, other)
         else:
             raise NotImplementedError('In Band rsub: only int and float is implemented')
@@ -563,12 +1087,11 @@ class Band(object):
         Return a modified band with another band data or value multiplied to the
         current band data.
         """
-        if isinstance(other, (int, float)):
+        if isinstance(other, (int, float, np.number)):
             return(
                 Band(
                     data=self.data*float(other),
-                    geotransform=self.geotransform,
-                    projection=self.projection
+                    grid=self.grid
                 )
             )
         elif isinstance(other, Band):
@@ -580,10 +1103,11 @@ class Band(object):
                 return(
                     Band(
                         data=self.data*other.data,
-                        geotransform=self.geotransform,
-                        projection=self.projection
+                        grid=self.grid
                     )
                 )
+        elif _is_expression(other):
+            return self.lazy() * other
         else:
             raise NotImplementedError('In Band mul: other datatype not implemented')
 
@@ -592,12 +1116,11 @@ class Band(object):
         Return a modified band with another band data or value dividing the
         current band data.
         """
-        if isinstance(other, (int, float)):
+        if isinstance(other, (int, float, np.number)):
             return(
                 Band(
                     data=self.data/float(other),
-                    geotransform=self.geotransform,
-                    projection=self.projection
+                    grid=self.grid
                 )
             )
         elif isinstance(other, Band):
@@ -609,10 +1132,11 @@ class Band(object):
                 return(
                     Band(
                         data=self.data/other.data,
-                        geotransform=self.geotransform,
-                        projection=self.projection
+                        grid=self.grid
                     )
                 )
+        elif _is_expression(other):
+            return self.lazy() / other
         else:
             raise NotImplementedError('In Band div: other datatype not implemented')
 
@@ -621,33 +1145,17 @@ class Band(object):
         Return a modified logical band which is true if the values are greater
         than the other and false if otherwise.
         """
-        if isinstance(other, (int, float)):
-            _data = self.data>float(other)
-            _data = _data.astype(float)
-            _data[np.isnan(self.data)] = np.nan
-            return(
-                Band(
-                    data=_data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+        if isinstance(other, (int, float, np.number)):
+            return _mask_band(self.data>float(other), self)
         elif isinstance(other, Band):
             try:
                 assert np.all(self.data.shape==other.data.shape)
             except:
                 raise AssertionError('In Band gt: size mismatch')
             else:
-                _data = self.data>other.data
-                _data = _data.astype(float)
-                _data[np.isnan(self.data)] = np.nan
-                return(
-                    Band(
-                        data=_data,
-                        geotransform=self.geotransform,
-                        projection=self.projection
-                    )
-                )
+                return _mask_band(self.data>other.data, self)
+        elif _is_expression(other):
+            return self.lazy() > other
         else:
             raise NotImplementedError('In Band gt: other datatype not implemented')
 
@@ -656,33 +1164,17 @@ class Band(object):
         Return a binary band which is true if the values are greater
         than the other and false if otherwise.
         """
-        if isinstance(other, (int, float)):
-            _data = self.data>=float(other)
-            _data = _data.astype(float)
-            _data[np.isnan(self.data)] = np.nan
-            return(
-                Band(
-                    data=_data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+        if isinstance(other, (int, float, np.number)):
+            return _mask_band(self.data>=float(other), self)
         elif isinstance(other, Band):
             try:
                 assert np.all(self.data.shape==other.data.shape)
             except:
                 raise AssertionError('In Band ge: size mismatch')
             else:
-                _data = self.data>=other.data
-                _data = _data.astype(float)
-                _data[np.isnan(self.data)] = np.nan
-                return(
-                    Band(
-                        data=_data,
-                        geotransform=self.geotransform,
-                        projection=self.projection
-                    )
-                )
+                return _mask_band(self.data>=other.data, self)
+        elif _is_expression(other):
+            return self.lazy() >= other
         else:
             raise NotImplementedError('In Band ge: other datatype not implemented')
 
@@ -691,33 +1183,17 @@ class Band(object):
         Return a binary band which is true if the values are greater
         than the other and false if otherwise.
         """
-        if isinstance(other, (int, float)):
-            _data = self.data<float(other)
-            _data = _data.astype(float)
-            _data[np.isnan(self.data)] = np.nan
-            return(
-                Band(
-                    data=_data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+        if isinstance(other, (int, float, np.number)):
+            return _mask_band(self.data<float(other), self)
         elif isinstance(other, Band):
             try:
                 assert np.all(self.data.shape==other.data.shape)
             except:
                 raise AssertionError('In Band lt: size mismatch')
             else:
-                _data = self.data<other.data
-                _data = _data.astype(float)
-                _data[np.isnan(self.data)] = np.nan
-                return(
-                    Band(
-                        data=_data,
-                        geotransform=self.geotransform,
-                        projection=self.projection
-                    )
-                )
+                return _mask_band(self.data<other.data, self)
+        elif _is_expression(other):
+            return self.lazy() < other
         else:
             raise NotImplementedError('In Band lt: other datatype not implemented')
 
@@ -726,31 +1202,17 @@ class Band(object):
         Return a modified logical band which is true if the values are greater
         than the other and false if otherwise.
         """
-        if isinstance(other, (int, float)):
-            data = self.data<=float(other)
-            data[np.isnan(self.data)] = np.nan
-            return(
-                Band(
-                    data=data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+        if isinstance(other, (int, float, np.number)):
+            return _mask_band(self.data<=float(other), self)
         elif isinstance(other, Band):
             try:
                 assert np.all(self.data.shape==other.data.shape)
             except:
                 raise AssertionError('In Band le: size mismatch')
             else:
-                data = self.data<=other.data
-                data[np.isnan(self.data)] = np.nan
-                return(
-                    Band(
-                        data=data,
-                        geotransform=self.geotransform,
-                        projection=self.projection
-                    )
-                )
+                return _mask_band(self.data<=other.data, self)
+        elif _is_expression(other):
+            return self.lazy() <= other
         else:
             raise NotImplementedError('In Band le: other datatype not implemented')
 
@@ -759,16 +1221,9 @@ class Band(object):
         Logical and connection of two Band data
         """
         if isinstance(other, Band):
-            _data = np.logical_and(self.data, other.data)
-            _data = _data.astype(float)
-            _data[np.isnan(self.data)] = np.nan
-            return(
-                Band(
-                    data=_data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+            return _mask_band(np.logical_and(self._as_bool(), other._as_bool()), self)
+        elif _is_expression(other):
+            return self.lazy().logical_and(other)
         else:
             raise NotImplementedError('In Band logical_and: only Band data in implemented')
 
@@ -777,16 +1232,9 @@ class Band(object):
         Logical or of two Band data
         """
         if isinstance(other, Band):
-            _data = np.logical_or(self.data, other.data)
-            _data = _data.astype(float)
-            _data[np.isnan(self.data)] = np.nan
-            return(
-                Band(
-                    data=_data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+            return _mask_band(np.logical_or(self._as_bool(), other._as_bool()), self)
+        elif _is_expression(other):
+            return self.lazy().logical_or(other)
         else:
             raise NotImplementedError('In Band logical_or: only Band data is implemented')
     
@@ -794,66 +1242,30 @@ class Band(object):
         """
         Logical not of a Band
         """
-        _data = np.logical_not(self.data)
-        _data = _data.astype(float)
-        _data[np.isnan(self.data)] = np.nan
-        return(
-            Band(
-                data=_data,
-                geotransform=self.geotransform,
-                projection=self.projection
-            )
-        )
+        return _mask_band(np.logical_not(self.data), self)
 
     def nan_avg(self, other):
         """
-        Do a nan average with other.
+        Do a nan average with other, see BandAccumulator for many bands.
         """
         if isinstance(other, Band):
-            _data = np.empty((self.data.shape[0], self.data.shape[1], 2), dtype=float)
-            _data[:, :, 0] = self.data
-            _data[:, :, 1] = other.data
-            
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", category=RuntimeWarning)
-                _data = np.nanmean(_data, axis=-1, keepdims=False)
-
-            return(
-                Band(
-                    data=_data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+            return _accumulate(self, other).mean
         else:
             raise NotImplementedError('In Band nan_avg: only Band data is implemented')
-    
+
     def nan_sum(self, other):
         """
-        Do a nan sum with other.
+        Do a nan sum with other, see BandAccumulator for many bands.
         """
         if isinstance(other, Band):
-            _data = np.empty((self.data.shape[0], self.data.shape[1], 2), dtype=float)
-            _data[:, :, 0] = self.data
-            _data[:, :, 1] = other.data
-            
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", category=RuntimeWarning)
-                _data = np.nansum(_data, axis=-1, keepdims=False)
-
-            return(
-                Band(
-                    data=_data,
-                    geotransform=self.geotransform,
-                    projection=self.projection
-                )
-            )
+            return _accumulate(self, other).sum
         else:
             raise NotImplementedError('In Band nan_avg: only Band data is implemented')
 
-    def to_geotiff(self, fname, epsg=None, dtype='float32'):
+    def to_geotiff(self, fname, epsg=None, dtype='float32', quantize=None, **kwargs):
         """
-        Save band data to geotiff to location passed by `fname` with `epsg`.
+        Save band data to a tiled and compressed geotiff to location passed by
+        `fname` with `epsg`, see pyintdem.models.geotiff.write_geotiff.
 
         argument:
             fname: string
@@ -861,15 +1273,32 @@ class Band(object):
             epsg: epsg code
                 epsg code to reproject the data. `None` saves the data to
                 original projection. Default `None`
-
-        """
-        fname = Path(fname).as_posix()
-        da_self = band_to_rio(self)
-
+            dtype: string
+                dtype of the file, default `float32` with NaN nodata
+            quantize: tuple or boolean
+                store the band as uint16 codes of the range (vmin, vmax), True
+                for (0, 1), with the scale and offset decoded by read_file and
+                Band.read; the values are clipped to the range and decoded
+                within scale / 2 = (vmax - vmin) / 131068, plus the rounding
+                of the processing dtype, e.g., below 7.7e-6 for (0, 1) in
+                float32, see pyintdem.models.geotiff.quantization. Default
+                None (`dtype`)
+            kwargs:
+                compression, overview and COG options of write_geotiff, e.g.,
+                compress='zstd', overviews=True, cog=True
+        """
+        band = self
         if epsg is not None:
-            da_self = da_self.reproject(epsg=epsg)
+            band = rio_to_band(band_to_rio(self).rio.reproject(epsg))
 
-        da_self.rio.to_raster(fname, dtype=dtype)
+        if quantize:
+            scale, offset = quantization(*((0.0, 1.0) if quantize is True else quantize))
+            write_geotiff(
+                fname, quantize_data(band.data, scale, offset), band.grid, dtype=QUANTIZED_DTYPE,
+                nodata=QUANTIZED_NODATA, scale=scale, offset=offset, **kwargs
+            )
+        else:
+            write_geotiff(fname, band.data, band.grid, dtype=dtype, **kwargs)
 
     def to_netcdf(self, fname, epsg=None):
         """
@@ -888,7 +1317,8 @@ class Band(object):
 
         da_self.to_netcdf(fname)
 
-    def plot(self, title='Band', cmap='binary', saveto=None):
+    def plot(self, title='Band', cmap='binary', saveto=None, quicklook=False, max_pixels=QUICKLOOK_PIXELS,
+             stretch=None):
         """
         Plotting function with given title, cmap
 
@@ -899,9 +1329,27 @@ class Band(object):
                 colormap name
             saveto: string
                 saving location
-        """
+            quicklook: boolean
+                plot the band block-averaged to `max_pixels`, written to
+                `saveto` as PNG by a reused Agg figure, see
+                pyintdem.models.quicklook. Default False (full resolution)
+            max_pixels: integer
+                pixel budget of the quicklook, default about 1024x1024
+            stretch: tuple
+                lower and upper percentiles of the color limits, e.g.,
+                (2, 98), default None for the data range
+        """
+        image = self._quicklook(max_pixels) if quicklook else self.data
+        vmin, vmax = None, None
+        if stretch is not None:
+            vmin, vmax = np.nanpercentile(image, stretch)
+
+        if quicklook and saveto is not None:
+            render_png(image, saveto, title=title, cmap=cmap, vmin=vmin, vmax=vmax)
+            return
+
         fig, ax = plt.subplots()
-        im = ax.imshow(self.data, cmap=cmap)
+        im = ax.imshow(image, cmap=cmap, vmin=vmin, vmax=vmax)
         plt.colorbar(im)
         plt.title(title)
         if saveto is None:
@@ -913,38 +1361,453 @@ class Band(object):
         del fig, ax
         gc.collect()
 
+    def _quicklook(self, max_pixels=QUICKLOOK_PIXELS):
+        """
+        Band data block-averaged to at most `max_pixels` pixels
+        """
+        return decimate(self.data, max_pixels)
+
+
+def dilate_box(mask):
+    """
+    Dilate a boolean array by a 3x3 box, using shifted copies. This is the
+    footprint over which a NaN spreads in a 3x3 convolution.
+
+    Args:
+        mask: 2D boolean array
+
+    Returns: dilated boolean array
+
+    """
+    out = mask.copy()
+    out[1:, :] |= mask[:-1, :]
+    out[:-1, :] |= mask[1:, :]
+    rows = out.copy()
+    out[:, 1:] |= rows[:, :-1]
+    out[:, :-1] |= rows[:, 1:]
+    return out
+
+
+def laplace_edges(value):
+    """
+    Boundary pixels of a boolean array, True where the pixel is True and at
+    least one of its 4-connected neighbours is False. Pixels outside the array
+    are False, as the zero filled boundary of the convolution.
+
+    Equivalent to `convolve2d(value, KERNEL_LAPLACE, mode='same') >= 1`.
+
+    Args:
+        value: 2D boolean array
+
+    Returns: boolean array of the boundary pixels
+
+    """
+    interior = np.zeros(value.shape, dtype=bool)
+    interior[1:-1, 1:-1] = value[:-2, 1:-1]
+    interior[1:-1, 1:-1] &= value[2:, 1:-1]
+    interior[1:-1, 1:-1] &= value[1:-1, :-2]
+    interior[1:-1, 1:-1] &= value[1:-1, 2:]
+    return value & ~interior
+
+
+def laplace_values(value):
+    """
+    Convolution of a boolean array with the Laplace kernel, with zero filled
+    boundary, computed from the shifted neighbours.
+
+    Args:
+        value: 2D boolean array
+
+    Returns: int8 array with values from -4 to 4
+
+    """
+    value = value.view(np.int8)
+    conv = 4 * value
+    conv[1:, :] -= value[:-1, :]
+    conv[:-1, :] -= value[1:, :]
+    conv[:, 1:] -= value[:, :-1]
+    conv[:, :-1] -= value[:, 1:]
+    return conv
+
+
+def retained_blobs(foreground, npixel):
+    """
+    Find the pixels of the connected blobs of `foreground` having at least
+    `npixel` pixels. The blob sizes are counted in one pass over the label
+    image and mapped back through a lookup table indexed by label.
+
+    Args:
+        foreground: 2D array, nonzero values are labelled
+        npixel: minimum size of the retained blobs
+
+    Returns: boolean array, True for the pixels of the retained blobs
+
+    """
+    labels, _ = scm.label(foreground)
+    count = np.bincount(labels.ravel())
+    retained = count >= npixel
+    retained[0] = False
+    return retained[labels]
+
+
+def _is_expression(other):
+    """
+    True if other is a lazy BandExpression, imported here to avoid a circular import
+    """
+    from .expression import BandExpression
+
+    return isinstance(other, BandExpression)
+
+
+def _accumulate(*bands):
+    """
+    BandAccumulator of bands, imported here to avoid a circular import
+    """
+    from .accumulator import BandAccumulator
+
+    accumulator = BandAccumulator()
+    for band in bands:
+        accumulator.update(band)
+    return accumulator
+
+
+def _mask_band(value, band):
+    """
+    Create a MaskBand from a boolean array on the grid of `band`, invalid
+    where the band data is NaN.
+    """
+    return _mask_band_valid(value, np.logical_not(np.isnan(band.data)), band)
+
+
+def _mask_band_valid(value, valid, band):
+    """
+    Create a MaskBand from boolean value and valid arrays on the grid of `band`.
+    """
+    from .mask import MaskBand
+
+    if is_chunked(value) or is_chunked(valid):
+        # lazy float band of 1, 0 and NaN, the data of the MaskBand
+        dtype = get_dtype()
+        return Band(
+            data=np.where(valid, value.astype(dtype), dtype.type(np.nan)),
+            grid=band.grid
+        )
+
+    return MaskBand(
+        value=value,
+        valid=valid,
+        grid=band.grid
+    )
+
+
+def clip_geometries(bbox=None, geoms=None) -> np.ndarray:
+    """
+    Combine a bounding box and a list of geometries into a single array of
+    clipping geometries.
+
+    Args:
+        bbox: bounding box as [e, w, s, n] in lon-lat cooordinates; epsg:4326
+        geoms: a list of geometries, e.g., from geopandas.geometry; epsg:4326
+
+    Returns: np.ndarray of geometries, empty if neither is given
+
+    """
+    clip_geom = np.array([])
+
+    if bbox is not None:
+        bbox = extent2geometries(bbox)
+        clip_geom = np.append(clip_geom, bbox)
+
+    if geoms is not None:
+        geoms = np.atleast_1d(geoms)
+        clip_geom = np.append(clip_geom, geoms)
+
+    return clip_geom
+
+
+def geometries_key(geometries):
+    """
+    Hashable key of a set of geometries, their WKB representation.
+
+    Args:
+        geometries: a geometry, a list of geometries or a GeoSeries
+
+    Returns: tuple of bytes
+
+    """
+    return tuple(shapely.to_wkb(np.atleast_1d(np.asarray(geometries, dtype=object))))
+
+
+def project_geometries(bbox=None, geoms=None, projection=None) -> gpd.GeoSeries:
+    """
+    Clipping geometries from a bounding box and a list of geometries, projected
+    to the projection of a band. The projected geometries are cached.
+
+    Args:
+        bbox: bounding box as [e, w, s, n] in lon-lat cooordinates; epsg:4326
+        geoms: a list of geometries, e.g., from geopandas.geometry; epsg:4326
+        projection: target projection, e.g., band.projection
+
+    Returns: gpd.GeoSeries, empty if neither bbox nor geoms is given
+
+    """
+    bbox = None if bbox is None else tuple(np.ravel(bbox).tolist())
+    geoms = None if geoms is None else geometries_key(geoms)
+
+    return _project_geometries(bbox, geoms, projection)
+
+
+@lru_cache(maxsize=32)
+def _project_geometries(bbox, geoms_wkb, projection):
+    geoms = None if geoms_wkb is None else shapely.from_wkb(list(geoms_wkb))
+    clip_geom = clip_geometries(bbox=bbox, geoms=geoms)
+    clip_geom = gpd.GeoSeries(clip_geom, crs=4326)
+
+    if len(clip_geom) == 0:
+        return clip_geom
+
+    return clip_geom.to_crs(projection)
+
+
+def geometry_mask_window(geometries, geotransform, shape):
+    """
+    Pixels touched by the geometries, as rio.clip(all_touched=True, drop=True).
+
+    The geometries are rasterized once per grid and set of geometries: the
+    result is cached in memory up to a total size (least recently used are
+    evicted, see plancache.PLAN_CACHE_BYTES), and on disk if a cache directory
+    is set, see pyintdem.config.set_cache_dir.
+
+    Args:
+        geometries: geometries in the projection of the grid
+        geotransform: GDAL geotransform of the grid
+        shape: (rows, columns) of the grid
+
+    Returns: (rows slice, columns slice, inside) where inside is the read-only bool mask of
+        the touched pixels in the smallest window enclosing them
+
+    """
+    return _geometry_mask_window(
+        tuple(float(v) for v in geotransform),
+        tuple(int(n) for n in shape),
+        geometries_key(geometries)
+    )
+
+
+@plan_cache()
+def _geometry_mask_window(geotransform, shape, geoms_wkb):
+    cache_dir = get_cache_dir()
+    fname = None
+    if cache_dir is not None:
+        key = hashlib.sha1(repr((geotransform, shape)).encode() + b''.join(geoms_wkb)).hexdigest()[:16]
+        fname = cache_dir / f'clipmask_{key}.npz'
+        if fname.exists():
+            with np.load(fname) as cached:
+                row0, row1, col0, col1 = cached['window']
+                inside = np.unpackbits(cached['inside'], count=(row1 - row0) * (col1 - col0))
+            inside = inside.astype(bool).reshape(row1 - row0, col1 - col0)
+            inside.flags.writeable = False
+            return slice(int(row0), int(row1)), slice(int(col0), int(col1)), inside
+
+    inside = rasterio.features.geometry_mask(
+        shapely.from_wkb(list(geoms_wkb)),
+        out_shape=shape,
+        transform=Affine.from_gdal(*geotransform),
+        all_touched=True,
+        invert=True
+    )
+
+    irows = np.flatnonzero(inside.any(axis=1))
+    icols = np.flatnonzero(inside.any(axis=0))
+    if irows.size == 0:
+        raise NoDataInBounds('In Band clip: no data found in the clip geometries')
+
+    rows = slice(int(irows[0]), int(irows[-1]) + 1)
+    cols = slice(int(icols[0]), int(icols[-1]) + 1)
+    # copy of the window only, the full grid mask is released
+    inside = inside[rows, cols].copy()
+    inside.flags.writeable = False
+
+    if fname is not None:
+        np.savez(
+            fname,
+            window=np.array([rows.start, rows.stop, cols.start, cols.stop]),
+            inside=np.packbits(inside, axis=None)
+        )
+
+    return rows, cols, inside
+
+
+def window_geotransform(geotransform, rows, cols):
+    """
+    Geotransform of a window of a grid.
+
+    Args:
+        geotransform: GDAL geotransform of the grid
+        rows: slice of the rows of the window
+        cols: slice of the columns of the window
+
+    Returns: tuple
+
+    """
+    x0, dx, rx, y0, ry, dy = geotransform
+    row0 = rows.start or 0
+    col0 = cols.start or 0
+    return x0 + col0 * dx + row0 * rx, dx, rx, y0 + col0 * ry + row0 * dy, ry, dy
+
+
+def clip_to_geometries(band, geometries) -> Band:
+    """
+    Clip a band to the pixels touched by geometries already in the band
+    projection, setting the pixels outside to NaN and cropping to the
+    smallest enclosing window.
+
+    Args:
+        band: Band
+        geometries: geometries in the band projection, see project_geometries
+
+    Returns: clipped Band
+
+    """
+    rows, cols, inside = geometry_mask_window(geometries, band.geotransform, band.shape)
+
+    data = band.data[rows, cols]
+    dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else get_dtype()
+    data = np.where(inside, data, np.nan).astype(dtype, copy=False)
+
+    return Band(
+        data=data,
+        geotransform=window_geotransform(band.geotransform, rows, cols),
+        projection=band.projection
+    )
+
+
+@plan_cache()
+def grid_coords(geotransform, shape):
+    """
+    Cell centre coordinates of a north-up grid, cached per grid.
+
+    Args:
+        geotransform: GDAL geotransform as a tuple
+        shape: (rows, columns)
+
+    Returns: read-only x and y coordinate arrays
+
+    """
+    x_start, dx, _, y_start, _, dy = geotransform
+    ny, nx = shape
+    # same values as np.arange(start, stop, step), without the risk of an extra element
+    x = x_start + dx / 2 + np.arange(nx) * dx
+    y = y_start + dy / 2 + np.arange(ny) * dy
+    x.flags.writeable = False
+    y.flags.writeable = False
+
+    return x, y
+
+
+@lru_cache(maxsize=16)
+def rio_crs(projection):
+    """
+    Parsed rasterio CRS of a projection, cached per WKT string.
+
+    Args:
+        projection: projection as WKT or anything accepted by rasterio
+
+    Returns: rasterio.crs.CRS
+
+    """
+    return crs_from_user_input(projection)
+
+
+def same_projection(a, b):
+    """
+    True if two projections describe the same CRS.
+
+    Args:
+        a: projection as WKT or anything accepted by rasterio
+        b: projection as WKT or anything accepted by rasterio
+
+    Returns: bool
+
+    """
+    if a == b:
+        return True
+    if a is None or b is None:
+        return False
+    return rio_crs(a) == rio_crs(b)
+
+
+@lru_cache(maxsize=16)
+def grid_mapping_attrs(projection):
+    """
+    CF grid mapping attributes of a projection, as written by rio.write_crs,
+    cached per WKT string. Callers get a copy of the cached dictionary.
+
+    Args:
+        projection: projection as WKT or anything accepted by rasterio
+
+    Returns: dict
+
+    """
+    crs = rio_crs(projection)
+    try:
+        attrs = pyproj.CRS.from_user_input(crs).to_cf()
+    except KeyError:
+        attrs = {}
+    crs_wkt = crs.to_wkt()
+    attrs['spatial_ref'] = crs_wkt
+    attrs['crs_wkt'] = crs_wkt
+
+    return attrs
+
 
 def band_to_rio(band: Band) -> xr.DataArray:
     """
-    Convert a band to a rioxarray DataArray
+    Convert a band to a rioxarray DataArray, sharing the band data buffer
+    (no copy). The coordinates and the CRS attributes are cached per grid.
+
     Args:
         band: A core.Band dataset
 
     Returns: xr.DataArray
 
     """
-    x_start, dx, _, y_start, _, dy = band.geotransform
-    ny, nx = band.data.shape
-    x = np.arange(x_start + dx / 2, x_start + (nx + 0.5) * dx, dx)
-    y = np.arange(y_start + dy / 2, y_start + (ny + 0.5) * dy, dy)
-    ds = xr.DataArray(band.data, dims=('y', 'x'), coords={'x': x, 'y': y})
-    ds.rio.write_crs(band.projection, inplace=True)
+    grid = band.grid
+    x, y = grid_coords(grid.geotransform, grid.shape)
+    coords = {'x': x, 'y': y}
+    if grid.projection is not None:
+        coords['spatial_ref'] = xr.Variable((), 0, attrs=dict(grid_mapping_attrs(grid.projection)))
+
+    ds = xr.DataArray(band.data, dims=('y', 'x'), coords=coords)
+    if grid.projection is not None:
+        ds.encoding['grid_mapping'] = 'spatial_ref'
 
     return ds
 
 def rio_to_band(da: xr.DataArray) -> Band:
     """
-    Convert a rioxarray DataArray to band data
+    Convert a rioxarray DataArray to band data, sharing the data buffer if
+    the DataArray is backed by a numpy array (no copy).
+
     Args:
         da: xr.DataArray with rioxarray projection
 
-    Returns: xr.DataArray
+    Returns: Band
 
     """
+    # the WKT stored by rio.write_crs avoids re-serializing the parsed CRS
+    grid_mapping = da.rio.grid_mapping
+    projection = None
+    if grid_mapping in da.coords:
+        attrs = da.coords[grid_mapping].attrs
+        projection = attrs.get('crs_wkt', attrs.get('spatial_ref'))
+    if projection is None and da.rio.crs is not None:
+        projection = da.rio.crs.to_wkt()
+
     band = Band(
         data=da.values,
         geotransform=da.rio.transform().to_gdal(),
-        projection=da.rio.crs.to_wkt()
+        projection=projection
     )
 
     return band
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Chunked bands backed by dask arrays, an optional dependency.
+
+A band is chunked with `Band.chunk()`, or read chunked with
+`read_file(fname, chunks='auto')`, the chunks being aligned with the tiles of
+the file. The arithmetic, comparisons, `normalize`, `mask` and `to_geotiff`
+of a chunked band only build the dask graph, while the statistics and the
+quantiles stream over blocks of rows of chunks. The graph is run with the
+local threaded scheduler, holding about a row of chunks in memory at once.
+
+Comparisons and logical operations of chunked bands give chunked float bands
+of 1, 0 and NaN, the same data as the MaskBand of in-memory bands.
+"""
+import sys
+
+import numpy as np
+import rasterio
+
+from pyintdem.config import get_dtype
+
+# Approximate number of pixels of a chunk
+TILE_CHUNK_SIZE = 2**20
+
+# Dask scheduler of the chunked bands
+SCHEDULER = 'threads'
+
+
+def is_chunked(data):
+    """
+    True if the data is a dask array, without importing dask
+    """
+    dask_array = sys.modules.get('dask.array')
+    return dask_array is not None and isinstance(data, dask_array.Array)
+
+
+def _dask_array():
+    try:
+        import dask.array as da
+    except ImportError:
+        raise ImportError('Chunked bands require dask, install it with `pip install dask[array]`')
+    return da
+
+
+def tile_chunks(shape, block_shape=(256, 256), chunk_size=TILE_CHUNK_SIZE):
+    """
+    Chunk shape of about `chunk_size` pixels, a multiple of the block shape
+    of the tiles (or strips) of a file.
+
+    arguments:
+        shape: tuple
+            shape of the band
+        block_shape: tuple
+            shape of the tiles of the file, default (256, 256)
+        chunk_size: integer
+            approximate number of pixels of a chunk
+
+    returns:
+        Chunk shape: tuple
+    """
+    ny, nx = shape
+    by, bx = block_shape
+    nblocks = max(chunk_size // (by * bx), 1)
+
+    bcols = max(int(np.sqrt(nblocks)), 1)
+    cx = min(bcols * bx, nx)
+    brows = max(nblocks // int(np.ceil(cx / bx)), 1)
+    cy = min(brows * by, ny)
+
+    return cy, cx
+
+
+def chunk_array(data, chunks='auto', block_shape=(256, 256)):
+    """
+    Dask array of an array, see tile_chunks for 'auto' chunks.
+    """
+    da = _dask_array()
+    if is_chunked(data):
+        if chunks == 'auto':
+            return data
+        return data.rechunk(chunks)
+
+    if chunks == 'auto':
+        chunks = tile_chunks(data.shape, block_shape=block_shape)
+    return da.from_array(data, chunks=chunks)
+
+
+def open_chunked(fname, band=1, chunks='auto'):
+    """
+    Read a band of a raster file as a dask array, without reading the pixels.
+
+    arguments:
+        fname: string
+            file location
+        band: integer
+            band number, default 1
+        chunks: 'auto' or tuple
+            chunk shape, 'auto' (default) for chunks aligned with the tiles
+            of the file, see tile_chunks
+
+    Bands with a scale and offset, e.g., quantized, are decoded, and the
+    nodata of the integer bands is NaN, see Band.read.
+
+    returns:
+        data, geotransform, projection
+    """
+    import rioxarray
+
+    from .geotiff import decode_nodata, dequantize, is_quantized
+
+    _dask_array()
+    with rasterio.open(fname) as ds:
+        if chunks == 'auto':
+            chunks = tile_chunks(ds.shape, block_shape=ds.block_shapes[band - 1])
+        geotransform = ds.transform.to_gdal()
+        projection = ds.crs.to_wkt() if ds.crs is not None else None
+        scale, offset, nodata = ds.scales[band - 1], ds.offsets[band - 1], ds.nodatavals[band - 1]
+
+    da_file = rioxarray.open_rasterio(fname, chunks={'band': 1, 'y': chunks[0], 'x': chunks[1]})
+    data = da_file.sel(band=band).data
+    if is_quantized(scale, offset):
+        data = dequantize(data, scale, offset, nodata=nodata, dtype=get_dtype())
+    else:
+        data = decode_nodata(data, nodata, dtype=get_dtype())
+
+    return data, geotransform, projection
+
+
+def compute(data):
+    """
+    Computed array of a dask array, with the threaded scheduler
+    """
+    if is_chunked(data):
+        return data.compute(scheduler=SCHEDULER)
+    return data
+
+
+def row_chunk_size(data):
+    """
+    Number of rows of the chunks of a dask array, None for other arrays
+    """
+    if is_chunked(data) and data.ndim > 0:
+        return data.chunks[0][0]
+    return None
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lazy expressions of bands.
+
+`Band.lazy()` starts an expression graph: the arithmetic, comparison and
+logical operators build the graph without computing anything, and
+`compute()` evaluates the whole expression in one pass over blocks of rows.
+The temporaries of each operator are then of the size of a block instead of
+the size of the band, and the blocks can be evaluated by several threads.
+
+    red = ((red.lazy() * alpha.lazy()) + (alpha.lazy() * -1 + 1)).compute()
+
+The results are the same as the eager Band operators: comparisons and logical
+operations give a MaskBand, NaN where the left operand is NaN.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pyintdem.config import get_dtype
+from .band import Band, _mask_band_valid
+from .mask import MaskBand
+from .scratch import scratch_array
+from .stats import CHUNK_SIZE
+
+_float_ops = {
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+    'div': np.true_divide
+}
+
+_compare_ops = {
+    'gt': np.greater,
+    'ge': np.greater_equal,
+    'lt': np.less,
+    'le': np.less_equal
+}
+
+_logical_ops = {
+    'and': np.logical_and,
+    'or': np.logical_or
+}
+
+
+class BandExpression(object):
+    def __init__(self, op, args, band):
+        """
+        Node of a lazy band expression, see Band.lazy.
+
+        arguments:
+            op: string
+                operation of the node, 'band' for a leaf
+            args: tuple
+                operands, expressions or scalars, the band for a leaf
+            band: Band
+                a band of the expression, giving the grid of the result
+        """
+        self.op = op
+        self.args = args
+        self._band = band
+
+    @classmethod
+    def from_band(cls, band):
+        """
+        Leaf expression of a band.
+        """
+        return cls('band', (band,), band)
+
+    @property
+    def is_mask(self):
+        """
+        True if the expression evaluates to a MaskBand
+        """
+        if self.op == 'band':
+            return isinstance(self.args[0], MaskBand)
+        return self.op in _compare_ops or self.op in _logical_ops or self.op == 'not'
+
+    @property
+    def grid(self):
+        return self._band.grid
+
+    @property
+    def geotransform(self):
+        return self._band.geotransform
+
+    @property
+    def projection(self):
+        return self._band.projection
+
+    @property
+    def shape(self):
+        return self._band.shape
+
+    @property
+    def data(self):
+        """
+        Data of the computed expression
+        """
+        return self.compute().data
+
+    def lazy(self):
+        return self
+
+    def leaves(self):
+        """
+        Bands of the expression
+        """
+        if self.op == 'band':
+            yield self.args[0]
+        else:
+            for arg in self.args:
+                if isinstance(arg, BandExpression):
+                    yield from arg.leaves()
+
+    def _operand(self, other, name):
+        """
+        Expression or float of an operand
+        """
+        if isinstance(other, BandExpression):
+            operand = other
+        elif isinstance(other, Band):
+            operand = BandExpression.from_band(other)
+        elif isinstance(other, (int, float, np.number)):
+            return float(other)
+        else:
+            raise NotImplementedError(f'In Band expression {name}: other datatype not implemented')
+
+        if operand.shape != self.shape:
+            raise AssertionError(f'In Band expression {name}: size mismatch')
+        return operand
+
+    def _node(self, op, *args):
+        return BandExpression(op, args, self._band)
+
+    def __add__(self, other):
+        return self._node('add', self, self._operand(other, 'add'))
+
+    def __radd__(self, other):
+        return self._node('add', self._operand(other, 'radd'), self)
+
+    def __sub__(self, other):
+        return self._node('sub', self, self._operand(other, 'sub'))
+
+    def __rsub__(self, other):
+        return self._node('sub', self._operand(other, 'rsub'), self)
+
+    def __mul__(self, other):
+        return self._node('mul', self, self._operand(other, 'mul'))
+
+    def __rmul__(self, other):
+        return self._node('mul', self._operand(other, 'rmul'), self)
+
+    def __truediv__(self, other):
+        return self._node('div', self, self._operand(other, 'div'))
+
+    def __rtruediv__(self, other):
+        return self._node('div', self._operand(other, 'rdiv'), self)
+
+    def __neg__(self):
+        return self._node('mul', self, -1.0)
+
+    def __gt__(self, other):
+        return self._node('gt', self, self._operand(other, 'gt'))
+
+    def __ge__(self, other):
+        return self._node('ge', self, self._operand(other, 'ge'))
+
+    def __lt__(self, other):
+        return self._node('lt', self, self._operand(other, 'lt'))
+
+    def __le__(self, other):
+        return self._node('le', self, self._operand(other, 'le'))
+
+    def logical_and(self, other):
+        return self._node('and', self, self._operand(other, 'logical_and'))
+
+    def logical_or(self, other):
+        return self._node('or', self, self._operand(other, 'logical_or'))
+
+    def logical_not(self):
+        return self._node('not', self)
+
+    def _evaluate(self, rows, leaves):
+        """
+        Evaluate the expression on a block of rows: a float array, or a
+        (value, valid) pair of boolean arrays for the masks
+        """
+        if self.op == 'band':
+            return leaves[id(self.args[0])](rows)
+
+        args = [
+            arg._evaluate(rows, leaves) if isinstance(arg, BandExpression) else arg
+            for arg in self.args
+        ]
+
+        if self.op in _float_ops:
+            return _float_ops[self.op](*[_as_float(arg) for arg in args])
+
+        left = args[0]
+        if self.op in _compare_ops:
+            left = _as_float(left)
+            value = _compare_ops[self.op](left, _as_float(args[1]))
+            valid = ~np.isnan(left)
+        elif self.op in _logical_ops:
+            value = _logical_ops[self.op](_as_bool(left), _as_bool(args[1]))
+            valid = _valid(left)
+        else:
+            value = np.logical_not(left[0] if isinstance(left, tuple) else left)
+            valid = _valid(left)
+
+        # invalid pixels keep value True, as in MaskBand
+        value |= ~valid
+        return value, valid
+
+    def compute(self, chunk_size=CHUNK_SIZE, num_threads=1, scratch=False):
+        """
+        Evaluate the expression in a single pass over blocks of rows.
+
+        arguments:
+            chunk_size: integer
+                approximate number of pixels evaluated at once
+            num_threads: integer
+                number of threads evaluating the blocks, default 1
+            scratch: boolean
+                write a Band result directly to a memory-mapped scratch file,
+                see Band.to_scratch, default False
+
+        returns:
+            Band, or MaskBand for comparisons and logical operations
+        """
+        leaves = {}
+        for band in self.leaves():
+            leaves[id(band)] = _leaf_reader(band)
+
+        nrows, ncols = self.shape
+        step = max(chunk_size // max(ncols, 1), 1)
+        blocks = [slice(start, min(start + step, nrows)) for start in range(0, nrows, step)]
+
+        # the first block gives the dtype of the result
+        first = self._evaluate(blocks[0], leaves)
+        if self.is_mask:
+            out = (np.empty(self.shape, dtype=bool), np.empty(self.shape, dtype=bool))
+        elif scratch:
+            out = scratch_array(self.shape, first.dtype, grid=self.grid)
+        else:
+            out = np.empty(self.shape, dtype=first.dtype)
+
+        def store(rows, result):
+            if self.is_mask:
+                out[0][rows] = result[0]
+                out[1][rows] = result[1]
+            else:
+                out[rows] = result
+
+        def evaluate(rows):
+            store(rows, self._evaluate(rows, leaves))
+
+        store(blocks[0], first)
+        if num_threads > 1 and len(blocks) > 1:
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                list(executor.map(evaluate, blocks[1:]))
+        else:
+            for rows in blocks[1:]:
+                evaluate(rows)
+
+        if self.is_mask:
+            return _mask_band_valid(out[0], out[1], self._band)
+
+        return Band(
+            data=out,
+            grid=self.grid
+        )
+
+    def __repr__(self):
+        """
+        Print representation
+        """
+        return '{:d} - {:d} (expression)'.format(*self.shape)
+
+
+def _leaf_reader(band):
+    """
+    Function reading a block of rows of a band, (value, valid) for a MaskBand
+    """
+    if isinstance(band, MaskBand):
+        value = band.value
+        valid = band.valid
+        return lambda rows: (value[rows], valid[rows])
+
+    data = band.data
+    return lambda rows: data[rows]
+
+
+def _as_float(arg):
+    """
+    Float block of an operand, 1, 0 and NaN for a mask as MaskBand.data
+    """
+    if isinstance(arg, tuple):
+        value, valid = arg
+        data = value.astype(get_dtype())
+        data[~valid] = np.nan
+        return data
+    return arg
+
+
+def _as_bool(arg):
+    """
+    Boolean block of an operand, NaN being True
+    """
+    if isinstance(arg, tuple):
+        return arg[0]
+    return arg.astype(bool)
+
+
+def _valid(arg):
+    """
+    Valid pixels of a block of an operand
+    """
+    if isinstance(arg, tuple):
+        return arg[1]
+    return ~np.isnan(arg)
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+GeoTIFF writer shared by Band, MaskBand, RGB and the workflows.
+
+The files are tiled and compressed by default, DEFLATE with the predictor
+matching the dtype (floating point predictor for floats, horizontal
+differencing for integers), the compression running on all CPUs. ZSTD and
+the lossy LERC (with `max_z_error`) are available, as well as internal
+overviews and the cloud optimized (COG) layout.
+
+    write_geotiff('hue.tif', band.data, band.grid, compress='zstd', cog=True)
+
+Bands of a known range, e.g., hue and value in [0, 1], can be stored
+quantized: uint16 codes with the GDAL scale and offset of the band and the
+last code as nodata (NaN). The decoded values `code * scale + offset` are
+within `scale / 2` of the data, 7.6e-6 for [0, 1], plus the rounding of the
+processing dtype, below 7.7e-6 in float32, see quantization.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+from affine import Affine
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+from pyintdem.config import get_scratch_dir
+from .chunked import compute, is_chunked
+
+# Supported compressions, LERC being lossy with max_z_error
+COMPRESSIONS = ('none', 'deflate', 'zstd', 'lzw', 'lerc', 'lerc_deflate', 'lerc_zstd')
+
+# Resampling methods of the overviews
+OVERVIEW_RESAMPLING = {
+    'nearest': Resampling.nearest,
+    'average': Resampling.average,
+    'mode': Resampling.mode
+}
+
+# Quantized storage, the last code being the nodata of the NaN pixels
+QUANTIZED_DTYPE = 'uint16'
+QUANTIZED_NODATA = 65535
+
+
+def default_predictor(dtype, compress):
+    """
+    TIFF predictor of a dtype: 3 (floating point) for floats, 2 (horizontal
+    differencing) for integers, 1 (none) without compression or with LERC
+    """
+    if compress in ('none', 'lerc', 'lerc_deflate', 'lerc_zstd'):
+        return 1
+    if np.issubdtype(np.dtype(dtype), np.floating):
+        return 3
+    return 2
+
+
+def overview_factors(shape, blocksize=512):
+    """
+    Power of two overview factors down to about one block
+    """
+    factors = []
+    factor = 2
+    while max(shape) / factor >= blocksize / 2:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def geotiff_options(dtype, compress='deflate', predictor=None, level=None, max_z_error=None,
+                    blocksize=512, num_threads='ALL_CPUS', cog=False):
+    """
+    GDAL creation options of the GeoTIFF (GTiff) or COG driver.
+
+    arguments:
+        dtype: numpy dtype
+            dtype of the file
+        compress: string
+            one of COMPRESSIONS, default 'deflate'
+        predictor: integer
+            TIFF predictor, default None for default_predictor
+        level: integer
+            DEFLATE or ZSTD compression level, default None for the GDAL default
+        max_z_error: float
+            maximum error of the LERC compressions, default None for lossless
+        blocksize: integer
+            size of the square tiles, default 512
+        num_threads: integer or string
+            compression threads, default 'ALL_CPUS'
+        cog: boolean
+            options of the COG driver, default False for GTiff
+
+    returns:
+        creation options: dict
+    """
+    compress = compress.lower()
+    if compress not in COMPRESSIONS:
+        raise NotImplementedError(f'In geotiff: {compress} compression is not implemented, use one of {COMPRESSIONS}')
+
+    options = {
+        'compress': compress,
+        'num_threads': num_threads,
+        'bigtiff': 'if_safer'
+    }
+    if cog:
+        options['blocksize'] = blocksize
+    else:
+        options.update(tiled=True, blockxsize=blocksize, blockysize=blocksize)
+
+    predictor = default_predictor(dtype, compress) if predictor is None else predictor
+    if predictor != 1:
+        # the COG driver names the predictors
+        options['predictor'] = {2: 'standard', 3: 'floating_point'}[predictor] if cog else predictor
+    if level is not None:
+        if compress in ('deflate', 'lerc_deflate'):
+            options['zlevel' if not cog else 'level'] = level
+        elif compress in ('zstd', 'lerc_zstd'):
+            options['zstd_level' if not cog else 'level'] = level
+    if max_z_error is not None and compress.startswith('lerc'):
+        options['max_z_error'] = max_z_error
+
+    return options
+
+
+def quantization(vmin=0.0, vmax=1.0):
+    """
+    Scale and offset of the quantized storage of [vmin, vmax] on the uint16
+    codes 0 to 65534. The maximum error of the decoded values is scale / 2,
+    plus the rounding of the processing dtype.
+
+    returns:
+        scale, offset: float, float
+    """
+    if not vmax > vmin:
+        raise AssertionError(f'In geotiff: the quantized range [{vmin}, {vmax}] is empty')
+    return (vmax - vmin) / (QUANTIZED_NODATA - 1), float(vmin)
+
+
+def quantize(data, scale, offset):
+    """
+    uint16 codes of the data, clipped to the quantized range, NaN being
+    QUANTIZED_NODATA. Works on numpy and dask arrays.
+    """
+    codes = np.clip(np.rint((data - offset) / scale), 0, QUANTIZED_NODATA - 1)
+    return np.where(np.isnan(data), QUANTIZED_NODATA, codes).astype(QUANTIZED_DTYPE)
+
+
+def dequantize(codes, scale, offset, nodata=None, dtype='float64'):
+    """
+    Decoded values `codes * scale + offset` of a band with a GDAL scale and
+    offset, NaN for the nodata codes. Works on numpy and dask arrays.
+    """
+    dtype = np.dtype(dtype)
+    data = codes.astype(dtype) * dtype.type(scale) + dtype.type(offset)
+    if nodata is not None and not np.isnan(nodata):
+        data = np.where(codes == nodata, dtype.type(np.nan), data)
+    return data
+
+
+def decode_nodata(raw, nodata, dtype='float64'):
+    """
+    Float values of an integer raster, NaN for the nodata value, e.g., the
+    255 of the uint8 masks written by MaskBand.to_geotiff. Works on numpy and
+    dask arrays.
+    """
+    data = raw.astype(dtype)
+    if nodata is None or np.isnan(nodata) or not np.issubdtype(raw.dtype, np.integer):
+        return data
+    return np.where(raw == nodata, np.dtype(dtype).type(np.nan), data)
+
+
+def is_quantized(scale, offset):
+    """
+    True if the GDAL scale and offset of a band are set, None meaning unset
+    """
+    return (scale not in (None, 1.0)) or (offset not in (None, 0.0))
+
+
+def _write_data(ds, data, dtype):
+    """
+    Write a (bands, rows, cols) array to a dataset, a row of chunks at a time
+    for a dask array
+    """
+    for i in range(data.shape[0]):
+        band = data[i]
+        if is_chunked(band):
+            row = 0
+            for nrows in band.chunks[0]:
+                strip = compute(band[row:row + nrows])
+                ds.write(strip.astype(dtype, copy=False), i + 1, window=Window(0, row, strip.shape[1], nrows))
+                row += nrows
+        else:
+            ds.write(np.asarray(band).astype(dtype, copy=False), i + 1)
+
+
+def write_geotiff(fname, data, grid, dtype='float32', nodata=None, compress='deflate', predictor=None,
+                  level=None, max_z_error=None, blocksize=512, num_threads='ALL_CPUS', overviews=None,
+                  overview_resampling='average', cog=False, scale=None, offset=None):
+    """
+    Write a tiled, compressed GeoTIFF.
+
+    arguments:
+        fname: string
+            file location
+        data: array like
+            2D array, or 3D (bands, rows, cols) array, possibly a dask array
+        grid: GridSpec
+            grid of the data, e.g., band.grid
+        dtype: numpy dtype
+            dtype of the file, default 'float32'
+        nodata: number
+            nodata value, default None, NaN for the floating dtypes
+        compress, predictor, level, max_z_error, blocksize, num_threads:
+            compression options, see geotiff_options
+        overviews: boolean or list
+            internal overviews, True for the power of two factors down to
+            about one tile, a list for given factors, default None for
+            overviews in a COG only
+        overview_resampling: string
+            nearest, average (default) or mode
+        cog: boolean
+            write a cloud optimized GeoTIFF, the COG driver choosing the
+            overview factors, through a temporary file in the scratch
+            directory, see pyintdem.config.set_scratch_dir, default False
+        scale, offset: float
+            GDAL scale and offset of the bands, e.g., of quantized data,
+            default None
+
+    returns:
+        file location: Path
+    """
+    fname = Path(fname)
+    dtype = np.dtype(dtype)
+    if data.ndim == 2:
+        data = data[np.newaxis]
+    nbands, nrows, ncols = data.shape
+
+    if nodata is None and np.issubdtype(dtype, np.floating):
+        nodata = np.nan
+
+    if overview_resampling not in OVERVIEW_RESAMPLING:
+        raise NotImplementedError(
+            f'In geotiff: {overview_resampling} overviews are not implemented, use one of {list(OVERVIEW_RESAMPLING)}'
+        )
+
+    profile = {
+        'width': ncols,
+        'height': nrows,
+        'count': nbands,
+        'dtype': dtype.name,
+        'nodata': nodata,
+        'crs': grid.projection,
+        'transform': Affine.from_gdal(*grid.geotransform) if grid.geotransform is not None else None
+    }
+
+    def _write(ds):
+        _write_data(ds, data, dtype)
+        if scale is not None or offset is not None:
+            ds.scales = (1.0 if scale is None else scale,) * nbands
+            ds.offsets = (0.0 if offset is None else offset,) * nbands
+
+    if cog:
+        # The COG driver only copies datasets, the tiles are first written to
+        # a temporary file in the scratch directory, not to memory
+        options = geotiff_options(
+            dtype, compress=compress, predictor=predictor, level=level, max_z_error=max_z_error,
+            blocksize=blocksize, num_threads=num_threads, cog=True
+        )
+        options['overviews'] = 'none' if overviews is False else 'auto'
+        options['overview_resampling'] = overview_resampling
+        handle, tmpname = tempfile.mkstemp(prefix='pyintdem_', suffix='.tif', dir=get_scratch_dir())
+        os.close(handle)
+        try:
+            with rasterio.open(tmpname, 'w', driver='GTiff', tiled=True, blockxsize=blocksize, blockysize=blocksize,
+                               **profile) as ds:
+                _write(ds)
+            with rasterio.open(tmpname) as ds:
+                rasterio.shutil.copy(ds, fname.as_posix(), driver='COG', **options)
+        finally:
+            os.remove(tmpname)
+        return fname
+
+    options = geotiff_options(
+        dtype, compress=compress, predictor=predictor, level=level, max_z_error=max_z_error,
+        blocksize=blocksize, num_threads=num_threads
+    )
+    with rasterio.open(fname.as_posix(), 'w', driver='GTiff', **profile, **options) as ds:
+        _write(ds)
+        if overviews:
+            factors = overview_factors((nrows, ncols), blocksize) if overviews is True else list(overviews)
+            if factors:
+                ds.build_overviews(factors, OVERVIEW_RESAMPLING[overview_resampling])
+                ds.update_tags(ns='rio_overview', resampling=overview_resampling)
+
+    return fname
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Georeferencing shared by the bands.
+
+A `GridSpec` holds the GDAL geotransform, the projection and the shape of a
+band. Grid specs are immutable and interned by `grid_spec`: the bands of a
+grid share one object, so comparing two grids or keying a cache on a grid is
+an identity or hash check instead of a comparison of multi-kilobyte WKT
+strings.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+
+class GridSpec(namedtuple('GridSpec', ['geotransform', 'projection', 'shape'])):
+    """
+    Interned grid of a band, see grid_spec. The geotransform is a tuple of 6
+    floats, the shape a tuple of integers, None when unknown.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        # unpickled grid specs are interned again
+        return grid_spec, tuple(self)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def with_shape(self, shape):
+        """
+        Grid spec with the same georeferencing and another shape
+        """
+        return grid_spec(self.geotransform, self.projection, shape)
+
+    def with_geotransform(self, geotransform):
+        """
+        Grid spec with the same projection and shape and another geotransform
+        """
+        return grid_spec(geotransform, self.projection, self.shape)
+
+    def with_projection(self, projection):
+        """
+        Grid spec with the same geotransform and shape and another projection
+        """
+        return grid_spec(self.geotransform, projection, self.shape)
+
+    def same_as(self, other):
+        """
+        True if both grid specs describe the same grid, identity being the
+        fast path of interned grid specs
+        """
+        return self is other or self == other
+
+
+def grid_spec(geotransform=None, projection=None, shape=None):
+    """
+    Interned grid spec: equal geotransform, projection and shape give the same
+    GridSpec object.
+
+    arguments:
+        geotransform: sequence of 6 numbers
+            GDAL geotransform, default None
+        projection: string
+            projection information, e.g., WKT, default None
+        shape: sequence of integers
+            shape of the band, default None
+
+    returns:
+        Grid spec: GridSpec
+    """
+    if geotransform is not None:
+        geotransform = tuple(float(v) for v in geotransform)
+    if shape is not None:
+        shape = tuple(int(n) for n in shape)
+    return _grid_spec(geotransform, projection, shape)
+
+
+@lru_cache(maxsize=1024)
+def _grid_spec(geotransform, projection, shape):
+    return GridSpec(geotransform, projection, shape)
+
+
+EMPTY_GRID = grid_spec()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import weakref
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio.errors import WindowError
+from rasterio.windows import Window, from_bounds
+from rioxarray.exceptions import NoDataInBounds
+
+from pyintdem.config import get_dtype
+from .band import Band, clip_to_geometries, project_geometries
+from .stats import EMPTY_STATS, combine_stats, compute_stats
+
+
+def geometry_window(geometries, ds):
+    """
+    Pixel window of a dataset enclosing geometries, with one pixel of margin.
+
+    Args:
+        geometries: geometries in the projection of the dataset, see project_geometries
+        ds: open rasterio dataset
+
+    Returns: rasterio.windows.Window
+
+    """
+    w, s, e, n = geometries.total_bounds
+    window = from_bounds(w, s, e, n, transform=ds.transform)
+    # pixels partially covered by the bounds are included on both sides
+    col_off = int(np.floor(window.col_off))
+    row_off = int(np.floor(window.row_off))
+    col_end = int(np.ceil(window.col_off + window.width))
+    row_end = int(np.ceil(window.row_off + window.height))
+    window = Window(col_off, row_off, col_end - col_off, row_end - row_off)
+
+    full = Window(0, 0, ds.width, ds.height)
+    try:
+        window = window.intersection(full)
+    except WindowError:
+        raise NoDataInBounds('In LazyBand window: clip region does not overlap the band')
+
+    # One pixel margin to keep the all_touched pixels at the border
+    col_off = max(int(window.col_off) - 1, 0)
+    row_off = max(int(window.row_off) - 1, 0)
+    col_end = min(int(window.col_off + window.width) + 1, ds.width)
+    row_end = min(int(window.row_off + window.height) + 1, ds.height)
+
+    return Window(col_off, row_off, col_end - col_off, row_end - row_off)
+
+
+class LazyBand(Band):
+    __slots__ = ('fname', 'band', 'preprocessor', '_ds', '_finalizer')
+
+    def __init__(self, fname, band=1, preprocessor=None, **kwargs):
+        """
+        Band backed by an open raster dataset. Nothing is decoded at creation,
+        the pixel data is read on first access of `data`, while `clip` and the
+        statistics only decode the windows they need.
+
+        The dataset handle is closed by close(), at the end of a `with` block,
+        or when the band is released.
+
+            with LazyBand(fname) as band:
+                clipped = band.clip(bbox=bbox)
+
+        arguments:
+            fname: string
+                file location, anything that can be opened by rasterio
+            band: integer
+                band number, default 1
+            preprocessor: callable
+                function taking and returning a Band, applied on every window
+                after reading, default None
+
+        returns:
+            Lazy band data: LazyBand
+        """
+        self.fname = Path(fname).as_posix() if isinstance(fname, Path) else fname
+        self.band = band
+        self.preprocessor = preprocessor
+        self._ds = rasterio.open(self.fname)
+        self._finalizer = weakref.finalize(self, self._ds.close)
+        self._data = None
+
+        super().__init__(
+            data=None,
+            geotransform=self._ds.transform.to_gdal(),
+            projection=self._ds.crs.to_wkt(),
+            **kwargs
+        )
+
+    @property
+    def data(self):
+        """
+        Band data, read and preprocessed from the dataset on first access
+        """
+        if self._data is None:
+            self._data = self.read_window(window=None).data
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._stats = None
+
+    @property
+    def loaded(self):
+        """
+        True if the full band is already decoded in memory
+        """
+        return self._data is not None
+
+    @property
+    def shape(self):
+        """
+        Shape of the band without reading the data
+        """
+        return self._ds.height, self._ds.width
+
+    def load(self):
+        """
+        Decode the full band in memory and return a plain Band.
+        """
+        return Band(
+            data=self.data,
+            grid=self.grid,
+            **self.attrs
+        )
+
+    def close(self):
+        """
+        Close the underlying dataset handle.
+        """
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read_window(self, window=None):
+        """
+        Read only the given window of the band.
+
+        arguments:
+            window: rasterio.windows.Window
+                window to read, None reads the full band
+
+        returns:
+            Band data of the window: Band
+        """
+        if window is None:
+            window = Window(0, 0, self._ds.width, self._ds.height)
+
+        band = Band(
+            data=self._ds.read(self.band, window=window).astype(get_dtype()),
+            geotransform=self._ds.window_transform(window).to_gdal(),
+            projection=self.projection
+        )
+
+        if self.preprocessor is not None:
+            band = self.preprocessor(band)
+
+        return band
+
+    def window(self, bbox=None, geoms=None):
+        """
+        Pixel window enclosing the given bounding box and geometries.
+
+        Args:
+            bbox: bounding box as [e, w, s, n] in lon-lat cooordinates; epsg:4326
+            geoms: a list of geometries, e.g., from geopandas.geometry; epsg:4326
+
+        Returns: rasterio.windows.Window, None if neither bbox nor geoms is given
+
+        """
+        clip_geom_projected = project_geometries(bbox=bbox, geoms=geoms, projection=self.projection)
+
+        if len(clip_geom_projected) == 0:
+            return None
+
+        return geometry_window(clip_geom_projected, self._ds)
+
+    def clip(self, bbox=None, geoms=None):
+        """
+        Clip the band reading only the window enclosing the geometries.
+
+        Args:
+            bbox: bounding box as [e, w, s, n] in lon-lat cooordinates; epsg:4326
+            geoms: a list of geometries, e.g., from geopandas.geometry; epsg:4326
+
+        Returns: clipped Band
+        """
+        clip_geom_projected = project_geometries(bbox=bbox, geoms=geoms, projection=self.projection)
+
+        if len(clip_geom_projected) == 0:
+            print("Neither bbox nor geom is given, returning the original Band")
+            return copy.deepcopy(self.load())
+
+        window = geometry_window(clip_geom_projected, self._ds)
+        return clip_to_geometries(self.read_window(window=window), clip_geom_projected)
+
+    def iter_windows(self):
+        """
+        Iterate over the internal block windows of the dataset, yielding the
+        data of each block.
+        """
+        if self.loaded:
+            yield self._data
+        else:
+            for _, window in self._ds.block_windows(self.band):
+                yield self.read_window(window=window).data
+
+    @property
+    def stats(self):
+        """
+        Count, minimum, maximum, mean and m2 of the non-NaN band data, computed
+        block by block if the band is not loaded, and cached
+        """
+        if self._stats is None:
+            stats = EMPTY_STATS
+            for data in self.iter_windows():
+                stats = combine_stats(stats, compute_stats(data))
+            self._stats = stats
+        return self._stats
+
+    def __copy__(self):
+        """
+        Shallow copy reopens the dataset, sharing the loaded data, so that
+        each copy owns the handle it closes
+        """
+        other = LazyBand(
+            fname=self.fname,
+            band=self.band,
+            preprocessor=self.preprocessor,
+            **self.attrs
+        )
+        other._data = self._data
+        other._stats = self._stats
+        return other
+
+    def __deepcopy__(self, memo):
+        """
+        Deep copy reopens the dataset instead of copying the file handle
+        """
+        other = LazyBand(
+            fname=self.fname,
+            band=self.band,
+            preprocessor=self.preprocessor,
+            **copy.deepcopy(self.attrs, memo)
+        )
+        if self.loaded:
+            other.data = copy.deepcopy(self._data, memo)
+        return other
+
+    def __repr__(self):
+        """
+        Print representation
+        """
+        return '{:d} - {:d} (lazy)'.format(*self.shape)
@@ -0,0 +1,516 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+
+import numpy as np
+from rasterio.enums import Resampling
+from scipy import ndimage as ndi
+from scipy import signal as sps
+
+from pyintdem.config import get_dtype
+from .band import Band, KERNEL_LAPLACE, _is_expression, band_to_rio, retained_blobs, rio_to_band
+from .geotiff import write_geotiff
+from .grid import grid_spec
+from .quicklook import QUICKLOOK_PIXELS, decimate
+from .stats import EMPTY_STATS, BandStats
+
+
+def pack_bits(valid):
+    """
+    Pack a boolean array into a flat bitmap, 8 pixels per byte.
+    """
+    return np.packbits(valid, axis=None)
+
+
+def unpack_bits(bits, shape):
+    """
+    Unpack a flat bitmap from `pack_bits` into a boolean array of given shape.
+    """
+    count = int(np.prod(shape))
+    return np.unpackbits(bits, count=count).reshape(shape).view(bool)
+
+
+def _all_set(bits, count):
+    """
+    True if the first `count` bits of the bitmap are set.
+    """
+    nfull, nrem = divmod(count, 8)
+    if not np.all(bits[:nfull] == 255):
+        return False
+    if nrem:
+        last = np.uint8((0xFF << (8 - nrem)) & 0xFF)
+        return bool((bits[nfull] & last) == last)
+    return True
+
+
+class MaskBand(Band):
+    __slots__ = ('value', 'validity')
+
+    def __init__(self, value=None, valid=None, geotransform=None, projection=None, grid=None, **kwargs):
+        """
+        Compact binary band. The class is stored as a boolean array and the
+        validity (the non-NaN pixels of an equivalent float band) as a packed
+        bitmap, i.e., 1 bit per pixel.
+
+        Invalid pixels keep value True, the same as a NaN cast to boolean, so
+        that the logical operations give the same result as on the float bands.
+
+        arguments:
+            value: array like
+                2D boolean array, default None
+            valid: array like
+                2D boolean array of valid pixels, default None for all valid
+            geotransform: string
+                geotransform information, default None
+            projection: string
+                projection information, default None
+            grid: GridSpec
+                shared grid spec of the band, e.g., other.grid, replacing
+                geotransform and projection, default None
+
+        returns:
+            Mask band data: MaskBand
+        """
+        self._grid = grid if grid is not None else grid_spec(geotransform, projection)
+        self.attrs = kwargs
+        self.value = None
+        self.validity = None
+        self._stats = None
+
+        if value is not None:
+            self._set(value=value, valid=valid)
+
+    def _set(self, value, valid=None):
+        """
+        Set value and validity, keeping value True on the invalid pixels.
+        """
+        value = np.asarray(value, dtype=bool)
+        if valid is None:
+            valid = np.ones(value.shape, dtype=bool)
+        else:
+            valid = np.asarray(valid, dtype=bool)
+            value = value | ~valid
+
+        self.value = value
+        self.validity = pack_bits(valid)
+        self._stats = None
+
+    @classmethod
+    def from_array(cls, data, geotransform=None, projection=None):
+        """
+        Create a MaskBand from a float array of 0, 1 and NaN.
+
+        arguments:
+            data: array like
+                2D array, nonzero values are True and NaN are invalid
+        """
+        data = np.asarray(data)
+        valid = ~np.isnan(data)
+        return cls(
+            value=data.astype(bool),
+            valid=valid,
+            geotransform=geotransform,
+            projection=projection
+        )
+
+    @classmethod
+    def from_band(cls, band):
+        """
+        Create a MaskBand from a Band of 0, 1 and NaN.
+        """
+        if isinstance(band, MaskBand):
+            return band
+        return cls.from_array(band.data, geotransform=band.geotransform, projection=band.projection)
+
+    @property
+    def shape(self):
+        """
+        Shape of the band
+        """
+        return self.value.shape
+
+    @property
+    def is_chunked(self):
+        """
+        False, mask bands are kept compact in memory
+        """
+        return False
+
+    def to_scratch(self, name=None, scratch_dir=None, persist=False):
+        raise NotImplementedError('In MaskBand to_scratch: mask bands are kept compact in memory')
+
+    @classmethod
+    def from_scratch(cls, fname, mode='r+'):
+        raise NotImplementedError('In MaskBand from_scratch: mask bands are kept compact in memory')
+
+    @property
+    def valid(self):
+        """
+        Unpacked boolean array of the valid pixels
+        """
+        return unpack_bits(self.validity, self.shape)
+
+    @property
+    def all_valid(self):
+        """
+        True if there is no invalid pixel
+        """
+        return _all_set(self.validity, self.value.size)
+
+    @property
+    def data(self):
+        """
+        Equivalent float band data with 1, 0 and NaN, in the package dtype.
+        The array is built on each access and read only: set `data`, or
+        modify the float band of to_band(), instead.
+        """
+        if self.value is None:
+            return None
+        data = self.value.astype(get_dtype())
+        if not self.all_valid:
+            data[~self.valid] = np.nan
+        data.flags.writeable = False
+        return data
+
+    @data.setter
+    def data(self, data):
+        if data is None:
+            self.value = None
+            self.validity = None
+            self._stats = None
+        else:
+            data = np.asarray(data)
+            self._set(value=data.astype(bool), valid=~np.isnan(data))
+
+    @property
+    def stats(self):
+        """
+        Statistics of the equivalent float band, counted from the boolean data
+        """
+        if self._stats is None:
+            if self.value is None:
+                return EMPTY_STATS
+            if self.all_valid:
+                count = self.value.size
+                ntrue = int(np.count_nonzero(self.value))
+            else:
+                valid = self.valid
+                count = int(np.count_nonzero(valid))
+                ntrue = int(np.count_nonzero(self.value & valid))
+
+            if count == 0:
+                self._stats = EMPTY_STATS
+            else:
+                mean = ntrue / count
+                dtype = get_dtype().type
+                self._stats = BandStats(
+                    count=count,
+                    min=dtype(0 if ntrue < count else 1),
+                    max=dtype(1 if ntrue > 0 else 0),
+                    mean=mean,
+                    m2=count * mean * (1 - mean)
+                )
+        return self._stats
+
+    def _as_bool(self):
+        return self.value
+
+    def _invalid(self):
+        return ~self.valid
+
+    def _is_binary(self):
+        return True
+
+    def set_missing(self, value, to=np.nan):
+        """
+        set the missing value in data from value, see Band.set_missing. Only
+        0, 1 and np.nan can be represented in a MaskBand.
+
+        argument:
+            value: 0, 1 or np.nan
+                Value to be replaced
+            to: 0, 1 or np.nan
+                Values replaced by to
+        """
+        valid = self.valid
+        if np.isnan(value):
+            selected = ~valid
+        elif value in (0, 1):
+            selected = valid & (self.value == bool(value))
+        else:
+            return
+
+        if np.isnan(to):
+            valid[selected] = False
+            self.value[selected] = True
+        elif to in (0, 1):
+            valid[selected] = True
+            self.value[selected] = bool(to)
+        else:
+            raise ValueError('In MaskBand set_missing: only 0, 1 and nan can be set')
+
+        self.validity = pack_bits(valid)
+        self.clear_cache()
+
+    def normalize(self, *args, **kwargs):
+        raise NotImplementedError('In MaskBand normalize: mask bands are binary, normalize the float band of to_band()')
+
+    def to_band(self):
+        """
+        Convert to a float Band with 1, 0 and NaN.
+        """
+        return Band(
+            data=self.data,
+            grid=self.grid
+        )
+
+    def _quicklook(self, max_pixels=QUICKLOOK_PIXELS):
+        """
+        Fraction of True pixels of the blocks of a quicklook, NaN for the
+        blocks without a valid pixel, without the float band of the mask.
+        """
+        if self.all_valid:
+            return decimate(self.value, max_pixels)
+
+        valid = self.valid
+        count = decimate(valid, max_pixels)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return decimate(self.value & valid, max_pixels) / count
+
+    def indices(self):
+        """
+        Row and column indices of the valid pixels which are True, as
+        returned by np.nonzero.
+        """
+        if self.all_valid:
+            return np.nonzero(self.value)
+        return np.nonzero(self.value & self.valid)
+
+    def _new(self, value, validity):
+        """
+        New MaskBand on the same grid with value and packed validity, setting
+        value True on the invalid pixels.
+        """
+        band = MaskBand(grid=self.grid)
+        if not _all_set(validity, value.size):
+            np.logical_or(value, ~unpack_bits(validity, value.shape), out=value)
+        band.value = value
+        band.validity = validity
+        return band
+
+    def _other_bool(self, other, name):
+        if not isinstance(other, Band):
+            raise NotImplementedError(f'In MaskBand {name}: only Band data is implemented')
+        if self.shape != other.shape:
+            raise AssertionError(f'In MaskBand {name}: size mismatch')
+        return np.asarray(other._as_bool())
+
+    def logical_and(self, other):
+        """
+        Logical and connection of two Band data, NaN where self is NaN
+        """
+        if _is_expression(other):
+            return self.lazy().logical_and(other)
+        other_value = self._other_bool(other, 'logical_and')
+        return self._new(np.logical_and(self.value, other_value), self.validity.copy())
+
+    def logical_or(self, other):
+        """
+        Logical or of two Band data, NaN where self is NaN
+        """
+        if _is_expression(other):
+            return self.lazy().logical_or(other)
+        other_value = self._other_bool(other, 'logical_or')
+        return self._new(np.logical_or(self.value, other_value), self.validity.copy())
+
+    def logical_not(self):
+        """
+        Logical not of the MaskBand, NaN where self is NaN
+        """
+        return self._new(np.logical_not(self.value), self.validity.copy())
+
+    def isnan(self):
+        """
+        Band of the invalid pixels.
+        """
+        return Band(
+            data=self._invalid(),
+            grid=self.grid
+        )
+
+    def clean(self, npixel, fillvalue, background=False):
+        """
+        Clean the image below given pixel blob size (number of pixels) grouped
+        together, see Band.clean. Works directly on the boolean data.
+
+        argument:
+            npixel: int like
+                number of pixel to be use as the blob size
+            fillvalue: 0 or 1
+                value to be used on the selected blobs
+            background: boolean
+                if background=True, the data will be reversed at the first step
+                before applying the npixel blobs and then filled with fillvalue
+        """
+        if fillvalue not in (0, 1):
+            return self.to_band().clean(npixel=npixel, fillvalue=fillvalue, background=background)
+
+        invalid = self._invalid()
+        if background:
+            # value is already True on the invalid pixels
+            foreground = self.value
+            base = False
+        else:
+            if np.any(self.value & ~invalid):
+                foreground = ~self.value | invalid
+            else:
+                foreground = invalid
+            base = True
+
+        retained = retained_blobs(foreground, npixel)
+        if fillvalue:
+            value = np.logical_or(retained, base)
+        else:
+            value = np.logical_and(np.logical_not(retained), base)
+        return self._new(value, self.validity.copy())
+
+    def clean_blobs(self, waterblob, landblob):
+        """
+        Clean both the small water bodies over land and the small land bodies
+        over water in one call, see Band.clean_blobs.
+
+        argument:
+            waterblob: int like
+                minimum size of water body over land
+            landblob: int like
+                minimum size of land body over water
+        """
+        invalid = self._invalid()
+        if np.any(self.value & ~invalid):
+            water = retained_blobs(~self.value | invalid, waterblob)
+        else:
+            water = retained_blobs(invalid, waterblob)
+        land = retained_blobs(~water | invalid, landblob)
+        return self._new(land, self.validity.copy())
+
+    def convolute(
+        self,
+        kernel=[[0, -1, 0], [-1, 4, -1], [0, -1, 0]],
+        replacenan=False,
+        replacevalue=np.nan,
+        fillvalue=0,
+        nanmask=True,
+        cleanedge=True,
+        binary=True):
+        """
+        Convolute the data with the given kernel, see Band.convolute. A mask
+        band is always binary, `binary` is ignored.
+
+        The convolution is done on integers, and the NaN are propagated over
+        the kernel footprint as in the float convolution. A MaskBand is returned
+        with `nanmask`, otherwise a Band with the convoluted values.
+        """
+        kernel = np.array(kernel)
+        binary_replace = not replacenan or np.isnan(replacevalue) or replacevalue in (0, 1)
+
+        if np.array_equal(kernel, KERNEL_LAPLACE) and binary_replace:
+            return self.edges(
+                replacenan=replacenan, replacevalue=replacevalue,
+                nanmask=nanmask, cleanedge=cleanedge)
+
+        integer_kernel = np.all(np.mod(kernel, 1) == 0) and np.all(np.mod(kernel.shape, 2) == 1)
+
+        if not binary_replace:
+            integer_kernel = False
+
+        if not integer_kernel:
+            return self.to_band().convolute(
+                kernel=kernel, replacenan=replacenan, replacevalue=replacevalue,
+                fillvalue=fillvalue, nanmask=nanmask, cleanedge=cleanedge)
+
+        value = self.value
+        if replacenan and not np.isnan(replacevalue):
+            invalid = np.zeros(self.shape, dtype=bool)
+            if not self.all_valid:
+                value = np.where(self.valid, self.value, bool(replacevalue))
+        else:
+            invalid = self._invalid()
+            value = value & ~invalid
+
+        conv = sps.convolve2d(
+            value.astype(np.int16), kernel.astype(np.int16),
+            mode='same', boundary='fill', fillvalue=0)
+        # NaN spreads over the whole kernel footprint in the float convolution
+        invalid = ndi.binary_dilation(invalid, structure=np.ones(kernel.shape, dtype=bool))
+
+        if cleanedge:
+            invalid[:, 0:2] = True
+            invalid[:, -2:] = True
+            invalid[0:2, :] = True
+            invalid[-2:, :] = True
+
+        if nanmask:
+            valid = np.logical_and(conv >= 1, ~invalid)
+            return MaskBand(
+                value=np.ones(self.shape, dtype=bool),
+                valid=valid,
+                grid=self.grid
+            )
+        else:
+            conv = conv.astype(get_dtype())
+            conv[invalid] = np.nan
+            return Band(
+                data=conv,
+                grid=self.grid
+            )
+
+    def to_geotiff(self, fname, epsg=None, dtype='uint8', nodata=255, **kwargs):
+        """
+        Save mask to geotiff to location passed by `fname` with `epsg`. By
+        default, saved as uint8 with 0, 1 and `nodata` for the invalid pixels.
+
+        argument:
+            fname: string
+                The filename to be saved
+            epsg: epsg code
+                epsg code to reproject the data. `None` saves the data to
+                original projection. Default `None`
+            dtype: string
+                integer dtype to save the mask, floating dtypes are saved with
+                NaN as Band.to_geotiff. Default `uint8`
+            nodata: integer
+                value used for the invalid pixels, default 255
+            kwargs:
+                compression, overview and COG options, see Band.to_geotiff
+        """
+        if np.issubdtype(np.dtype(dtype), np.floating):
+            return self.to_band().to_geotiff(fname=fname, epsg=epsg, dtype=dtype, **kwargs)
+
+        data = self.value.astype(dtype)
+        if not self.all_valid:
+            data[~self.valid] = nodata
+        band = Band(data=data, grid=self.grid)
+
+        if epsg is not None:
+            da_self = band_to_rio(band)
+            da_self.rio.write_nodata(nodata, inplace=True)
+            band = rio_to_band(da_self.rio.reproject(epsg, resampling=Resampling.nearest))
+
+        kwargs.setdefault('overview_resampling', 'mode')
+        write_geotiff(fname, band.data, band.grid, dtype=dtype, nodata=nodata, **kwargs)
+
+    def __deepcopy__(self, memo):
+        band = MaskBand(
+            grid=self.grid,
+            **copy.deepcopy(self.attrs, memo)
+        )
+        band.value = copy.deepcopy(self.value, memo)
+        band.validity = copy.deepcopy(self.validity, memo)
+        return band
+
+    def __repr__(self):
+        """
+        Print representation
+        """
+        return '{:d} - {:d} (mask)'.format(self.shape[0], self.shape[1])
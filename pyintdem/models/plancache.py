@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+In-memory cache of the grid dependent plans, bounded by bytes.
+
+The plans, e.g., the rasterized clip masks and the resampling index maps, are
+keyed on grids and can be as large as a band. `functools.lru_cache` bounds the
+number of entries, so that a cache of a few full-tile masks can hold gigabytes
+for the life of the process. `plan_cache` bounds the total size of the arrays
+of the cached results instead, evicting the least recently used, and does not
+keep a result larger than the whole budget in memory. The on-disk cache of the
+plans, see pyintdem.config.set_cache_dir, is not affected.
+
+    @plan_cache()
+    def plan(geotransform, shape):
+        ...
+"""
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+
+# Memory budget of the cached results of each function, in bytes
+PLAN_CACHE_BYTES = 256 * 2**20
+
+
+def result_nbytes(value):
+    """
+    Total size of the numpy arrays in a result, including the arrays inside
+    tuples and lists, e.g., of a namedtuple.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(result_nbytes(v) for v in value)
+    return 0
+
+
+def plan_cache(max_bytes=PLAN_CACHE_BYTES):
+    """
+    Least recently used cache of a function of hashable arguments, bounded by
+    the total size of the arrays of the cached results.
+
+    arguments:
+        max_bytes: integer
+            memory budget of the cache, default PLAN_CACHE_BYTES
+
+    returns:
+        decorator, the decorated function having cache_clear() and
+        cache_info() as the functions decorated by lru_cache
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        sizes = {}
+        lock = threading.Lock()
+        info = {'hits': 0, 'misses': 0, 'nbytes': 0}
+
+        @wraps(func)
+        def wrapper(*args):
+            with lock:
+                if args in cache:
+                    cache.move_to_end(args)
+                    info['hits'] += 1
+                    return cache[args]
+                info['misses'] += 1
+
+            result = func(*args)
+            size = result_nbytes(result)
+            if size > max_bytes:
+                # larger than the budget, not kept in memory
+                return result
+
+            with lock:
+                if args not in cache:
+                    cache[args] = result
+                    sizes[args] = size
+                    info['nbytes'] += size
+                while info['nbytes'] > max_bytes:
+                    key, _ = cache.popitem(last=False)
+                    info['nbytes'] -= sizes.pop(key)
+            return result
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                sizes.clear()
+                info.update(hits=0, misses=0, nbytes=0)
+
+        def cache_info():
+            with lock:
+                return dict(info, entries=len(cache), max_bytes=max_bytes)
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_info = cache_info
+        return wrapper
+
+    return decorator
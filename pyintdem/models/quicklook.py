@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Quicklook rendering of the band and RGB plots.
+
+A quicklook block-averages the array down to a pixel budget (see
+resample.downsample) before plotting it, and writes the PNG through an Agg
+figure kept per thread, cleared and reused for each plot instead of a new
+pyplot figure, with a fast PNG compression. At the default budget a
+10980x10980 band is plotted from a 998x998 array, about 120 times less data
+than the full resolution plot.
+
+    band.plot('Hue', saveto='hue.png', quicklook=True)
+    rgb.plot(saveto='rgb.png', quicklook=True, stretch=(2, 98))
+"""
+import threading
+import warnings
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from .chunked import _dask_array, compute, is_chunked
+from .resample import downsample
+
+# Approximate number of pixels of a quicklook, about 1024x1024
+QUICKLOOK_PIXELS = 2**20
+
+# Resolution of the quicklook PNG, the figure being sized for about one
+# screen pixel per quicklook pixel
+QUICKLOOK_DPI = 100
+
+# Agg figure of each thread
+_local = threading.local()
+
+
+def quicklook_factor(shape, max_pixels=QUICKLOOK_PIXELS):
+    """
+    Integer block size reducing a 2D shape to at most `max_pixels` pixels
+    """
+    return max(int(np.ceil(np.sqrt(np.prod(shape[:2]) / max_pixels))), 1)
+
+
+def decimate(data, max_pixels=QUICKLOOK_PIXELS):
+    """
+    Block mean of a 2D array, or of each channel of a (rows, cols, channels)
+    array, to at most `max_pixels` pixels, ignoring the NaN. The incomplete
+    blocks at the bottom and right edges are dropped.
+
+    arguments:
+        data: array like
+            2D or 3D array, possibly a dask array
+        max_pixels: integer
+            pixel budget, default QUICKLOOK_PIXELS
+
+    returns:
+        Decimated array: np.ndarray
+    """
+    factor = quicklook_factor(data.shape, max_pixels)
+    if factor == 1:
+        return np.asarray(compute(data))
+
+    ny, nx = data.shape[:2]
+    data = data[:max(ny // factor, 1) * factor, :max(nx // factor, 1) * factor]
+
+    if is_chunked(data):
+        da = _dask_array()
+        axes = {0: factor, 1: factor}
+        with warnings.catch_warnings():
+            # all NaN blocks
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            return np.asarray(compute(da.coarsen(np.nanmean, data, axes, trim_excess=True)))
+
+    dtype = np.result_type(data.dtype, np.float32)
+    if data.ndim == 2:
+        return downsample(data, factor, method='mean', dtype=dtype)
+    return np.stack(
+        [downsample(data[:, :, i], factor, method='mean', dtype=dtype) for i in range(data.shape[2])],
+        axis=-1
+    )
+
+
+def percentile_stretch(image, percentiles=(2, 98)):
+    """
+    Rescale a 2D image, or each channel of an RGB image, between two
+    percentiles of its values, clipped to [0, 1].
+
+    arguments:
+        image: np.ndarray
+            2D or (rows, cols, channels) image
+        percentiles: tuple
+            lower and upper percentiles, default (2, 98)
+
+    returns:
+        Stretched image: np.ndarray
+    """
+    if image.ndim == 2:
+        return percentile_stretch(image[:, :, np.newaxis], percentiles)[:, :, 0]
+
+    out = np.empty(image.shape, dtype=np.result_type(image.dtype, np.float32))
+    for i in range(image.shape[2]):
+        channel = image[:, :, i]
+        if np.all(np.isnan(channel)):
+            out[:, :, i] = channel
+            continue
+        low, high = np.nanpercentile(channel, percentiles)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[:, :, i] = np.clip((channel - low) / (high - low if high > low else 1), 0, 1)
+    return out
+
+
+def _figure():
+    """
+    Cleared Agg figure of the current thread
+    """
+    fig = getattr(_local, 'figure', None)
+    if fig is None:
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        _local.figure = fig
+    fig.clear()
+    return fig
+
+
+def render_png(image, saveto, title=None, cmap=None, vmin=None, vmax=None, colorbar=True, dpi=QUICKLOOK_DPI):
+    """
+    Write an image to PNG with the Agg figure of the current thread.
+
+    arguments:
+        image: np.ndarray
+            2D image, or RGB(A) image of (rows, cols, channels)
+        saveto: string
+            PNG location
+        title: string
+            title of the plot, default None
+        cmap: string
+            colormap of a 2D image, default None for the matplotlib default
+        vmin, vmax: float
+            color limits of a 2D image, default None for the data range
+        colorbar: boolean
+            draw a colorbar for a 2D image, default True
+        dpi: integer
+            resolution of the PNG, default QUICKLOOK_DPI
+    """
+    fig = _figure()
+    ny, nx = image.shape[:2]
+    # the default axes span about 3/4 of the figure
+    fig.set_size_inches(max(nx / dpi / 0.75, 2), max(ny / dpi / 0.75, 2))
+
+    ax = fig.add_subplot()
+    im = ax.imshow(image, cmap=cmap, vmin=vmin, vmax=vmax, interpolation='nearest')
+    if colorbar and image.ndim == 2:
+        fig.colorbar(im, ax=ax)
+    if title is not None:
+        ax.set_title(title)
+
+    fig.savefig(saveto, format='png', dpi=dpi, pil_kwargs={'compress_level': 1})
+    fig.clear()
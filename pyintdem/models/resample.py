@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Resampling by integer factors and between integer-aligned grids.
+
+`upsample` and `downsample` change the resolution of an array by integer
+factors (nearest, bilinear, block mean and block mode) working on reshaped and
+broadcast views, optionally block of rows by block of rows.
+
+Sentinel-2 bands of a tile share the origin and extent of the tile at 10, 20
+and 60 m, so the nearest neighbour mapping from a coarse band to a fine band
+only depends on the pair of grids. The mapping is stored as an upsample plan,
+i.e., the source row and column of every target row and column, computed once
+per pair of grids and cached in memory and in the cache directory
+(see `pyintdem.config.set_cache_dir`).
+"""
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+
+from pyintdem.config import get_cache_dir
+from .plancache import plan_cache
+from .stats import CHUNK_SIZE
+
+# Relative tolerance on the pixel size ratio and the offset of the origins
+GRID_TOLERANCE = 1e-6
+
+
+class UpsamplePlan(namedtuple('UpsamplePlan', ['rows', 'cols', 'factor', 'offset'])):
+    """
+    Nearest neighbour mapping from a source grid to an integer-aligned target grid.
+
+    rows and cols are the source row and column of each target row and column,
+    -1 outside the source. factor is the (row, column) upsampling factor and
+    offset the (row, column) of the first target pixel in the source, counted
+    in target pixels.
+    """
+    __slots__ = ()
+
+    @property
+    def shape(self):
+        """
+        Shape of the target grid
+        """
+        return len(self.rows), len(self.cols)
+
+    @property
+    def strided(self):
+        """
+        True if the target is fully inside the source and starts at a source
+        pixel edge, then the plan is a plain repeat of a source block
+        """
+        return (
+            self.offset[0] % self.factor[0] == 0 and self.offset[1] % self.factor[1] == 0
+            and self.rows[0] >= 0 and self.cols[0] >= 0
+            and self.rows[-1] >= 0 and self.cols[-1] >= 0
+            and self.shape[0] % self.factor[0] == 0 and self.shape[1] % self.factor[1] == 0
+        )
+
+
+def _integer_ratio(value):
+    """
+    Nearest integer of value if value is a positive integer within the tolerance, else None
+    """
+    rounded = int(round(value))
+    if rounded < 1 or abs(value - rounded) > GRID_TOLERANCE * max(abs(value), 1):
+        return None
+    return rounded
+
+
+def aligned_factor(src_geotransform, dst_geotransform):
+    """
+    Upsampling factor from a source grid to a target grid, if the target pixels
+    evenly subdivide the source pixels and the origins differ by a whole number
+    of target pixels.
+
+    Args:
+        src_geotransform: GDAL geotransform of the source grid
+        dst_geotransform: GDAL geotransform of the target grid
+
+    Returns: ((row factor, column factor), (row offset, column offset)), None if the grids are not aligned
+
+    """
+    sx0, sdx, srx, sy0, sry, sdy = src_geotransform
+    dx0, ddx, drx, dy0, dry, ddy = dst_geotransform
+
+    if srx != 0 or sry != 0 or drx != 0 or dry != 0:
+        return None
+
+    fx = _integer_ratio(sdx / ddx)
+    fy = _integer_ratio(sdy / ddy)
+    if fx is None or fy is None:
+        return None
+
+    col_offset = (dx0 - sx0) / ddx
+    row_offset = (dy0 - sy0) / ddy
+    if abs(col_offset - round(col_offset)) > GRID_TOLERANCE * max(abs(col_offset), 1):
+        return None
+    if abs(row_offset - round(row_offset)) > GRID_TOLERANCE * max(abs(row_offset), 1):
+        return None
+
+    return (fy, fx), (int(round(row_offset)), int(round(col_offset)))
+
+
+def _axis_index(n_src, n_dst, factor, offset):
+    """
+    Source index of each target index along an axis, -1 outside the source
+    """
+    index = np.floor_divide(np.arange(n_dst) + offset, factor)
+    index[(index < 0) | (index >= n_src)] = -1
+    return index.astype(np.intp)
+
+
+def _plan_key(src_geotransform, src_shape, dst_geotransform, dst_shape):
+    """
+    File name of a plan in the cache directory
+    """
+    key = repr((tuple(map(float, src_geotransform)), tuple(src_shape),
+                tuple(map(float, dst_geotransform)), tuple(dst_shape)))
+    return 'upsample_' + hashlib.sha1(key.encode()).hexdigest()[:16] + '.npz'
+
+
+@plan_cache()
+def upsample_plan(src_geotransform, src_shape, dst_geotransform, dst_shape):
+    """
+    Nearest neighbour upsample plan between two grids of the same projection,
+    cached in memory up to a total size, see plancache.PLAN_CACHE_BYTES, and
+    on disk if a cache directory is set.
+
+    Args:
+        src_geotransform: GDAL geotransform of the source grid, as a tuple
+        src_shape: (rows, columns) of the source grid
+        dst_geotransform: GDAL geotransform of the target grid, as a tuple
+        dst_shape: (rows, columns) of the target grid
+
+    Returns: UpsamplePlan, None if the grids are not integer-aligned
+
+    """
+    aligned = aligned_factor(src_geotransform, dst_geotransform)
+    if aligned is None:
+        return None
+    factor, offset = aligned
+
+    cache_dir = get_cache_dir()
+    fname = None
+    if cache_dir is not None:
+        fname = cache_dir / _plan_key(src_geotransform, src_shape, dst_geotransform, dst_shape)
+        if fname.exists():
+            with np.load(fname) as cached:
+                return UpsamplePlan(
+                    rows=cached['rows'].astype(np.intp),
+                    cols=cached['cols'].astype(np.intp),
+                    factor=factor,
+                    offset=offset
+                )
+
+    plan = UpsamplePlan(
+        rows=_axis_index(src_shape[0], dst_shape[0], factor[0], offset[0]),
+        cols=_axis_index(src_shape[1], dst_shape[1], factor[1], offset[1]),
+        factor=factor,
+        offset=offset
+    )
+
+    if fname is not None:
+        np.savez(fname, rows=plan.rows, cols=plan.cols)
+
+    return plan
+
+
+def apply_plan(data, plan, dtype=None):
+    """
+    Upsample data with a plan, as a broadcast copy of the source block if the
+    plan is strided, else as a gather of the planned rows and columns.
+
+    Args:
+        data: 2D source array
+        plan: UpsamplePlan
+        dtype: dtype of the output, default the dtype of data
+
+    Returns: 2D array of the plan shape, NaN outside the source
+
+    """
+    dtype = data.dtype if dtype is None else np.dtype(dtype)
+    ny, nx = plan.shape
+    fy, fx = plan.factor
+    out = np.empty(plan.shape, dtype=dtype)
+
+    if plan.strided:
+        r0, c0 = plan.rows[0], plan.cols[0]
+        _repeat(data[r0:r0 + ny // fy, c0:c0 + nx // fx], fy, fx, out, CHUNK_SIZE)
+        return out
+
+    irows = plan.rows >= 0
+    icols = plan.cols >= 0
+    out.fill(np.nan)
+    out[np.ix_(irows, icols)] = data[np.ix_(plan.rows[irows], plan.cols[icols])]
+
+    return out
+
+
+def _factors(factor):
+    """
+    (row, column) integer factors from an integer or a pair of integers
+    """
+    fy, fx = (factor, factor) if np.ndim(factor) == 0 else factor
+    if int(fy) != fy or int(fx) != fx or fy < 1 or fx < 1:
+        raise ValueError(f'resample: factor must be a positive integer or a pair of them, got {factor}')
+    return int(fy), int(fx)
+
+
+def _repeat(data, fy, fx, out, chunk_size):
+    """
+    Nearest neighbour upsampling of data into out, block of rows by block of
+    rows: the columns are repeated once, then broadcast to the fy output rows.
+    """
+    ny, nx = data.shape
+    rows = out.reshape(ny, fy, nx * fx)
+    for start, end in _row_blocks(ny, fy * nx * fx, chunk_size):
+        rows[start:end] = np.repeat(data[start:end], fx, axis=1)[:, np.newaxis, :]
+
+
+def _row_blocks(nrows, row_size, chunk_size):
+    """
+    (start, end) of blocks of rows with about chunk_size elements, a single
+    block if chunk_size is None
+    """
+    if chunk_size is None:
+        yield 0, nrows
+        return
+
+    step = max(chunk_size // max(row_size, 1), 1)
+    for start in range(0, nrows, step):
+        yield start, min(start + step, nrows)
+
+
+def scale_geotransform(geotransform, factor):
+    """
+    Geotransform of a grid with the pixel size divided by factor, the origin
+    being the same top left corner.
+
+    Args:
+        geotransform: GDAL geotransform
+        factor: (row, column) factors, > 1 for a finer grid, < 1 for a coarser one
+
+    Returns: tuple
+
+    """
+    x0, dx, rx, y0, ry, dy = geotransform
+    fy, fx = (factor, factor) if np.ndim(factor) == 0 else factor
+    return x0, dx / fx, rx / fy, y0, ry / fx, dy / fy
+
+
+def _interpolation_weights(factor):
+    """
+    Offsets of the target pixel centres from the source pixel centres, in
+    source pixels, for an integer upsampling factor
+    """
+    return (np.arange(factor) + 0.5) / factor - 0.5
+
+
+def _bilinear_axis(data, factor, axis, dtype):
+    """
+    Linear interpolation along an axis for an integer factor, the edge pixels
+    being extended. Each output phase is a weighted sum of two shifted views.
+    """
+    data = np.moveaxis(data, axis, 0)
+    n = data.shape[0]
+    padded = np.concatenate([data[:1], data, data[-1:]], axis=0)
+    out = np.empty((n, factor) + data.shape[1:], dtype=dtype)
+
+    for k, t in enumerate(_interpolation_weights(factor)):
+        if t < 0:
+            np.multiply(padded[:-2], -t, out=out[:, k], casting='unsafe')
+            out[:, k] += (1 + t) * padded[1:-1]
+        else:
+            np.multiply(padded[1:-1], 1 - t, out=out[:, k], casting='unsafe')
+            out[:, k] += t * padded[2:]
+
+    out = out.reshape((n * factor,) + data.shape[1:])
+    return np.moveaxis(out, 0, axis)
+
+
+def upsample(data, factor, method='nearest', dtype=None, chunk_size=CHUNK_SIZE):
+    """
+    Increase the resolution of a 2D array by integer factors, keeping the top
+    left corner, see scale_geotransform. With bilinear, the output pixel
+    centres are interpolated from the input pixel centres, the edge pixels
+    being extended.
+
+    Args:
+        data: 2D array
+        factor: integer or (row, column) integers
+        method: 'nearest' (block repeat) or 'bilinear' (NaN spreads to the neighbouring pixels)
+        dtype: dtype of the output, default the dtype of data
+        chunk_size: approximate number of output elements processed at once, None for a single pass
+
+    Returns: 2D array of shape (rows * row factor, columns * column factor)
+
+    """
+    fy, fx = _factors(factor)
+    dtype = data.dtype if dtype is None else np.dtype(dtype)
+    ny, nx = data.shape
+    out = np.empty((ny * fy, nx * fx), dtype=dtype)
+
+    if method == 'nearest':
+        _repeat(data, fy, fx, out, chunk_size)
+    elif method == 'bilinear':
+        work = np.result_type(dtype, np.float32)
+        for start, end in _row_blocks(ny, fy * nx * fx, chunk_size):
+            # one row of halo on each side to interpolate across the block edges
+            lo = max(start - 1, 0)
+            hi = min(end + 1, ny)
+            rows = _bilinear_axis(data[lo:hi], fy, axis=0, dtype=work)
+            rows = rows[(start - lo) * fy:(end - lo) * fy]
+            out[start * fy:end * fy] = _bilinear_axis(rows, fx, axis=1, dtype=work)
+    else:
+        raise NotImplementedError(f'resample: {method} upsampling is not implemented, use nearest or bilinear')
+
+    return out
+
+
+def _block_mode(blocks):
+    """
+    Most frequent non-NaN value of each block along the last axis, the
+    smallest one for ties, NaN for all-NaN blocks
+    """
+    values = np.sort(blocks, axis=-1)
+    counts = np.zeros(values.shape, dtype=np.int32)
+    for k in range(values.shape[-1]):
+        counts += values == values[..., k:k + 1]
+    imode = np.argmax(counts, axis=-1)[..., np.newaxis]
+    return np.take_along_axis(values, imode, axis=-1)[..., 0]
+
+
+def downsample(data, factor, method='mean', dtype=None, chunk_size=CHUNK_SIZE):
+    """
+    Decrease the resolution of a 2D array by integer factors, keeping the top
+    left corner, see scale_geotransform. Each output pixel summarizes a block
+    of factor x factor input pixels, the incomplete blocks at the bottom and
+    right edges included.
+
+    Args:
+        data: 2D array
+        factor: integer or (row, column) integers
+        method: 'mean' (block mean of the non-NaN values), 'mode' (most frequent non-NaN value,
+            the smallest one for ties, e.g., for masks) or 'nearest' (pixel at the block centre)
+        dtype: dtype of the output, default the dtype of data
+        chunk_size: approximate number of input elements processed at once, None for a single pass
+
+    Returns: 2D array of shape (ceil(rows / row factor), ceil(columns / column factor))
+
+    """
+    fy, fx = _factors(factor)
+    dtype = data.dtype if dtype is None else np.dtype(dtype)
+    ny, nx = data.shape
+    my, mx = -(-ny // fy), -(-nx // fx)
+
+    if method == 'nearest':
+        # pixel holding the block centre, the last pixel for the incomplete blocks
+        rows = np.minimum(np.arange(my) * fy + fy // 2, ny - 1)
+        cols = np.minimum(np.arange(mx) * fx + fx // 2, nx - 1)
+        return data[np.ix_(rows, cols)].astype(dtype, copy=False)
+
+    if method not in ('mean', 'mode'):
+        raise NotImplementedError(f'resample: {method} downsampling is not implemented, use mean, mode or nearest')
+
+    if my * fy != ny or mx * fx != nx:
+        # NaN padding of the incomplete blocks, ignored by both methods
+        padded = np.full((my * fy, mx * fx), np.nan, dtype=np.result_type(data.dtype, np.float32))
+        padded[:ny, :nx] = data
+        data = padded
+
+    out = np.empty((my, mx), dtype=dtype)
+    for start, end in _row_blocks(my, fy * mx * fx, chunk_size):
+        blocks = data[start * fy:end * fy].reshape(end - start, fy, mx, fx)
+        if method == 'mean':
+            if np.issubdtype(blocks.dtype, np.floating):
+                valid = ~np.isnan(blocks)
+                total = np.sum(blocks, axis=(1, 3), where=valid, dtype=np.float64)
+                count = np.count_nonzero(valid, axis=(1, 3))
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    out[start:end] = total / count
+            else:
+                out[start:end] = np.mean(blocks, axis=(1, 3), dtype=np.float64)
+        else:
+            blocks = blocks.transpose(0, 2, 1, 3).reshape(end - start, mx, fy * fx)
+            out[start:end] = _block_mode(blocks)
+
+    return out
@@ -1,18 +1,24 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 import matplotlib.colors as mcl
 import matplotlib.pyplot as plt
 import numpy as np
 from osgeo import gdal
 
+from pyintdem.config import get_dtype
 from .band import Band
+from .chunked import compute, is_chunked, row_chunk_size
+from .geotiff import write_geotiff
+from .quicklook import QUICKLOOK_PIXELS, decimate, percentile_stretch, render_png
+from .scratch import scratch_array, to_scratch
+from .stats import CHUNK_SIZE
 
 
 class RGB(object):
-    def __init__(self, red, green, blue):
+    def __init__(self, red, green, blue, scratch=False, planar=False):
         """
         RGB band using in the red-green-blue band.
 
@@ -23,6 +29,14 @@ class RGB(object):
                 Green band to construct RGB
             blue: Band
                 Blue band to construct RGB
+            scratch: boolean
+                Build the RGB array in a memory-mapped scratch file, see
+                RGB.to_scratch, default False
+            planar: boolean
+                Keep the data of the three bands instead of copying it into
+                a rows x cols x 3 array, which is then only built if `rgb` is
+                used, e.g., by to_hsv or to_geotiff. hue_value and the
+                quicklook plots read the bands directly. Default False
         """
         try:
             # Type checking
@@ -46,16 +60,78 @@ class RGB(object):
         except:
             raise AssertionError('In RGB: Bands are not of equal size')
         else:
-            # Projection information
-            self.geotransform = red.geotransform
-            self.projection = red.projection
+            # Projection information, shared with the bands
+            self.grid = red.grid
+            self.scratch = scratch
 
-            # Build the RGB
-            row, col = red.data.shape[0:2]
-            self.rgb = np.empty(shape=[row, col, 3])
-            self.rgb[:, :, 0] = red.data
-            self.rgb[:, :, 1] = green.data
-            self.rgb[:, :, 2] = blue.data
+            if planar:
+                self._planes = (red.data, green.data, blue.data)
+                self._rgb = None
+            else:
+                self._planes = None
+                self._rgb = self._build(red.data, green.data, blue.data)
+
+    def _build(self, red, green, blue):
+        """
+        rows x cols x 3 RGB array of the red, green and blue data
+        """
+        row, col = red.shape[0:2]
+        if self.scratch:
+            rgb = scratch_array((row, col, 3), get_dtype(), grid=self.grid)
+        else:
+            rgb = np.empty(shape=[row, col, 3], dtype=get_dtype())
+        rgb[:, :, 0] = red
+        rgb[:, :, 1] = green
+        rgb[:, :, 2] = blue
+        return rgb
+
+    @property
+    def rgb(self):
+        """
+        rows x cols x 3 RGB array, built from the bands on first use for a
+        planar RGB
+        """
+        if self._rgb is None and self._planes is not None:
+            self._rgb = self._build(*self._planes)
+            self._planes = None
+        return self._rgb
+
+    @rgb.setter
+    def rgb(self, rgb):
+        self._rgb = rgb
+        self._planes = None
+
+    def planes(self):
+        """
+        Red, green and blue 2D arrays, views of `rgb` unless planar
+        """
+        if self._planes is not None:
+            return self._planes
+        return tuple(self._rgb[:, :, i] for i in range(3))
+
+    @property
+    def geotransform(self):
+        """
+        GDAL geotransform of the bands
+        """
+        return self.grid.geotransform
+
+    @property
+    def projection(self):
+        """
+        Projection of the bands
+        """
+        return self.grid.projection
+
+    def to_scratch(self, name=None, scratch_dir=None, persist=False):
+        """
+        Move the RGB array to a memory-mapped scratch file, see Band.to_scratch.
+
+        returns:
+            The RGB itself: RGB
+        """
+        self.rgb = to_scratch(self.rgb, grid=self.grid, name=name, scratch_dir=scratch_dir, persist=persist)
+        return self
 
     @staticmethod
     def rgb2hsv(r, g, b):
@@ -126,23 +202,34 @@ class RGB(object):
         # Finally
         hue = Band(
             data=hsv[:, :, 0],
-            geotransform=self.geotransform,
-            projection=self.projection
+            grid=self.grid
         )
         saturation = Band(
             data=hsv[:, :, 1],
-            geotransform=self.geotransform,
-            projection=self.projection
+            grid=self.grid
         )
         value = Band(
             data=hsv[:, :, 2],
-            geotransform=self.geotransform,
-            projection=self.projection
+            grid=self.grid
         )
 
         # And
         return hue, saturation, value
 
+    def hue_value(self, chunk_size=CHUNK_SIZE, num_threads=1, scratch=False):
+        """
+        Hue and value of the RGB, equal to the hue and value of
+        to_hsv('matplotlib') without the saturation and the HSV array, see
+        hue_value.
+
+        returns:
+            hue, value: Band, Band
+        """
+        return _hue_value(
+            self.planes(), None, self.grid,
+            chunk_size=chunk_size, num_threads=num_threads, scratch=scratch
+        )
+
     def to_value(self):
         """
         Return the value part of the hue-saturation-value composition. Value is
@@ -150,12 +237,11 @@ class RGB(object):
         """
         value = Band(
             data=np.nanmax(self.rgb, axis=2),
-            geotransform=self.geotransform,
-            projection=self.projection
+            grid=self.grid
         )
         return value
 
-    def plot(self, title='RGB', saveto=None):
+    def plot(self, title='RGB', saveto=None, quicklook=False, max_pixels=QUICKLOOK_PIXELS, stretch=None):
         """
         Plot RGB data using title and saveto a locaiton
 
@@ -164,9 +250,29 @@ class RGB(object):
                 The title to be used in plotting
             saveto: string
                 Save to the locaiton
+            quicklook: boolean
+                plot the RGB block-averaged to `max_pixels`, written to
+                `saveto` as PNG by a reused Agg figure, see Band.plot.
+                Default False (full resolution)
+            max_pixels: integer
+                pixel budget of the quicklook, default about 1024x1024
+            stretch: tuple
+                lower and upper percentiles of the contrast stretch of each
+                channel, e.g., (2, 98), default None
         """
+        if quicklook:
+            image = np.stack([decimate(plane, max_pixels) for plane in self.planes()], axis=-1)
+        else:
+            image = self.rgb
+        if stretch is not None:
+            image = percentile_stretch(image, stretch)
+
+        if quicklook and saveto is not None:
+            render_png(image, saveto, title=title, colorbar=False)
+            return
+
         plt.figure()
-        plt.imshow(self.rgb)
+        plt.imshow(image)
         plt.colorbar()
         plt.title(title)
         if saveto is None:
@@ -175,33 +281,136 @@ class RGB(object):
             plt.savefig(saveto)
             plt.close()
 
-    def to_geotiff(self, fname, dtype=gdal.GDT_Float32, epsg='auto'):
+    def to_geotiff(self, fname, dtype='float32', epsg='auto', **kwargs):
         """
-        Save band data to geotiff to location passed by `to` with datatype
-        defined by `dtype`
+        Save the RGB to a 3 band, tiled and compressed geotiff to location
+        passed by `fname` with datatype defined by `dtype`
 
         argument:
             fname: string
                 The filename to be saved
-            dtype: gdal data type
-                Gdal datatype to be used for saving, default `gdal.GDT_Float32`
+            dtype: numpy dtype or gdal data type
+                datatype to be used for saving, default `float32`, gdal data
+                types, e.g., `gdal.GDT_Float32`, are accepted
             epsg: epsg code
                 epsg code to reproject the data. `auto` saves the data to
                 original projection. Default `auto` (only option)
+            kwargs:
+                compression, overview and COG options, see Band.to_geotiff
 
         """
-        fname = Path(fname).as_posix()
-        row, col, nband = self.rgb.shape
-
-        if epsg == 'auto':
-            driver = gdal.GetDriverByName('GTiff')
-            gtiff = driver.Create(fname, row, col, nband, dtype)
-            gtiff.GetRasterBand(1).WriteArray(self.rgb[:, :, 0])
-            gtiff.GetRasterBand(2).WriteArray(self.rgb[:, :, 1])
-            gtiff.GetRasterBand(3).WriteArray(self.rgb[:, :, 2])
-            gtiff.SetGeoTransform(self.geotransform)
-            gtiff.SetProjection(self.projection)
-            gtiff.FlushCache()
-            gtiff = None
-        else:
+        if epsg != 'auto':
             raise NotImplementedError
+
+        if isinstance(dtype, int):
+            # gdal data type, Byte being the only name differing from numpy
+            dtype = 'uint8' if dtype == gdal.GDT_Byte else gdal.GetDataTypeName(dtype).lower()
+
+        # bands first, as the layers of the file
+        write_geotiff(fname, np.moveaxis(self.rgb, -1, 0), self.grid, dtype=dtype, **kwargs)
+
+
+def _hue_value_block(red, green, blue, alpha=None):
+    """
+    Hue and value of blocks of the red, green and blue data, blended with
+    alpha as create_synthetic_rgb if given.
+
+    The hue is the one of matplotlib.colors.rgb_to_hsv, the last maximum of
+    red, green and blue giving the hue sector, 0 without a valid maximum, and
+    NaN where red is NaN. The value is the maximum, NaN if one is NaN.
+    """
+    if alpha is not None:
+        inverse = alpha * -1 + 1
+        red = red * alpha + inverse
+        green = inverse + green * alpha
+        blue = inverse + blue * alpha
+
+    value = np.maximum(np.maximum(red, green), blue)
+    minimum = np.minimum(np.minimum(red, green), blue)
+    if np.any(value > 1) or np.any(minimum < 0):
+        raise ValueError('In RGB hue_value: the red, green and blue values must be in the range [0, 1]')
+    delta = value - minimum
+    del minimum
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hue = np.where(
+            blue == value, 4. + (red - green) / delta,
+            np.where(green == value, 2. + (blue - red) / delta, (green - blue) / delta)
+        )
+    hue[~(delta > 0)] = 0
+    hue = (hue / 6.0) % 1.0
+    hue[np.isnan(red)] = np.nan
+
+    return hue, value
+
+
+def _hue_value(planes, alpha, grid, chunk_size=CHUNK_SIZE, num_threads=1, scratch=False):
+    """
+    Hue and value bands of red, green and blue arrays, see hue_value
+    """
+    arrays = list(planes) + ([] if alpha is None else [alpha])
+    nrows, ncols = arrays[0].shape
+    dtype = get_dtype()
+
+    # blocks of rows, aligned with the chunks of the dask arrays
+    step = next((row_chunk_size(data) for data in arrays if is_chunked(data)), None)
+    if step is None:
+        step = max(chunk_size // max(ncols, 1), 1)
+    blocks = [slice(start, min(start + step, nrows)) for start in range(0, nrows, step)]
+
+    if scratch:
+        hue = scratch_array((nrows, ncols), dtype, grid=grid)
+        value = scratch_array((nrows, ncols), dtype, grid=grid)
+    else:
+        hue = np.empty((nrows, ncols), dtype=dtype)
+        value = np.empty((nrows, ncols), dtype=dtype)
+
+    def evaluate(rows):
+        data = [np.asarray(compute(array[rows])).astype(dtype, copy=False) for array in arrays]
+        hue[rows], value[rows] = _hue_value_block(*data)
+
+    if num_threads > 1 and len(blocks) > 1:
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            list(executor.map(evaluate, blocks))
+    else:
+        for rows in blocks:
+            evaluate(rows)
+
+    return Band(data=hue, grid=grid), Band(data=value, grid=grid)
+
+
+def hue_value(red, green, blue, alpha=None, chunk_size=CHUNK_SIZE, num_threads=1, scratch=False):
+    """
+    Hue and value of three bands in a single pass over blocks of rows,
+    without the RGB and HSV arrays of RGB.to_hsv: the hue and value are
+    equal to the ones of RGB(red, green, blue).to_hsv('matplotlib').
+
+    arguments:
+        red, green, blue: Band
+            red, green and blue bands, of values in [0, 1]
+        alpha: Band
+            blend the bands with alpha as create_synthetic_rgb of the
+            khan2019 workflow, `band * alpha + 1 - alpha`, in the same pass,
+            default None
+        chunk_size: integer
+            approximate number of pixels evaluated at once, the blocks
+            following the chunks of chunked bands
+        num_threads: integer
+            number of threads evaluating the blocks, default 1
+        scratch: boolean
+            write the hue and value to memory-mapped scratch files, see
+            Band.to_scratch, default False
+
+    returns:
+        hue, value: Band, Band
+    """
+    bands = [red, green, blue] + ([] if alpha is None else [alpha])
+    if not all(isinstance(band, Band) for band in bands):
+        raise AssertionError('In hue_value: Not an instance of Band data')
+    if not all(band.shape == red.shape for band in bands):
+        raise AssertionError('In hue_value: Bands are not of equal size')
+
+    return _hue_value(
+        [red.data, green.data, blue.data], None if alpha is None else alpha.data, red.grid,
+        chunk_size=chunk_size, num_threads=num_threads, scratch=scratch
+    )
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped scratch storage of the band data.
+
+A scratch file is a `.npy` array opened as `np.memmap` in the scratch
+directory (see pyintdem.config.set_scratch_dir), with a `.json` sidecar
+holding the grid of the band. Only the pages in use are kept in RAM, the
+kernel writes the others back to the file.
+
+The files are removed when the array is released, i.e., when the last band or
+view using it is garbage collected, unless they are persisted.
+"""
+import json
+import os
+import tempfile
+import weakref
+from pathlib import Path
+
+import numpy as np
+
+from pyintdem.config import get_scratch_dir
+from .grid import grid_spec
+
+# Cleanup of the scratch files and weak reference of the arrays, by path of the array file
+_cleanups = {}
+_arrays = {}
+
+
+def _remove(paths):
+    """
+    Remove the files of a released scratch array
+    """
+    _cleanups.pop(paths[0], None)
+    _arrays.pop(paths[0], None)
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _register(array, fname, persist):
+    """
+    Track a scratch array, removing its files on release unless persisted
+    """
+    _arrays[fname] = weakref.ref(array)
+    if not persist:
+        _cleanups[fname] = weakref.finalize(array, _remove, (fname, sidecar_path(fname).as_posix()))
+
+
+def _write_sidecar(fname, grid):
+    """
+    Write the grid of a scratch file to its .json sidecar
+    """
+    metadata = {'geotransform': None, 'projection': None}
+    if grid is not None:
+        metadata['geotransform'] = grid.geotransform
+        metadata['projection'] = grid.projection
+    with open(sidecar_path(fname), 'w') as f:
+        json.dump(metadata, f)
+
+
+def sidecar_path(fname):
+    """
+    Path of the grid sidecar of a scratch file
+    """
+    return Path(fname).with_suffix('.json')
+
+
+def scratch_array(shape, dtype, grid=None, name=None, scratch_dir=None, persist=False):
+    """
+    Allocate a memory-mapped array in the scratch directory.
+
+    arguments:
+        shape: tuple
+            shape of the array
+        dtype: numpy dtype
+            dtype of the array
+        grid: GridSpec
+            grid written to the sidecar, default None
+        name: string
+            file name without extension, default None for a unique name
+        scratch_dir: path
+            directory of the file, default None for the configured scratch directory
+        persist: boolean
+            keep the files when the array is released, default False
+
+    returns:
+        Array: np.memmap
+    """
+    scratch_dir = get_scratch_dir() if scratch_dir is None else Path(scratch_dir)
+    scratch_dir.mkdir(parents=True, exist_ok=True)
+
+    if name is None:
+        handle, fname = tempfile.mkstemp(prefix='pyintdem_', suffix='.npy', dir=scratch_dir)
+        os.close(handle)
+    else:
+        fname = (scratch_dir / name).with_suffix('.npy').as_posix()
+    fname = os.path.abspath(fname)
+
+    array = np.lib.format.open_memmap(fname, mode='w+', dtype=dtype, shape=tuple(shape))
+    _write_sidecar(fname, grid)
+    _register(array, fname, persist)
+
+    return array
+
+
+def _is_scratch_array(data):
+    """
+    True if the array is a full scratch array allocated by this module
+    """
+    fname = scratch_file(data)
+    if fname is None:
+        return False
+    ref = _arrays.get(fname.as_posix())
+    return ref is not None and ref() is data
+
+
+def _move(data, grid, name, scratch_dir, persist):
+    """
+    Rename the files of a scratch array instead of copying it. Returns False
+    if the files can not be renamed, e.g., across file systems.
+    """
+    source = scratch_file(data)
+    directory = source.parent if scratch_dir is None else Path(scratch_dir)
+    target = directory / (source.stem if name is None else name)
+    target = target.with_suffix('.npy')
+
+    if target != source:
+        directory.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(source, target)
+        except OSError:
+            return False
+        try:
+            os.remove(sidecar_path(source))
+        except OSError:
+            pass
+        data.filename = os.path.abspath(target)
+
+    cleanup = _cleanups.pop(source.as_posix(), None)
+    if cleanup is not None:
+        cleanup.detach()
+    _arrays.pop(source.as_posix(), None)
+
+    _write_sidecar(data.filename, grid)
+    _register(data, data.filename, persist)
+    return True
+
+
+def to_scratch(data, grid=None, name=None, scratch_dir=None, persist=False):
+    """
+    Copy an array into a new scratch array, see scratch_array. An array
+    already in a scratch file is moved instead: its files are renamed to the
+    new name and directory, without a second write.
+
+    returns:
+        Array: np.memmap
+    """
+    if _is_scratch_array(data) and _move(data, grid, name, scratch_dir, persist):
+        return data
+
+    array = scratch_array(
+        data.shape, data.dtype, grid=grid, name=name,
+        scratch_dir=scratch_dir, persist=persist
+    )
+    array[...] = data
+    return array
+
+
+def scratch_file(data):
+    """
+    Path of the file backing a memory-mapped array, None for an in-memory array.
+    """
+    fname = getattr(data, 'filename', None)
+    if fname is None:
+        return None
+    return Path(fname)
+
+
+def open_scratch(fname, mode='r+'):
+    """
+    Open a persisted scratch file.
+
+    arguments:
+        fname: path
+            the .npy scratch file
+        mode: string
+            np.memmap mode, default 'r+'
+
+    returns:
+        Array and grid: np.memmap, GridSpec
+    """
+    fname = Path(fname)
+    array = np.load(fname, mmap_mode=mode)
+    with open(sidecar_path(fname)) as f:
+        metadata = json.load(f)
+
+    return array, grid_spec(metadata['geotransform'], metadata['projection'], array.shape)
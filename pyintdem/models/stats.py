@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+import numpy as np
+
+from .chunked import compute, is_chunked, row_chunk_size
+
+# Number of elements processed at once, small enough to stay in the cache
+CHUNK_SIZE = 2**18
+
+
+class BandStats(namedtuple('BandStats', ['count', 'min', 'max', 'mean', 'm2'])):
+    """
+    Statistics of the non-NaN values of an array: count, minimum, maximum, mean
+    and the sum of squared deviations from the mean (m2).
+    """
+    __slots__ = ()
+
+    @property
+    def var(self):
+        """
+        Population variance, as np.nanvar
+        """
+        return self.m2 / self.count if self.count > 0 else np.nan
+
+    @property
+    def std(self):
+        """
+        Population standard deviation, as np.nanstd
+        """
+        return np.sqrt(self.var)
+
+
+EMPTY_STATS = BandStats(count=0, min=np.nan, max=np.nan, mean=np.nan, m2=0.0)
+
+
+class MaskedStats(namedtuple('MaskedStats', ['count', 'mean', 'std', 'median'])):
+    """
+    Count, mean, standard deviation and median of the non-NaN values of an
+    array selected by a mask.
+    """
+    __slots__ = ()
+
+
+def combine_stats(a, b):
+    """
+    Combine the statistics of two disjoint sets of values (Chan et al.).
+
+    Args:
+        a: BandStats
+        b: BandStats
+
+    Returns: BandStats of the union
+
+    """
+    if a.count == 0:
+        return b
+    if b.count == 0:
+        return a
+
+    count = a.count + b.count
+    delta = b.mean - a.mean
+    mean = a.mean + delta * b.count / count
+    m2 = a.m2 + b.m2 + delta**2 * a.count * b.count / count
+
+    return BandStats(
+        count=count,
+        min=min(a.min, b.min),
+        max=max(a.max, b.max),
+        mean=mean,
+        m2=m2
+    )
+
+
+def chunk_stats(chunk, where=None):
+    """
+    Statistics of the non-NaN values of a small array, without compressing out
+    the NaN values.
+
+    Args:
+        chunk: array like
+        where: bool array like of the values to include, default None for all
+
+    Returns: BandStats
+
+    """
+    if where is not None:
+        valid = np.asarray(where, dtype=bool)
+        if np.issubdtype(chunk.dtype, np.floating):
+            valid = valid & ~np.isnan(chunk)
+        count = int(np.count_nonzero(valid))
+    elif np.issubdtype(chunk.dtype, np.floating):
+        valid = ~np.isnan(chunk)
+        count = int(np.count_nonzero(valid))
+    else:
+        valid = None
+        count = chunk.size
+
+    if count == 0:
+        return EMPTY_STATS
+
+    if valid is None:
+        vmin = np.min(chunk)
+        vmax = np.max(chunk)
+        mean = np.sum(chunk, dtype=np.float64) / count
+        m2 = np.sum(np.square(chunk - mean), dtype=np.float64)
+    else:
+        if where is None:
+            vmin = np.fmin.reduce(chunk, axis=None)
+            vmax = np.fmax.reduce(chunk, axis=None)
+        else:
+            selected = chunk[valid]
+            vmin = np.min(selected)
+            vmax = np.max(selected)
+        mean = np.sum(chunk, where=valid, dtype=np.float64) / count
+        m2 = np.sum(np.square(chunk - mean), where=valid, dtype=np.float64)
+
+    return BandStats(count=count, min=vmin, max=vmax, mean=mean, m2=m2)
+
+
+def iter_chunks(data, chunk_size=CHUNK_SIZE, nrows=None):
+    """
+    Iterate over blocks of rows of an array, each having about `chunk_size`
+    elements. With `nrows`, or for a dask array, the array is first split in
+    strips of `nrows` rows (a row of chunks by default for a dask array),
+    computed one at a time, and each strip in blocks of `chunk_size` elements.
+    """
+    if not is_chunked(data):
+        data = np.asarray(data)
+    if data.ndim == 0:
+        yield compute(data).reshape(1)
+        return
+
+    if nrows is None:
+        nrows = row_chunk_size(data)
+    if nrows is not None:
+        for start in range(0, data.shape[0], nrows):
+            yield from iter_chunks(compute(data[start:start + nrows]), chunk_size=chunk_size)
+        return
+
+    row_size = max(int(np.prod(data.shape[1:])), 1)
+    nrows = max(chunk_size // row_size, 1)
+    for start in range(0, data.shape[0], nrows):
+        yield data[start:start + nrows]
+
+
+def iter_masked_chunks(data, where=None, chunk_size=CHUNK_SIZE):
+    """
+    Iterate over blocks of rows of an array and of a mask of the same shape,
+    yielding (data chunk, mask chunk), the mask chunk being None without mask.
+    """
+    if where is None:
+        for chunk in iter_chunks(data, chunk_size=chunk_size):
+            yield chunk, None
+    else:
+        # the same blocks of rows for both, following the chunks of a dask array
+        nrows = row_chunk_size(data) or row_chunk_size(where)
+        yield from zip(
+            iter_chunks(data, chunk_size=chunk_size, nrows=nrows),
+            iter_chunks(where, chunk_size=chunk_size, nrows=nrows)
+        )
+
+
+def compute_stats(data, chunk_size=CHUNK_SIZE, where=None):
+    """
+    Count, minimum, maximum, mean and m2 of the non-NaN values of an array in
+    a single chunked pass over the data.
+
+    Args:
+        data: array like
+        chunk_size: number of elements processed at once
+        where: bool array like of the values to include, default None for all
+
+    Returns: BandStats
+
+    """
+    stats = EMPTY_STATS
+    for chunk, chunk_where in iter_masked_chunks(data, where, chunk_size=chunk_size):
+        stats = combine_stats(stats, chunk_stats(chunk, where=chunk_where))
+
+    return stats
+
+
+def masked_values(data, where, chunk_size=CHUNK_SIZE):
+    """
+    Non-NaN values of an array selected by a mask, gathered chunk by chunk
+    without a masked copy of the full array.
+
+    Args:
+        data: array like
+        where: bool array like of the values to include
+        chunk_size: number of elements processed at once
+
+    Returns: 1D array
+
+    """
+    values = []
+    for chunk, chunk_where in iter_masked_chunks(data, where, chunk_size=chunk_size):
+        selected = np.asarray(chunk_where, dtype=bool)
+        if np.issubdtype(chunk.dtype, np.floating):
+            selected = selected & ~np.isnan(chunk)
+        values.append(chunk[selected])
+
+    if len(values) == 0:
+        dtype = data.dtype if hasattr(data, 'dtype') else np.asarray(data).dtype
+        return np.array([], dtype=dtype)
+
+    return np.concatenate(values)
+
+
+def _iter_binned(data, lo, hi, nbins, include_hi, chunk_size=CHUNK_SIZE, where=None):
+    """
+    Iterate over the values of data in [lo, hi), or [lo, hi] if include_hi,
+    chunk by chunk, yielding (values, bin index) for nbins equal bins.
+    """
+    scale = nbins / (hi - lo)
+    for chunk, chunk_where in iter_masked_chunks(data, where, chunk_size=chunk_size):
+        if include_hi:
+            selected = (chunk >= lo) & (chunk <= hi)
+        else:
+            selected = (chunk >= lo) & (chunk < hi)
+        if chunk_where is not None:
+            selected &= chunk_where
+        values = chunk[selected]
+        if values.size == 0:
+            continue
+        index = ((values - lo) * scale).astype(np.intp)
+        np.clip(index, 0, nbins - 1, out=index)
+        yield values, index
+
+
+def _histogram(data, lo, hi, nbins, include_hi, chunk_size=CHUNK_SIZE, where=None):
+    """
+    Histogram of the values of data in [lo, hi), or [lo, hi] if include_hi,
+    with nbins equal bins, computed chunk by chunk.
+    """
+    counts = np.zeros(nbins, dtype=np.int64)
+    for _, index in _iter_binned(data, lo, hi, nbins, include_hi, chunk_size=chunk_size, where=where):
+        counts += np.bincount(index, minlength=nbins)
+
+    return counts
+
+
+def _bin_values(data, lo, hi, nbins, ibin, include_hi, chunk_size=CHUNK_SIZE, where=None):
+    """
+    Values of data in the bin `ibin` of the histogram of _histogram, gathered
+    chunk by chunk.
+    """
+    values = [
+        chunk_values[index == ibin]
+        for chunk_values, index in _iter_binned(data, lo, hi, nbins, include_hi, chunk_size=chunk_size, where=where)
+    ]
+    if len(values) == 0:
+        return np.array([])
+    return np.concatenate(values)
+
+
+def _min_above(data, value, chunk_size=CHUNK_SIZE, where=None):
+    """
+    Smallest value of data greater than `value`, computed chunk by chunk.
+    """
+    result = np.inf
+    for chunk, chunk_where in iter_masked_chunks(data, where, chunk_size=chunk_size):
+        selected = chunk > value
+        if chunk_where is not None:
+            selected &= chunk_where
+        if np.any(selected):
+            result = min(result, float(chunk[selected].min()))
+    return result
+
+
+def _select_rank(data, lo, hi, nbins, ibin, include_hi, rank, before, chunk_size=CHUNK_SIZE, where=None):
+    """
+    Exact value at a fractional rank, numpy's linear method, the rank being
+    in the bin `ibin` holding the sorted values from `before` on.
+    """
+    values = _bin_values(data, lo, hi, nbins, ibin, include_hi, chunk_size=chunk_size, where=where)
+    k = int(np.floor(rank))
+    fraction = rank - k
+    local = min(max(k - int(before), 0), values.size - 1)
+    values = np.partition(values, local)
+    value = float(values[local])
+    if fraction > 0:
+        if local + 1 < values.size:
+            upper = float(values[local + 1:].min())
+        else:
+            # the next sorted value is in a higher bin
+            upper = _min_above(data, value, chunk_size=chunk_size, where=where)
+        if np.isfinite(upper):
+            value += fraction * (upper - value)
+    return value
+
+
+def approx_quantile(data, q, error=1e-4, stats=None, chunk_size=CHUNK_SIZE, max_refine=4, where=None):
+    """
+    Approximate quantiles of the non-NaN values of an array from histograms,
+    in linear time and without copying or sorting the data.
+
+    A histogram of ceil(1/error) bins is built over [min, max]. If the bin
+    holding the requested rank has more than `error * count` values, the
+    histogram is rebuilt over that bin only, up to `max_refine` times. The
+    returned value lies in the final bin, interpolated linearly inside it, so
+    its rank is within `error * count` of the exact quantile (the rank error).
+    Each refinement is one more pass over the data, which is rarely needed.
+    If the final bin still holds more than `error * count` values, e.g., with
+    a few outliers far from the bulk of the data, its values are gathered and
+    the quantile is selected exactly, keeping the bound.
+
+    Args:
+        data: array like
+        q: quantile or sequence of quantiles in [0, 1]
+        error: rank error bound as a fraction of the number of values, default 1e-4
+        stats: BandStats of the data, computed if not given
+        chunk_size: number of elements processed at once
+        max_refine: maximum number of refinements of the histogram
+        where: bool array like of the values to include, default None for all
+
+    Returns: quantile value(s), same as np.nanquantile for the shape
+
+    """
+    if not 0 < error < 1:
+        raise ValueError('approx_quantile: error must be in (0, 1)')
+
+    if stats is None:
+        stats = compute_stats(data, chunk_size=chunk_size, where=where)
+
+    qs = np.atleast_1d(np.asarray(q, dtype=float))
+    if np.any((qs < 0) | (qs > 1)):
+        raise ValueError('approx_quantile: quantiles must be in [0, 1]')
+
+    if stats.count == 0:
+        values = np.full(qs.shape, np.nan)
+        return values[0] if np.ndim(q) == 0 else values
+
+    nbins = int(np.ceil(1 / error))
+    tolerance = error * stats.count
+    vmax = float(stats.max)
+
+    values = np.empty(qs.shape)
+    for i, quantile in enumerate(qs):
+        # position of the quantile in the sorted values, as numpy's linear method
+        rank = quantile * (stats.count - 1)
+        lo = float(stats.min)
+        hi = vmax
+        below = 0
+
+        for level in range(max_refine + 1):
+            if hi <= lo:
+                value = lo
+                break
+
+            counts = _histogram(data, lo, hi, nbins, include_hi=(hi == vmax), chunk_size=chunk_size, where=where)
+            cdf = np.cumsum(counts)
+            ibin = min(int(np.searchsorted(cdf, rank - below, side='right')), nbins - 1)
+            before = below + (cdf[ibin - 1] if ibin > 0 else 0)
+            width = (hi - lo) / nbins
+            bin_lo = lo + ibin * width
+
+            if counts[ibin] > tolerance and level == max_refine:
+                # refinements exhausted, exact selection in the bin
+                value = _select_rank(
+                    data, lo, hi, nbins, ibin, hi == vmax, rank, before, chunk_size=chunk_size, where=where
+                )
+                break
+
+            if counts[ibin] <= tolerance:
+                fraction = (rank - before) / counts[ibin] if counts[ibin] > 0 else 0.5
+                value = bin_lo + min(max(fraction, 0.0), 1.0) * width
+                break
+
+            lo = bin_lo
+            hi = vmax if ibin == nbins - 1 else bin_lo + width
+            below = before
+
+        values[i] = value
+
+    return values[0] if np.ndim(q) == 0 else values
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Background writer of the band outputs.
+
+An `OutputWriter` writes GeoTIFFs and PNG plots of bands, masks and RGBs on a
+small pool of threads, so that the compression, the disk I/O and the PNG
+encoding, which release the GIL, overlap with the next compute steps:
+
+    with OutputWriter() as writer:
+        writer.submit(hue, 'hue.tif', compress='zstd')
+        writer.submit(hue, 'hue.png', title='Hue', quicklook=True)
+        ...
+        failures = writer.flush()
+
+The failures of the jobs written after the last flush are logged at the end
+of the `with` block.
+
+A job holds a shallow copy of the band, sharing its arrays: the data is kept
+alive by the job until it is written, and released afterwards, while the
+band itself can be deleted, rebound or moved to scratch. The data must not
+be modified in place before the job is written. A job is written with the
+dtype policy of its submission, e.g., within a `dtype_policy` block exited
+meanwhile. The number of jobs waiting or running is bounded, `submit`
+blocking when the queue is full, so that the memory held by the pending
+outputs is bounded too.
+"""
+import copy
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pyintdem.config import _thread_dtype, get_dtype
+
+logger = logging.getLogger(__name__)
+
+# Formats of the outputs, by file suffix
+FORMATS = {
+    '.tif': 'geotiff',
+    '.tiff': 'geotiff',
+    '.png': 'png'
+}
+
+
+class OutputWriter(object):
+    """
+    Bounded pool of threads writing the GeoTIFF and PNG outputs of bands,
+    see the module documentation.
+    """
+    def __init__(self, max_workers=2, max_pending=4):
+        """
+        arguments:
+            max_workers: integer
+                number of writing threads, default 2, 0 for synchronous
+                writes in the calling thread
+            max_pending: integer
+                maximum number of jobs waiting or running, default 4
+        """
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='pyintdem-writer') if max_workers else None
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._jobs = []
+        self._failures = []
+
+    def submit(self, band, target, format=None, **kwargs):
+        """
+        Write a Band, MaskBand or RGB to a file in the background.
+
+        arguments:
+            band: Band, MaskBand or RGB
+                data to be written
+            target: path
+                file location
+            format: string
+                'geotiff' (to_geotiff) or 'png' (plot), default None for the
+                format of the file suffix, see FORMATS
+            kwargs:
+                options of to_geotiff or plot, e.g., compress='zstd' or
+                title='Hue', quicklook=True
+
+        The full resolution plots (quicklook=False) use pyplot, which is
+        not thread safe, and are written in the calling thread.
+        """
+        target = Path(target)
+        if format is None:
+            format = FORMATS.get(target.suffix.lower())
+        if format not in ('geotiff', 'png'):
+            raise NotImplementedError(
+                f'In OutputWriter: {target.name} format is not implemented, use one of {sorted(set(FORMATS.values()))}'
+            )
+
+        snapshot = copy.copy(band)
+        if self._executor is None or (format == 'png' and not kwargs.get('quicklook', False)):
+            self._run(snapshot, target, format, kwargs, get_dtype())
+            return
+
+        self._slots.acquire()
+        try:
+            job = self._executor.submit(self._run, snapshot, target, format, kwargs, get_dtype())
+        except BaseException:
+            self._slots.release()
+            raise
+        del snapshot
+        job.add_done_callback(lambda _: self._slots.release())
+        self._jobs.append(job)
+
+    def _run(self, band, target, format, kwargs, dtype):
+        """
+        Write a job with the dtype of its submission, recording its failure
+        """
+        try:
+            with _thread_dtype(dtype):
+                if format == 'geotiff':
+                    band.to_geotiff(fname=target, **kwargs)
+                else:
+                    band.plot(saveto=target, **kwargs)
+        except Exception as e:
+            self._failures.append((target, e))
+
+    @property
+    def pending(self):
+        """
+        Number of jobs waiting or running
+        """
+        return sum(not job.done() for job in self._jobs)
+
+    def flush(self):
+        """
+        Wait for the submitted jobs, e.g., at the end of a scene.
+
+        returns:
+            Failed outputs since the last flush: list of (target, exception)
+        """
+        jobs, self._jobs = self._jobs, []
+        for job in jobs:
+            job.result()
+
+        failures, self._failures = self._failures, []
+        return failures
+
+    def close(self):
+        """
+        Flush and stop the threads.
+
+        returns:
+            Failed outputs since the last flush: list of (target, exception)
+        """
+        failures = self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        return failures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        # the failures not returned by an explicit flush are logged
+        for target, error in self.close():
+            logger.error(f"OutputWriter: writing {target.name} failed: {error}")
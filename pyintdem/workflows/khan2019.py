@@ -11,21 +11,20 @@ from rioxarray.exceptions import NoDataInBounds
 from tqdm.autonotebook import tqdm
 
 from pyintdem import read_file
-from pyintdem.models.band import Band, RGB
+from pyintdem.config import dtype_policy
+from pyintdem.data import DataFile
+from pyintdem.models import Band, BandAccumulator, RGB
+from pyintdem.models.band import KERNEL_LAPLACE
+from pyintdem.models.writer import OutputWriter
 
 logger = logging.getLogger(__name__)
 
-KERNEL_LAPLACE = np.array(
-    [
-        [0, -1, 0],
-        [-1, 4, -1],
-        [0, -1, 0]
-    ])
 
 def create_mask(database, maskdir,
                 nmask=0.5,
                 ext='tif', band='B11',
-                normalize=True, clip_kw=None):
+                normalize=True, clip_kw=None, dtype=None,
+                normalize_kw=None, quantile_method='exact', quantile_error=1e-4, geotiff_kw=None):
     """
     Create mask from the database for all the tiles
 
@@ -37,6 +36,11 @@ def create_mask(database, maskdir,
         band: The band to use for thresholding, B11
         normalize: To normalize or not, normally True
         clip_kw: A dictionary of one or all components {'bbox', 'geoms'} for clipping
+        dtype: floating dtype for the processing, e.g., 'reference' for float64, None keeps the package policy
+        normalize_kw: Keywords for Band.normalize, default {'method': 'std', 'std_factor': 1, 'std_correction': 'high'}
+        quantile_method: 'exact' or 'histogram' quantiles when normalizing with percentiles, see Band.quantile
+        quantile_error: rank error bound of the 'histogram' quantile method
+        geotiff_kw: Dictionary of Band.to_geotiff options, e.g., {'compress': 'zstd', 'cog': True}
 
     Returns: None
 
@@ -51,40 +55,47 @@ def create_mask(database, maskdir,
         print("The images will be clipped")
         to_clip = True
 
-    for tile in tqdm(database):
-        fname = maskdir / f'{tile}.{ext}'
-        datafiles = database[tile]
-        for i, datafile in enumerate(datafiles):
-            img_band = datafile.get_band(band, preprocess=True)
-
-            if to_clip:
-                try:
-                    img_band = img_band.clip(**clip_kw)
-                except NoDataInBounds:
-                    print("Data not found for the clipped zone")
-
-            if normalize:
-                img_band.normalize(method='std', std_factor=1, std_correction='high')
-
-            if i == 0:
-                count_band = np.logical_not(np.isnan(img_band.data)).astype(int)
-                mask = img_band
-            else:
-                count_band = count_band + np.logical_not(np.isnan(img_band.data)).astype(int)
-                mask = mask.nan_sum(img_band)
-
-        count_band = Band(data=count_band, geotransform=mask.geotransform, projection=mask.projection)
-        mask = mask / count_band
-        mask = mask < nmask * mask.std
-        mask.to_geotiff(fname=fname.as_posix())
-
-
-def prepare_bands(datafile, clip_kw=None):
+    if normalize_kw is None:
+        normalize_kw = dict(method='std', std_factor=1, std_correction='high')
+    normalize_kw = dict(normalize_kw, quantile_method=quantile_method, quantile_error=quantile_error)
+
+    if geotiff_kw is None:
+        geotiff_kw = {}
+
+    with dtype_policy(dtype):
+        for tile in tqdm(database):
+            fname = maskdir / f'{tile}.{ext}'
+            datafiles = database[tile]
+            # running sum and count of the valid pixels over the scenes
+            accumulator = BandAccumulator()
+            for datafile in datafiles:
+                if to_clip:
+                    # only the window enclosing the clip region is decoded
+                    try:
+                        img_band = datafile.get_band(band, preprocess=True, clip_kw=clip_kw)
+                    except NoDataInBounds:
+                        print("Data not found for the clipped zone")
+                        img_band = datafile.get_band(band, preprocess=True)
+                else:
+                    img_band = datafile.get_band(band, preprocess=True)
+
+                if normalize:
+                    img_band.normalize(**normalize_kw)
+
+                accumulator.update(img_band)
+
+            mask = accumulator.mean
+            mask = mask < nmask * mask.std
+            mask.to_geotiff(fname=fname.as_posix(), **geotiff_kw)
+
+
+def prepare_bands(datafile, clip_kw=None, warp_kw=None):
     """
     Auxiliary function to be used in the extract_shoreline to prepare bands
     Args:
         datafile: datafile to be processed
         clip_kw: Dictionary of one or all components {'bbox', 'geoms'} for clipping
+        warp_kw: Dictionary of Band.reproject_match options, e.g., {'num_threads', 'resampling'}
 
     Returns: red, green, blue, alpha bands
 
@@ -94,21 +105,21 @@ def prepare_bands(datafile, clip_kw=None):
         print("The images will be clipped")
         to_clip = True
 
-    # Loading data
-    alpha = datafile.get_band('B11', preprocess=True)
-    red = datafile.get_band('B4', preprocess=True)
-    green = datafile.get_band('B8', preprocess=True)
-    blue = datafile.get_band('B2', preprocess=True)
+    if warp_kw is None:
+        warp_kw = {}
+
+    # Loading data, only the window enclosing the clip region is decoded if clipped
+    alpha = datafile.get_band('B11', preprocess=True, clip_kw=clip_kw)
+    red = datafile.get_band('B4', preprocess=True, clip_kw=clip_kw)
+    green = datafile.get_band('B8', preprocess=True, clip_kw=clip_kw)
+    blue = datafile.get_band('B2', preprocess=True, clip_kw=clip_kw)
 
     # Upscale alpha to match others
-    alpha = alpha.reproject_match(red)
+    alpha = alpha.reproject_match(red, **warp_kw)
 
-    # Apply clipping
+    # The clipped alpha is touched on the coarser grid, clip again on the grid of red
     if to_clip:
         alpha = alpha.clip(**clip_kw)
-        red = red.clip(**clip_kw)
-        green = green.clip(**clip_kw)
-        blue = blue.clip(**clip_kw)
 
     # Normalize bands
     alpha.normalize(method='std', std_factor=1, std_correction='high')
@@ -118,29 +129,44 @@ def prepare_bands(datafile, clip_kw=None):
 
     return red, green, blue, alpha
 
-def prepare_mask(datafile: pyintdem.Data.DataFile, clip_kw=None):
+def prepare_mask(datafile: DataFile, clip_kw=None):
     pass
 
 
-def create_synthetic_rgb(red: Band, green: Band, blue:Band, alpha:Band) -> [Band, Band, Band]:
+def create_synthetic_rgb(red: Band, green: Band, blue:Band, alpha:Band, scratch=False) -> [Band, Band, Band]:
     """
     Create synthetic red, green and blue bands using the alpha bands
 
+    Args:
+        scratch: if the synthetic bands are written to memory-mapped scratch files, see Band.to_scratch
+
     Returns: red, green, blue
 
     """
-    red = (red * alpha) + (alpha * -1 + 1)
-    green = (alpha * -1 + 1) + (green * alpha)
-    blue = (alpha * -1 + 1) + (blue * alpha)
+    # each band in a single fused pass, see Band.lazy
+    red = ((red.lazy() * alpha.lazy()) + (alpha.lazy() * -1 + 1)).compute(scratch=scratch)
+    green = ((alpha.lazy() * -1 + 1) + (green.lazy() * alpha.lazy())).compute(scratch=scratch)
+    blue = ((alpha.lazy() * -1 + 1) + (blue.lazy() * alpha.lazy())).compute(scratch=scratch)
 
     return red, green, blue
 
 
 
 
+def _flush_outputs(writer, datafiledir, close=False):
+    """
+    Wait for the outputs of a scene, logging the failed ones to the scene log
+    """
+    failures = writer.close() if close else writer.flush()
+    for target, error in failures:
+        logger.error(f"{Path(datafiledir).name}: writing {target.name} failed: {error}")
+    return failures
+
+
 def compute_hue_value(datafile, datafiledir,
                       savetifs=False, saveplots=False,
-                      clip_kw=None):
+                      clip_kw=None, warp_kw=None, scratch=False, geotiff_kw=None, quantize=False, plot_kw=None,
+                      writer=None):
     """
     Compute hue and value for the given datafile
     Args:
@@ -149,52 +175,79 @@ def compute_hue_value(datafile, datafiledir,
         savetifs: if the tifs should be saved
         saveplots: if the plots should be saved
         clip_kw: Dictionary of one or all components {'bbox', 'geoms'} for clipping
+        warp_kw: Dictionary of Band.reproject_match options, e.g., {'num_threads', 'resampling'}
+        scratch: if the large intermediates are backed by memory-mapped scratch files, see Band.to_scratch;
+            with savetifs the synthetic bands are then persisted as scratch files (.npy with a .json grid
+            sidecar, see Band.from_scratch) in the datafiledir instead of a second write to GeoTIFF
+        geotiff_kw: Dictionary of Band.to_geotiff options, e.g., {'compress': 'zstd', 'cog': True}
+        quantize: if the hue, value and the [0, 1] intermediate tifs are saved as uint16 codes, decoded by read_file
+            within 7.6e-6 plus the rounding of the processing dtype, below 7.7e-6 in float32, see Band.to_geotiff
+        plot_kw: Dictionary of Band.plot and RGB.plot options, default {'quicklook': True} for block-averaged
+            PNG quicklooks, {'quicklook': False} for the full resolution plots
+        writer: OutputWriter writing the tifs and plots in the background, default None for a writer flushed
+            before returning; a given writer is not flushed, see extract_shoreline
 
     Returns: hue, value
 
     """
-    red, green, blue, alpha = prepare_bands(datafile, clip_kw=clip_kw)
-
-    if savetifs:
-        red.to_geotiff(fname=datafiledir / 'red_norm.tif')
-        green.to_geotiff(fname=datafiledir / 'green_norm.tif')
-        blue.to_geotiff(fname=datafiledir / 'blue_norm.tif')
-        alpha.to_geotiff(fname=datafiledir / 'alpha_norm.tif')
-
-    if saveplots:
-        alpha.plot('Upscaled Normalized Alpha', cmap='binary_r', saveto=datafiledir / 'alpha_norm.png')
-        red.plot('Normalized Red', cmap='binary_r', saveto=datafiledir / 'red_norm.png')
-        green.plot('Normalized Green', cmap='binary_r', saveto=datafiledir / 'green_norm.png')
-        blue.plot('Normalized Blue', cmap='binary_r', saveto=datafiledir / 'blue_norm.png')
-
-    red, green, blue = create_synthetic_rgb(red, green, blue, alpha)
-
-    if savetifs:
-        red.to_geotiff(fname=datafiledir / 'red_synthetic.tif')
-        green.to_geotiff(fname=datafiledir / 'green_synthetic.tif')
-        blue.to_geotiff(fname=datafiledir / 'blue_synthetic.tif')
-
-    if saveplots:
-        red.plot('Normalized Red', cmap='binary_r', saveto=datafiledir / 'red_synthetic.png')
-        green.plot('Normalized Green', cmap='binary_r', saveto=datafiledir / 'green_synthetic.png')
-        blue.plot('Normalized Blue', cmap='binary_r', saveto=datafiledir / 'blue_synthetic.png')
-
-    # RGB HSV Conversion
-    rgb = RGB(red=red, green=green, blue=blue)
-    del red, green, blue, alpha
-    rgb.plot(title='RGB', saveto=datafiledir / 'rgb.png')
-    hue, _, value = rgb.to_hsv(method='matplotlib')
-    del rgb
-
-    if saveplots:
-        hue.plot('Hue', cmap='binary_r', saveto=datafiledir / 'hue.png')
-        value.plot('Value', cmap='binary_r', saveto=datafiledir / 'value.png')
-
-    # Hue and value tifs are always saved
-    hue.to_geotiff(fname=datafiledir / 'hue.tif')
-    value.to_geotiff(fname=datafiledir / 'value.tif')
-
-    return hue, value
+    if geotiff_kw is None:
+        geotiff_kw = {}
+    if plot_kw is None:
+        plot_kw = {'quicklook': True}
+    own_writer = writer is None
+    if own_writer:
+        writer = OutputWriter()
+
+    try:
+        red, green, blue, alpha = prepare_bands(datafile, clip_kw=clip_kw, warp_kw=warp_kw)
+
+        if savetifs:
+            writer.submit(red, datafiledir / 'red_norm.tif', quantize=quantize, **geotiff_kw)
+            writer.submit(green, datafiledir / 'green_norm.tif', quantize=quantize, **geotiff_kw)
+            writer.submit(blue, datafiledir / 'blue_norm.tif', quantize=quantize, **geotiff_kw)
+            writer.submit(alpha, datafiledir / 'alpha_norm.tif', quantize=quantize, **geotiff_kw)
+
+        if saveplots:
+            writer.submit(alpha, datafiledir / 'alpha_norm.png', title='Upscaled Normalized Alpha', cmap='binary_r', **plot_kw)
+            writer.submit(red, datafiledir / 'red_norm.png', title='Normalized Red', cmap='binary_r', **plot_kw)
+            writer.submit(green, datafiledir / 'green_norm.png', title='Normalized Green', cmap='binary_r', **plot_kw)
+            writer.submit(blue, datafiledir / 'blue_norm.png', title='Normalized Blue', cmap='binary_r', **plot_kw)
+
+        red, green, blue = create_synthetic_rgb(red, green, blue, alpha, scratch=scratch)
+
+        if savetifs and scratch:
+            red.to_scratch(name='red_synthetic', scratch_dir=datafiledir, persist=True)
+            green.to_scratch(name='green_synthetic', scratch_dir=datafiledir, persist=True)
+            blue.to_scratch(name='blue_synthetic', scratch_dir=datafiledir, persist=True)
+        elif savetifs:
+            writer.submit(red, datafiledir / 'red_synthetic.tif', quantize=quantize, **geotiff_kw)
+            writer.submit(green, datafiledir / 'green_synthetic.tif', quantize=quantize, **geotiff_kw)
+            writer.submit(blue, datafiledir / 'blue_synthetic.tif', quantize=quantize, **geotiff_kw)
+
+        if saveplots:
+            writer.submit(red, datafiledir / 'red_synthetic.png', title='Normalized Red', cmap='binary_r', **plot_kw)
+            writer.submit(green, datafiledir / 'green_synthetic.png', title='Normalized Green', cmap='binary_r', **plot_kw)
+            writer.submit(blue, datafiledir / 'blue_synthetic.png', title='Normalized Blue', cmap='binary_r', **plot_kw)
+
+        # Hue and value of the synthetic bands, read in place by a planar RGB, without the RGB and HSV arrays
+        rgb = RGB(red=red, green=green, blue=blue, scratch=scratch, planar=True)
+        del red, green, blue, alpha
+        writer.submit(rgb, datafiledir / 'rgb.png', title='RGB', **plot_kw)
+        hue, value = rgb.hue_value(scratch=scratch)
+        del rgb
+
+        if saveplots:
+            writer.submit(hue, datafiledir / 'hue.png', title='Hue', cmap='binary_r', **plot_kw)
+            writer.submit(value, datafiledir / 'value.png', title='Value', cmap='binary_r', **plot_kw)
+
+        # Hue and value tifs are always saved
+        writer.submit(hue, datafiledir / 'hue.tif', quantize=quantize, **geotiff_kw)
+        writer.submit(value, datafiledir / 'value.tif', quantize=quantize, **geotiff_kw)
+
+        return hue, value
+    finally:
+        if own_writer:
+            _flush_outputs(writer, datafiledir, close=True)
 
 def apply_thresholding_hue(ds: Band, mask: Band, nhue:float=0.5) -> Band:
     pass
@@ -244,7 +297,9 @@ def extract_shoreline(datafile, datafiledir, maskdir,
                       nhue=0.5, nvalue=3.0,
                       waterblob=10000, landblob=10000,
                       savetifs=False, saveplots=False,
-                      clip_kw=None, recompute=True):
+                      clip_kw=None, recompute=True,
+                      quantile_method='exact', quantile_error=1e-4,
+                      warp_kw=None, scratch=False, geotiff_kw=None, quantize=False, plot_kw=None, writer=None):
     """
     Extract shorelines using dataset
 
@@ -260,103 +315,126 @@ def extract_shoreline(datafile, datafiledir, maskdir,
         saveplots: if the intermediate plots should be saved, set False for faster processing
         clip_kw: Dictionary of one or all components {'bbox', 'geoms'} for clipping
         recompute: Force recompute hue and value files, True
+        quantile_method: 'exact' or 'histogram' median for the thresholds, see Band.quantile
+        quantile_error: rank error bound of the 'histogram' quantile method
+        warp_kw: Dictionary of Band.reproject_match options, e.g., {'num_threads', 'resampling'}; the water mask is always warped with nearest resampling
+        scratch: if the large intermediates are backed by memory-mapped scratch files, see compute_hue_value
+        geotiff_kw: Dictionary of Band.to_geotiff options, e.g., {'compress': 'zstd', 'cog': True}
+        quantize: if the hue and value are cached as uint16 codes, see compute_hue_value
+        plot_kw: Dictionary of Band.plot and RGB.plot options, e.g., {'max_pixels', 'stretch'}, see compute_hue_value
+        writer: OutputWriter writing the tifs and plots in the background while the scene is processed, flushed at
+            the end of the scene with the failures logged, default None for a writer of the scene
 
     Returns: Processed dataset are saved in the datafiledir
 
     """
-    logger = logging.getLogger(__name__)
-    datafiledir = Path(datafiledir)
-
-    hue_value_is_computed = False
-    fname_hue = datafiledir / 'hue.tif'
-    fname_value = datafiledir / 'value.tif'
-
-    if fname_hue.exists() and fname_value.exists():
-        hue_value_is_computed = True
-
-    if recompute or not hue_value_is_computed:
-        # compute is requested or needed
-        hue, value = compute_hue_value(
-            datafile=datafile, datafiledir=datafiledir,
-            savetifs=savetifs, saveplots=saveplots,
-            clip_kw=clip_kw)
-    else:
-        # load the existing dataset
-        hue = read_file(fname_hue, band=1)
-        value = read_file(fname_value, band=1)
-
-    # Load water mask
-    watermask = datafile.get_mask(mask_dir=maskdir)
-    watermask = watermask.reproject_match(hue)
-
-    if saveplots:
-        watermask.plot('Water Mask', cmap='binary_r', saveto=datafiledir / 'watermask.png')
-
-    # Masking and calculating thresholds
-    hue_mask = hue.mask(by=watermask, inverse=True)
-    if saveplots:
-        hue_mask.plot('Inversed masked hue', saveto=datafiledir / 'hue_masked.png')
-    value_mask = value.mask(by=watermask)
-    if saveplots:
-        value_mask.plot('Masked value', saveto=datafiledir / 'value_masked.png')
-
-    hue_median = hue_mask.median
-    hue_std = hue_mask.std
-    value_median = value_mask.median
-    value_std = value_mask.std
-
-    del watermask, hue_mask, value_mask
-
-    # Thresholding
-    hue_bw = (
-        (hue < (hue_median + nhue * hue_std)).logical_and(
-            hue > (hue_median - nhue * hue_std)
+    if geotiff_kw is None:
+        geotiff_kw = {}
+    if plot_kw is None:
+        plot_kw = {'quicklook': True}
+    own_writer = writer is None
+    if own_writer:
+        writer = OutputWriter()
+
+    try:
+        logger = logging.getLogger(__name__)
+        datafiledir = Path(datafiledir)
+
+        hue_value_is_computed = False
+        fname_hue = datafiledir / 'hue.tif'
+        fname_value = datafiledir / 'value.tif'
+
+        if fname_hue.exists() and fname_value.exists():
+            hue_value_is_computed = True
+
+        if recompute or not hue_value_is_computed:
+            # compute is requested or needed
+            hue, value = compute_hue_value(
+                datafile=datafile, datafiledir=datafiledir,
+                savetifs=savetifs, saveplots=saveplots,
+                clip_kw=clip_kw, warp_kw=warp_kw, scratch=scratch, geotiff_kw=geotiff_kw, quantize=quantize, plot_kw=plot_kw,
+                writer=writer)
+        else:
+            # load the existing dataset, quantized files are decoded by read_file
+            hue = read_file(fname_hue, band=1)
+            value = read_file(fname_value, band=1)
+
+        # Load water mask
+        watermask = datafile.get_mask(mask_dir=maskdir, clip_kw=clip_kw)
+        mask_warp_kw = {} if warp_kw is None else dict(warp_kw)
+        mask_warp_kw['resampling'] = 'nearest'
+        watermask = watermask.reproject_match(hue, **mask_warp_kw)
+
+        if saveplots:
+            writer.submit(watermask, datafiledir / 'watermask.png', title='Water Mask', cmap='binary_r', **plot_kw)
+
+        # Masking and calculating thresholds, the masked bands are only built for the plots
+        if saveplots:
+            writer.submit(hue.mask(by=watermask, inverse=True), datafiledir / 'hue_masked.png', title='Inversed masked hue', **plot_kw)
+            writer.submit(value.mask(by=watermask), datafiledir / 'value_masked.png', title='Masked value', **plot_kw)
+
+        hue_stats = hue.masked_stats(by=watermask, inverse=True, method=quantile_method, error=quantile_error)
+        hue_median = hue_stats.median
+        hue_std = hue_stats.std
+        value_stats = value.masked_stats(by=watermask, method=quantile_method, error=quantile_error)
+        value_median = value_stats.median
+        value_std = value_stats.std
+
+        del watermask
+
+        # Thresholding
+        hue_bw = (
+            (hue.lazy() < (hue_median + nhue * hue_std)).logical_and(
+                hue.lazy() > (hue_median - nhue * hue_std)
+            )
+        ).logical_not().compute()
+        if saveplots:
+            writer.submit(hue_bw, datafiledir / f'hue_bw_{nhue:.1f}.png', title='Hue BW', **plot_kw)
+        if savetifs:
+            writer.submit(hue_bw, datafiledir / f'hue_bw_{nhue:.1f}.tif', **geotiff_kw)
+
+        value_bw = (value.lazy() < (value_median + nvalue * value_std)).logical_and(
+            value.lazy() > (value_median - nvalue * value_std)
+        ).compute()
+        if saveplots:
+            writer.submit(value_bw, datafiledir / f'value_bw_{nvalue:.1f}.png', title='Value BW', **plot_kw)
+        if savetifs:
+            writer.submit(value_bw, datafiledir / f'value_bw_{nvalue:.1f}.tif', **geotiff_kw)
+
+        bw = value_bw.logical_and(hue_bw)
+        del value_bw, hue_bw
+        if saveplots:
+            writer.submit(bw, datafiledir / f'bw_{nhue:.1f}_{nvalue:.1f}.png', title='BW', cmap='binary', **plot_kw)
+        if savetifs:
+            writer.submit(bw, datafiledir / f'bw_{nhue:.1f}_{nvalue:.1f}.tif', **geotiff_kw)
+
+        bw = bw.clean_blobs(waterblob=waterblob, landblob=landblob)  # Water and land
+        if saveplots:
+            writer.submit(bw, datafiledir / f'bw_clean_{nhue:.1f}_{nvalue:.1f}.png', title='BW Clean', cmap='binary', **plot_kw)
+
+        writer.submit(bw, datafiledir / f'bw_clean_{nhue:.1f}_{nvalue:.1f}.tif', **geotiff_kw)
+
+        # Shoreline mapping
+        shoreline = bw.edges(
+            replacenan=False,
+            nanmask=True,
+            cleanedge=True,
+            indices=True
+        )
+        bw.position(
+            xyloc=shoreline,
+            epsg=4326,
+            center=True,
+            saveto=datafiledir / f'shoreline_{nhue:.1f}_{nvalue:.1f}.csv'
         )
-    ).logical_not()
-    if saveplots:
-        hue_bw.plot('Hue BW', saveto=datafiledir / f'hue_bw_{nhue:.1f}.png')
-    if savetifs:
-        hue_bw.to_geotiff(fname=datafiledir / f'hue_bw_{nhue:.1f}.tif')
-
-    value_bw = (value < (value_median + nvalue * value_std)).logical_and(
-        value > (value_median - nvalue * value_std)
-    )
-    if saveplots:
-        value_bw.plot('Value BW', saveto=datafiledir / f'value_bw_{nvalue:.1f}.png')
-    if savetifs:
-        value_bw.to_geotiff(fname=datafiledir / f'value_bw_{nvalue:.1f}.tif')
-
-    bw = value_bw.logical_and(hue_bw)
-    del value_bw, hue_bw
-    if saveplots:
-        bw.plot('BW', cmap='binary', saveto=datafiledir / f'bw_{nhue:.1f}_{nvalue:.1f}.png')
-    if savetifs:
-        bw.to_geotiff(fname=datafiledir / f'bw_{nhue:.1f}_{nvalue:.1f}.tif')
-
-    bw = bw.clean(npixel=waterblob, fillvalue=0, background=False)  # Water
-    bw = bw.clean(npixel=landblob, fillvalue=1, background=True)  # Land
-    if saveplots:
-        bw.plot('BW Clean', cmap='binary', saveto=datafiledir / f'bw_clean_{nhue:.1f}_{nvalue:.1f}.png')
-
-    bw.to_geotiff(fname=datafiledir / f'bw_clean_{nhue:.1f}_{nvalue:.1f}.tif')
-
-    # Shoreline mapping
-    shoreline = bw.convolute(
-        kernel=[[0, -1, 0], [-1, 4, -1], [0, -1, 0]],
-        replacenan=False,
-        replacevalue=4,
-        fillvalue=4,
-        nanmask=True,
-        cleanedge=True
-    )
-    shoreline.position(
-        xyloc=np.where(shoreline.data == 1),
-        epsg=4326,
-        center=True,
-        saveto=datafiledir / f'shoreline_{nhue:.1f}_{nvalue:.1f}.csv'
-    )
-
-    del bw
+
+        del bw
+        # scene end, the background outputs are written
+        if not own_writer:
+            _flush_outputs(writer, datafiledir)
+    finally:
+        if own_writer:
+            _flush_outputs(writer, datafiledir, close=True)
     gc.collect()
 
 
@@ -364,7 +442,9 @@ def process_database(database, out_dir, mask_dir,
                      nhue=0.5, nvalue=3.0,
                      waterblob=10000, landblob=10000,
                      savetifs=False, saveplots=True,
-                     clip_kw=None, recompute=False):
+                     clip_kw=None, recompute=False, dtype=None,
+                     quantile_method='exact', quantile_error=1e-4,
+                     warp_kw=None, scratch=False, geotiff_kw=None, quantize=False, plot_kw=None, writer_kw=None):
     """
     Process the dataset using the shoreline processing scheme
     Args:
@@ -379,6 +459,18 @@ def process_database(database, out_dir, mask_dir,
         saveplots: if the intermediate plots should be saved, set False for faster processing
         clip_kw: Dictionary of one or all components {'bbox', 'geoms'} for clipping
         recompute: recompute hue and value files
+        dtype: floating dtype for the processing, e.g., 'reference' for float64, None keeps the package policy
+        quantile_method: 'exact' or 'histogram' median for the thresholds, see Band.quantile
+        quantile_error: rank error bound of the 'histogram' quantile method
+        warp_kw: Dictionary of Band.reproject_match options, e.g., {'num_threads', 'resampling'}
+        scratch: if the large intermediates are backed by memory-mapped scratch files in the scratch directory,
+            see pyintdem.config.set_scratch_dir
+        geotiff_kw: Dictionary of Band.to_geotiff options, e.g., {'compress': 'zstd', 'cog': True}
+        quantize: if the hue and value are cached as uint16 codes, halving the files read by the reruns with
+            recompute=False, see compute_hue_value
+        plot_kw: Dictionary of Band.plot and RGB.plot options, e.g., {'max_pixels', 'stretch'}, see compute_hue_value
+        writer_kw: Dictionary of OutputWriter options, e.g., {'max_workers', 'max_pending'}, {'max_workers': 0} for
+            synchronous writes; the tifs and plots of a scene are written while it is processed, see extract_shoreline
 
     Returns: results are saved in the out_dir
 
@@ -387,6 +479,9 @@ def process_database(database, out_dir, mask_dir,
     if not out_dir.exists():
         out_dir.mkdir()
 
+    # background writer of the scene outputs, shared by the scenes
+    writer = OutputWriter(**({} if writer_kw is None else writer_kw))
+
     for tile in database:
         tile_dir = out_dir / tile
         if not tile_dir.exists():
@@ -399,16 +494,24 @@ def process_database(database, out_dir, mask_dir,
                 datafile_dir.mkdir()
 
             try:
-                extract_shoreline(
-                    datafile=datafile,
-                    datafiledir=datafile_dir,
-                    maskdir=mask_dir,
-                    nhue=nhue, nvalue=nvalue,
-                    waterblob=waterblob, landblob=landblob,
-                    savetifs=savetifs, saveplots=saveplots,
-                    clip_kw=clip_kw, recompute=recompute)
+                with dtype_policy(dtype):
+                    extract_shoreline(
+                        datafile=datafile,
+                        datafiledir=datafile_dir,
+                        maskdir=mask_dir,
+                        nhue=nhue, nvalue=nvalue,
+                        waterblob=waterblob, landblob=landblob,
+                        savetifs=savetifs, saveplots=saveplots,
+                        clip_kw=clip_kw, recompute=recompute,
+                        quantile_method=quantile_method, quantile_error=quantile_error,
+                        warp_kw=warp_kw, scratch=scratch, geotiff_kw=geotiff_kw, quantize=quantize, plot_kw=plot_kw,
+                        writer=writer)
                 logger.info(f"Tile: {tile} for {datafile_dir.name} is processed")
             except Exception as e:
                 logger.error(f"Tile: {tile} for {datafile_dir.name} error: {e}")
+                # outputs submitted before the error
+                _flush_outputs(writer, datafile_dir)
 
             gc.collect()
+
+    writer.close()